@@ -4,31 +4,37 @@ import sys
 import numpy as np
 import cv2
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout,
+    QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QGridLayout,
     QSlider, QListWidget, QListWidgetItem, QPushButton
 )
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QImage, QPixmap
 from storage_reader import StorageReader
+from playback import PlaybackEngine
 
 class VideoPlayer(QWidget):
-    def __init__(self, storage_reader: StorageReader):
+    def __init__(self, engine: PlaybackEngine):
         super().__init__()
-        self.storage_reader = storage_reader
-        self.current_frame_index = 0
-        self.is_playing = False
+        self.engine = engine
+        self.shown_indices = {}  # 每軌目前顯示的影片幀索引
 
         self.init_ui()
         self.update_frame()
 
     def init_ui(self):
-        # Video display area
-        self.capture_label = QLabel(self)
-        self.capture_label.setFixedSize(640, 480)  # Adjust as needed
-
-        # Progress slider
+        # Video display area, one label per track
+        self.capture_labels = {}
+        video_layout = QGridLayout()
+        columns = 2 if len(self.engine.video_tracks) > 1 else 1
+        for i, track_id in enumerate(self.engine.video_tracks):
+            label = QLabel(self)
+            label.setFixedSize(640, 480)  # Adjust as needed
+            self.capture_labels[track_id] = label
+            video_layout.addWidget(label, i // columns, i % columns)
+
+        # Progress slider (milliseconds from the start of the recording)
         self.slider = QSlider(Qt.Horizontal, self)
-        self.slider.setMaximum(len(self.storage_reader.frame_indices) - 1)
+        self.slider.setMaximum(int(self.engine.duration * 1000))
         self.slider.sliderMoved.connect(self.slider_moved)
 
         # Data display area
@@ -47,7 +53,7 @@ class VideoPlayer(QWidget):
         control_layout.addWidget(self.pause_button)
 
         capture_layout = QVBoxLayout()
-        capture_layout.addWidget(self.capture_label)
+        capture_layout.addLayout(video_layout)
         capture_layout.addWidget(self.slider)
         capture_layout.addLayout(control_layout)
 
@@ -58,14 +64,39 @@ class VideoPlayer(QWidget):
         self.setLayout(main_layout)
         self.setWindowTitle('Video Player with Data Display')
 
-        # Timer for playback
+        # Timer polls the playback clock; frames only change when a track's timestamp does
         self.timer = QTimer()
-        self.timer.timeout.connect(self.next_frame)
+        self.timer.timeout.connect(self.tick)
 
     def update_frame(self):
-        frame = self.storage_reader.get_frame(self.current_frame_index)
-        data = self.storage_reader.data[self.current_frame_index]
+        t = self.engine.position()
+        self.data_list.clear()
+        for track_id, track in self.engine.video_tracks.items():
+            index = self.engine.frame_index_at(track, t)
+            if self.shown_indices.get(track_id) != index:
+                frame = track.get_frame(index)
+                if frame is None:
+                    continue
+                self.shown_indices[track_id] = index
+                self.show_frame(self.capture_labels[track_id], frame)
+
+            # Update data display (tracks with no rows have nothing to show)
+            if not len(track.frame_indices):
+                continue
+            for key, value in track.get_data(track.row_at_time(t)).items():
+                if isinstance(value, np.ndarray):
+                    value_str = np.array2string(value)
+                else:
+                    value_str = str(value)
+                item = QListWidgetItem(f"[{track_id}] {key}: {value_str}")
+                self.data_list.addItem(item)
 
+        # Update slider position
+        self.slider.blockSignals(True)
+        self.slider.setValue(int((t - self.engine.start_time) * 1000))
+        self.slider.blockSignals(False)
+
+    def show_frame(self, label, frame):
         # Convert BGR to RGB
         frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
@@ -73,51 +104,44 @@ class VideoPlayer(QWidget):
         height, width, channel = frame_rgb.shape
         bytes_per_line = 3 * width
         q_img = QImage(frame_rgb.data, width, height, bytes_per_line, QImage.Format_RGB888)
-        self.capture_label.setPixmap(QPixmap.fromImage(q_img))
-
-        # Update data display
-        self.data_list.clear()
-        for key, value in data.items():
-            if isinstance(value, np.ndarray):
-                value_str = np.array2string(value)
-            else:
-                value_str = str(value)
-            item = QListWidgetItem(f"{key}: {value_str}")
-            self.data_list.addItem(item)
-
-        # Update slider position
-        self.slider.blockSignals(True)
-        self.slider.setValue(self.current_frame_index)
-        self.slider.blockSignals(False)
+        label.setPixmap(QPixmap.fromImage(q_img).scaled(
+            label.size(), Qt.KeepAspectRatio
+        ))
 
     def play(self):
-        if not self.is_playing:
-            self.is_playing = True
-            self.timer.start(33)  # Approx 30 fps
+        if not self.engine.is_playing:
+            self.engine.play()
+            self.timer.start(10)
 
     def pause(self):
-        if self.is_playing:
-            self.is_playing = False
+        if self.engine.is_playing:
+            self.engine.pause()
             self.timer.stop()
 
-    def next_frame(self):
-        if self.current_frame_index < len(self.storage_reader.frame_indices) - 1:
-            self.current_frame_index += 1
-            self.update_frame()
-        else:
+    def tick(self):
+        if self.engine.position() >= self.engine.end_time:
             self.pause()
+        self.update_frame()
 
     def slider_moved(self, position):
-        self.current_frame_index = position
+        self.engine.seek(self.engine.start_time + position / 1000)
         self.update_frame()
 
 def main():
     args = sys.argv
     app = QApplication(args)
     reader = StorageReader(args[1])
-    player = VideoPlayer(reader)
+    try:
+        engine = PlaybackEngine(reader)
+    except ValueError as e:
+        reader.close()
+        sys.exit(str(e))
+    player = VideoPlayer(engine)
     player.show()
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    engine.close()
+    reader.close()
+    sys.exit(exit_code)
 
 if __name__ == '__main__':
     main()
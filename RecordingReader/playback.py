@@ -0,0 +1,299 @@
+# playback.py
+
+import argparse
+import os
+import threading
+import time
+import wave
+from typing import Dict, Optional, Tuple
+
+import h5py
+import numpy as np
+
+from storage_reader import StorageReader, VideoTrackReader
+
+
+class AudioTrackReader:
+    def __init__(self, track_dir: str):
+        """
+        讀取單一音軌 (audios/<id>/audio.wav + data.h5)
+
+        參數：
+        - track_dir: 音軌資料夾
+        """
+        self.track_dir = track_dir
+        self.track_id = os.path.basename(os.path.normpath(track_dir))
+        with wave.open(os.path.join(track_dir, "audio.wav"), "rb") as wav:
+            self.samplerate: int = wav.getframerate()
+            self.channels: int = wav.getnchannels()
+            raw = wav.readframes(wav.getnframes())
+        self.samples: np.ndarray = np.frombuffer(raw, dtype=np.int16).reshape(
+            -1, self.channels
+        )
+
+        # 區塊起始樣本與捕捉時間戳（回調時間為區塊結尾）
+        with h5py.File(os.path.join(track_dir, "data.h5"), "r") as h5:
+            offsets = h5["sample_offsets"][:]
+            timestamps = h5["timestamps"][:]
+        # 有時間戳的區塊數，0 表示錄製在第一個區塊之前就停止
+        self.block_count: int = len(offsets)
+        if len(offsets):
+            block_ends = np.append(offsets[1:], len(self.samples))
+            block_lengths = (block_ends - offsets) / self.samplerate
+            self.block_offsets = offsets
+            self.block_starts = timestamps - block_lengths
+        else:
+            self.block_offsets = np.zeros(1, dtype=np.int64)
+            self.block_starts = np.zeros(1)
+
+    @property
+    def start_time(self) -> float:
+        return float(self.block_starts[0])
+
+    @property
+    def end_time(self) -> float:
+        return self.time_at_sample(len(self.samples))
+
+    def sample_at(self, timestamp: float) -> int:
+        """
+        時間戳對應的樣本索引（以最近的區塊為基準）
+        """
+        block = int(np.searchsorted(self.block_starts, timestamp, side="right")) - 1
+        block = max(block, 0)
+        offset = self.block_offsets[block] + (
+            timestamp - self.block_starts[block]
+        ) * self.samplerate
+        return int(np.clip(offset, 0, len(self.samples)))
+
+    def time_at_sample(self, sample: int) -> float:
+        block = int(np.searchsorted(self.block_offsets, sample, side="right")) - 1
+        block = max(block, 0)
+        return float(
+            self.block_starts[block]
+            + (sample - self.block_offsets[block]) / self.samplerate
+        )
+
+
+class PlaybackClock:
+    def __init__(self, start_time: float):
+        """
+        播放時鐘，沒有音訊輸出時以系統時間推進
+
+        參數：
+        - start_time: 錄製時間軸上的起點
+        """
+        self.position = start_time
+        self.anchor: Optional[float] = None  # 開始播放時的 perf_counter
+        self.speed = 1.0
+        self.audio_track: Optional[AudioTrackReader] = None
+        self.audio_sample: Optional[int] = None  # 音訊輸出已播放到的樣本
+
+    def now(self) -> float:
+        if self.anchor is None:
+            return self.position
+        if (
+            self.audio_track is not None
+            and self.audio_sample is not None
+            and self.audio_sample < len(self.audio_track.samples)
+        ):
+            # 以音訊輸出的位置為主時鐘，音軌結束後改用系統時間
+            return self.audio_track.time_at_sample(self.audio_sample)
+        return self.position + (time.perf_counter() - self.anchor) * self.speed
+
+    def start(self) -> None:
+        if self.anchor is None:
+            self.anchor = time.perf_counter()
+
+    def stop(self) -> None:
+        self.position = self.now()
+        self.anchor = None
+
+    def seek(self, timestamp: float) -> None:
+        playing = self.anchor is not None
+        self.position = timestamp
+        self.anchor = time.perf_counter() if playing else None
+        if self.audio_track is not None and self.audio_sample is not None:
+            self.audio_sample = self.audio_track.sample_at(timestamp)
+
+
+class PlaybackEngine:
+    def __init__(
+        self,
+        reader: StorageReader,
+        audio_output: bool = True,
+        audio_track: Optional[str] = None,
+    ):
+        """
+        多軌同步播放：所有影像軌依各自的逐幀時間戳對齊到同一個時鐘，
+        有音軌時以音訊輸出的位置作為主時鐘
+
+        參數：
+        - reader: StorageReader
+        - audio_output: 是否輸出聲音（需要 sounddevice）
+        - audio_track: 輸出的音軌ID，None 時使用第一軌
+
+        沒有任何帶時間戳的幀或音訊區塊時（例如在第一幀之前就停止錄製）拋出 ValueError
+        """
+        self.reader = reader
+        self.video_tracks: Dict[str, VideoTrackReader] = reader.video_tracks
+        self.audio_tracks: Dict[str, AudioTrackReader] = {}
+        audio_root = os.path.join(reader.recording_path, "audios")
+        if os.path.isdir(audio_root):
+            for track_id in sorted(os.listdir(audio_root)):
+                track_dir = os.path.join(audio_root, track_id)
+                if os.path.exists(os.path.join(track_dir, "data.h5")):
+                    self.audio_tracks[track_id] = AudioTrackReader(track_dir)
+
+        starts = [t.timestamps[0] for t in self.video_tracks.values() if len(t.timestamps)]
+        ends = [t.timestamps[-1] for t in self.video_tracks.values() if len(t.timestamps)]
+        starts += [a.start_time for a in self.audio_tracks.values() if a.block_count]
+        ends += [a.end_time for a in self.audio_tracks.values() if a.block_count]
+        if not starts:
+            raise ValueError(
+                f"Recording {reader.recording_path} has no timestamped frames or audio"
+            )
+        self.start_time = float(min(starts))
+        self.end_time = float(max(ends))
+
+        self.clock = PlaybackClock(self.start_time)
+        self.stream = None
+        self.lock = threading.Lock()
+        if audio_output and self.audio_tracks:
+            track = self.audio_tracks.get(audio_track) if audio_track else None
+            self._open_audio(track or next(iter(self.audio_tracks.values())))
+
+    @property
+    def duration(self) -> float:
+        return self.end_time - self.start_time
+
+    @property
+    def is_playing(self) -> bool:
+        return self.clock.anchor is not None
+
+    def position(self) -> float:
+        return min(self.clock.now(), self.end_time)
+
+    def play(self) -> None:
+        self.clock.start()
+        if self.stream is not None:
+            self.stream.start()
+
+    def pause(self) -> None:
+        if self.stream is not None:
+            self.stream.stop()
+        self.clock.stop()
+
+    def seek(self, timestamp: float) -> None:
+        with self.lock:
+            self.clock.seek(float(np.clip(timestamp, self.start_time, self.end_time)))
+
+    def frame_index_at(self, track: VideoTrackReader, timestamp: float) -> int:
+        """
+        影像軌在 timestamp 時應顯示的影片幀索引（二分搜尋逐幀時間戳）
+        """
+        if not len(track.frame_indices):
+            return 0  # 這一軌沒有寫入任何幀
+        return int(track.frame_indices[track.row_at_time(timestamp)])
+
+    def frames_at(
+        self, timestamp: float
+    ) -> Dict[str, Tuple[int, Optional[np.ndarray]]]:
+        """
+        所有影像軌在 timestamp 時的幀
+
+        返回：
+        - frames: {影像軌ID: (影片幀索引, 影像)}
+        """
+        frames = {}
+        for track_id, track in self.video_tracks.items():
+            index = self.frame_index_at(track, timestamp)
+            frames[track_id] = (index, track.get_frame(index))
+        return frames
+
+    def close(self) -> None:
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def _open_audio(self, track: AudioTrackReader) -> None:
+        try:
+            import sounddevice as sd
+        except ImportError:
+            print("sounddevice not installed, playing without audio")
+            return
+
+        self.clock.audio_track = track
+        self.clock.audio_sample = track.sample_at(self.start_time)
+
+        def callback(outdata, frames, time_info, status):
+            with self.lock:
+                start = self.clock.audio_sample
+                chunk = track.samples[start : start + frames]
+                self.clock.audio_sample = start + len(chunk)
+            outdata[: len(chunk)] = chunk
+            outdata[len(chunk) :] = 0
+
+        self.stream = sd.OutputStream(
+            samplerate=track.samplerate,
+            channels=track.channels,
+            dtype="int16",
+            callback=callback,
+        )
+
+
+def run_headless(engine: PlaybackEngine, speed: float = 1.0, tick: float = 0.005) -> None:
+    """
+    無畫面播放整段錄影，統計每軌顯示的幀數與每次更新的延遲
+    """
+    engine.clock.speed = speed
+    last_indices: Dict[str, int] = {}
+    rendered = {track_id: 0 for track_id in engine.video_tracks}
+    latencies = []
+    engine.play()
+    try:
+        while engine.position() < engine.end_time:
+            start = time.perf_counter()
+            t = engine.position()
+            for track_id, track in engine.video_tracks.items():
+                index = engine.frame_index_at(track, t)
+                if last_indices.get(track_id) != index:
+                    track.get_frame(index)
+                    last_indices[track_id] = index
+                    rendered[track_id] += 1
+            latencies.append(time.perf_counter() - start)
+            time.sleep(tick)
+    finally:
+        engine.pause()
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f"duration: {engine.duration:.1f}s (speed x{speed})")
+    for track_id, count in rendered.items():
+        print(f"video {track_id}: {count} frames rendered")
+    print(
+        f"update latency ms: p50={np.percentile(latencies_ms, 50):.2f} "
+        f"p99={np.percentile(latencies_ms, 99):.2f} max={latencies_ms.max():.2f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording_path")
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    reader = StorageReader(args.recording_path)
+    # 無畫面模式以系統時間為時鐘，不輸出聲音
+    try:
+        engine = PlaybackEngine(reader, audio_output=False)
+    except ValueError as e:
+        reader.close()
+        raise SystemExit(str(e))
+    try:
+        run_headless(engine, speed=args.speed)
+    finally:
+        engine.close()
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,246 @@
 # storage_reader.py
 
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import cv2
 import h5py
 import numpy as np
-from typing import List, Dict, Any
 
-class StorageReader:
-    def __init__(self, file_path: str):
-        self.file_path = file_path
-        self.timestamps: List[float] = []
-        self.frame_indices: List[str] = []
-        self.data: List[Dict[str, Any]] = []
-        self._load_indices()
-
-    def _load_indices(self):
-        with h5py.File(self.file_path, 'r') as hf:
-            for timestamp in sorted(hf.keys(), key=float):
-                grp = hf[timestamp]
-                attrs = dict(grp.attrs)
-                self.timestamps.append(float(timestamp))
-                self.frame_indices.append(timestamp)
-                self.data.append(attrs)
-
-    def get_frame(self, index: int) -> np.ndarray:
-        timestamp = self.frame_indices[index]
-        with h5py.File(self.file_path, 'r') as hf:
-            frame = hf[timestamp]['frame'][()]
+# 與 storage/storage_module.py 寫入的欄位對應
+RAGGED_GROUPS = ("people_boxes", "blackboard_boxes", "detections")
+
+
+class VideoTrackReader:
+    def __init__(self, track_dir: str, prefetch: int = 8, cache_size: int = 64):
+        """
+        讀取單一影像軌 (videos/<id>/video.mp4 + data.h5)
+
+        h5 與影片解碼器保持開啟，逐幀欄位在開啟時一次載入成 numpy 陣列；
+        近距離往前時逐幀略過，較遠時由解碼器定位，並在背景線程預先解碼接下來的幾幀
+
+        參數：
+        - track_dir: 影像軌資料夾
+        - prefetch: 預先解碼的幀數
+        - cache_size: 已解碼幀的快取數量
+        """
+        self.track_dir = track_dir
+        self.track_id = os.path.basename(os.path.normpath(track_dir))
+        self.h5 = h5py.File(os.path.join(track_dir, "data.h5"), "r")
+        self.attrs: Dict[str, Any] = dict(self.h5.attrs)
+
+        # 逐幀欄位（metadata 列）
+        self.timestamps: np.ndarray = self.h5["timestamps"][:]
+        self.frame_indices: np.ndarray = self.h5["frame_indices"][:]
+        self.flags: Optional[np.ndarray] = (
+            self.h5["flags"][:] if "flags" in self.h5 else None
+        )
+        self.vocabulary_ids: Optional[np.ndarray] = (
+            self.h5["vocabulary_ids"][:] if "vocabulary_ids" in self.h5 else None
+        )
+        self.rois: Optional[np.ndarray] = self.h5["roi"][:] if "roi" in self.h5 else None
+        self.board_events: Optional[np.ndarray] = (
+            self.h5["board_events"][:] if "board_events" in self.h5 else None
+        )
+        self.vocabularies: List[List[str]] = json.loads(
+            self.attrs.get("detection_vocabularies", "[]")
+        )
+        self.stage_flags: List[str] = json.loads(self.attrs.get("stage_flags", "[]"))
+        self.pipeline_stages: List[str] = json.loads(
+            self.attrs.get("pipeline_stages", "[]")
+        )
+        self.stage_masks: Optional[np.ndarray] = (
+            self.h5["stage_mask"][:] if "stage_mask" in self.h5 else None
+        )
+        self.shed_masks: Optional[np.ndarray] = (
+            self.h5["shed_mask"][:] if "shed_mask" in self.h5 else None
+        )
+        self.ragged: Dict[str, Dict[str, np.ndarray]] = {}
+        for group_name in RAGGED_GROUPS:
+            if group_name in self.h5:
+                self.ragged[group_name] = {
+                    name: dataset[:] for name, dataset in self.h5[group_name].items()
+                }
+
+        # 影片解碼
+        self.capture = cv2.VideoCapture(os.path.join(track_dir, "video.mp4"))
+        self.fps: float = float(self.attrs.get("fps", self.capture.get(cv2.CAP_PROP_FPS)))
+        self.frame_count: int = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if len(self.frame_indices):
+            # 容器回報的幀數不一定準確，以寫入的索引為準
+            self.frame_count = max(self.frame_count, int(self.frame_indices[-1]) + 1)
+        # 編碼器的 GOP 長度（沒有記錄時為 0），只用來估計逐幀略過的距離上限
+        self.gop: int = int(self.attrs.get("encoder_gop", 0))
+        self.next_decode_index: int = 0
+        self.decoder_lock = threading.Lock()
+
+        # 快取與預先解碼
+        self.cache_size = max(cache_size, prefetch + 1)
+        self.cache: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.prefetch = prefetch
+        self.prefetch_target: int = -1
+        self.prefetch_condition = threading.Condition()
+        self.is_running = True
+        self.prefetch_thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+        self.prefetch_thread.start()
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    def get_frame(self, index: int) -> Optional[np.ndarray]:
+        """
+        獲取影片中第 index 幀（影片幀索引，包含補幀）
+        """
+        index = int(np.clip(index, 0, max(self.frame_count - 1, 0)))
+        frame = self._cached(index)
+        if frame is None:
+            frame = self._decode(index)
+        with self.prefetch_condition:
+            self.prefetch_target = index
+            self.prefetch_condition.notify()
         return frame
+
+    def row_for_frame(self, index: int) -> int:
+        """
+        影片幀索引對應的 metadata 列（補幀對應到被重複的那一列）
+        """
+        row = int(np.searchsorted(self.frame_indices, index, side="right")) - 1
+        return max(row, 0)
+
+    def row_at_time(self, timestamp: float) -> int:
+        """
+        時間戳對應的 metadata 列（最後一個不晚於 timestamp 的幀）
+        """
+        row = int(np.searchsorted(self.timestamps, timestamp, side="right")) - 1
+        return int(np.clip(row, 0, max(len(self.timestamps) - 1, 0)))
+
+    def get_data(self, row: int) -> Dict[str, Any]:
+        """
+        獲取一列 metadata
+        """
+        data: Dict[str, Any] = {
+            "timestamp": float(self.timestamps[row]),
+            "frame_index": int(self.frame_indices[row]),
+        }
+        if self.flags is not None:
+            flags = int(self.flags[row])
+            for bit, name in enumerate(self.stage_flags):
+                data[name] = bool(flags & (1 << bit))
+        if self.stage_masks is not None:
+            data["stages_ran"] = self._stage_names(int(self.stage_masks[row]))
+            data["stages_shed"] = self._stage_names(int(self.shed_masks[row]))
+        if self.rois is not None and self.rois[row][0] >= 0:
+            data["roi"] = self.rois[row]
+        if self.board_events is not None and self.board_events[row] != 0:
+            # 1: 鎖定黑板框, -1: 鏡頭移動解除鎖定
+            data["board_event"] = int(self.board_events[row])
+        if self.vocabulary_ids is not None and self.vocabulary_ids[row] >= 0:
+            data["detection_class"] = self.vocabularies[self.vocabulary_ids[row]]
+        for group_name, fields in self.ragged.items():
+            start = int(fields["offsets"][row])
+            end = start + int(fields["counts"][row])
+            names = [name for name in fields if name not in ("offsets", "counts")]
+            for name in names:
+                key = group_name if len(names) == 1 else f"{group_name}.{name}"
+                data[key] = fields[name][start:end]
+        return data
+
+    def _stage_names(self, mask: int) -> List[str]:
+        return [name for bit, name in enumerate(self.pipeline_stages) if mask & (1 << bit)]
+
+    def close(self) -> None:
+        self.is_running = False
+        with self.prefetch_condition:
+            self.prefetch_condition.notify()
+        self.prefetch_thread.join()
+        self.capture.release()
+        self.h5.close()
+
+    def _cached(self, index: int) -> Optional[np.ndarray]:
+        with self.cache_lock:
+            frame = self.cache.get(index)
+            if frame is not None:
+                self.cache.move_to_end(index)
+            return frame
+
+    def _store(self, index: int, frame: np.ndarray) -> None:
+        with self.cache_lock:
+            self.cache[index] = frame
+            self.cache.move_to_end(index)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _decode(self, index: int) -> Optional[np.ndarray]:
+        with self.decoder_lock:
+            frame = self._cached(index)
+            if frame is not None:
+                return frame
+            self._seek(index)
+            ret, frame = self.capture.read()
+            if not ret:
+                return None
+            self.next_decode_index = index + 1
+            self._store(index, frame)
+            return frame
+
+    def _seek(self, index: int) -> None:
+        """
+        將解碼器移動到 index 之前；近距離往前時直接略過，否則交給解碼器定位
+        """
+        distance = index - self.next_decode_index
+        # 往前的距離在一個 GOP 內時，逐幀略過比重新定位（從前一個關鍵幀解碼）便宜
+        max_skip = self.gop if self.gop > 0 else self.prefetch
+        if 0 <= distance <= max_skip:
+            for _ in range(distance):
+                self.capture.grab()
+            return
+        # CAP_PROP_POS_FRAMES 會從容器中實際的前一個關鍵幀解碼到 index，不需要再略過
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+
+    def _prefetch_loop(self) -> None:
+        handled = -1
+        while True:
+            with self.prefetch_condition:
+                while self.is_running and self.prefetch_target == handled:
+                    self.prefetch_condition.wait()
+                if not self.is_running:
+                    return
+                target = handled = self.prefetch_target
+            end = min(target + 1 + self.prefetch, self.frame_count)
+            for index in range(target + 1, end):
+                # 使用者已經跳到其他位置時放棄這一輪
+                if self.prefetch_target != target or not self.is_running:
+                    break
+                if self._cached(index) is None:
+                    self._decode(index)
+
+
+class StorageReader:
+    def __init__(self, recording_path: str, prefetch: int = 8):
+        """
+        讀取一次錄製的資料夾 (recordings/<name>/videos/<id>, audios/<id>)
+
+        參數：
+        - recording_path: 錄製資料夾
+        - prefetch: 每個影像軌預先解碼的幀數
+        """
+        self.recording_path = recording_path
+        self.video_tracks: Dict[str, VideoTrackReader] = {}
+        video_root = os.path.join(recording_path, "videos")
+        if os.path.isdir(video_root):
+            for track_id in sorted(os.listdir(video_root)):
+                track_dir = os.path.join(video_root, track_id)
+                if os.path.exists(os.path.join(track_dir, "data.h5")):
+                    self.video_tracks[track_id] = VideoTrackReader(
+                        track_dir, prefetch=prefetch
+                    )
+        if not self.video_tracks:
+            raise FileNotFoundError(f"No video tracks found in {recording_path}")
+
+    def close(self) -> None:
+        for track in self.video_tracks.values():
+            track.close()
@@ -0,0 +1,87 @@
+# benchmarks/binarization_benchmark.py
+#
+# 比較 skimage threshold_sauvola 與 ImageBinarizationStage 的 OpenCV Sauvola/Niblack 每幀耗時
+#
+#   python benchmarks/binarization_benchmark.py --frames 50 --window 25
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import FrameData  # noqa: E402
+from pipeline.stages.image_binarization_stage import (  # noqa: E402
+    ImageBinarizationStage,
+    METHOD_NIBLACK,
+    METHOD_SAUVOLA,
+)
+
+RESOLUTIONS = {"720p": (720, 1280), "1080p": (1080, 1920)}
+
+
+def make_board(shape, seed=0):
+    # 帶光線漸層與雜訊的白板文字
+    rng = np.random.default_rng(seed)
+    height, width = shape
+    gradient = np.linspace(140, 220, width, dtype=np.float32)[None, :]
+    board = np.repeat(gradient, height, axis=0)
+    for _ in range(400):
+        x, y = rng.integers(0, width - 40), rng.integers(0, height - 10)
+        board[y : y + 4, x : x + 40] -= 100
+    board += rng.normal(0, 6, size=shape)
+    gray = np.clip(board, 0, 255).astype(np.uint8)
+    return np.repeat(gray[..., None], 3, axis=2)
+
+
+def time_per_frame(func, frames: int) -> float:
+    func()  # 第一次呼叫會配置緩衝區
+    start = time.perf_counter()
+    for _ in range(frames):
+        func()
+    return (time.perf_counter() - start) / frames * 1000
+
+
+def bench(name, shape, frames, window):
+    frame = make_board(shape)
+    gray = frame[..., 0].copy()
+    data = FrameData(timestamp=0.0)
+    results = {}
+
+    try:
+        from skimage.filters import threshold_sauvola
+    except ImportError:
+        threshold_sauvola = None
+    if threshold_sauvola is not None:
+        results["skimage sauvola"] = time_per_frame(
+            lambda: gray > threshold_sauvola(gray, window_size=window), frames
+        )
+
+    for method in (METHOD_SAUVOLA, METHOD_NIBLACK):
+        stage = ImageBinarizationStage(method=method, window_size=window)
+        results[f"cv2 {method}"] = time_per_frame(
+            lambda: stage.process(frame, data), frames
+        )
+
+    print(f"{name} ({shape[1]}x{shape[0]}, window {window})")
+    for label, ms in results.items():
+        print(f"  {label:16s} {ms:7.2f} ms/frame")
+    if threshold_sauvola is None:
+        print("  (scikit-image not installed, skipped skimage path)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--window", type=int, default=25)
+    args = parser.parse_args()
+
+    for name, shape in RESOLUTIONS.items():
+        bench(name, shape, args.frames, args.window | 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/encoder_benchmark.py
+#
+# 比較不同編碼器/preset 的編碼速度與檔案大小
+#
+#   python benchmarks/encoder_benchmark.py --seconds 10 --size 1280x720
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.video_encoder import (  # noqa: E402
+    FFmpegVideoEncoder,
+    OpenCVVideoEncoder,
+    VideoEncoder,
+)
+
+
+def make_test_clip(width: int, height: int, frames: int) -> np.ndarray:
+    """
+    產生固定的測試片段：靜態黑板底圖、逐漸出現的板書，加上一個移動的人影
+    """
+    rng = np.random.default_rng(0)
+    board = np.full((height, width, 3), (40, 60, 40), dtype=np.uint8)
+    board += rng.integers(0, 12, size=board.shape, dtype=np.uint8)  # 粉筆灰雜訊
+    clip = np.empty((frames, height, width, 3), dtype=np.uint8)
+    for i in range(frames):
+        frame = board.copy()
+        for line in range(i * 12 // frames + 1):
+            y = 60 + line * (height - 120) // 12
+            cv2.putText(
+                frame,
+                f"f(x) = x^{line} + {line}x",
+                (40, y),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                height / 720,
+                (230, 230, 230),
+                2,
+            )
+        x = int((width - 200) * (0.5 + 0.5 * np.sin(i / 45)))
+        cv2.rectangle(frame, (x, height // 3), (x + 200, height), (90, 110, 160), -1)
+        clip[i] = frame
+    return clip
+
+
+def run(encoder: VideoEncoder, clip: np.ndarray, fps: float) -> dict:
+    frames, height, width = clip.shape[:3]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.mp4")
+        encoder.open(path, width, height, fps)
+        start = time.perf_counter()
+        for frame in clip:
+            encoder.write(frame)
+        encoder.close()
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+    minutes = frames / fps / 60
+    return {"encode_fps": frames / elapsed, "bytes_per_minute": size / minutes}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument(
+        "--presets", default="ultrafast,veryfast,medium", help="逗號分隔的 preset"
+    )
+    parser.add_argument("--crf", type=int, default=23)
+    args = parser.parse_args()
+
+    width, height = map(int, args.size.split("x"))
+    clip = make_test_clip(width, height, int(args.seconds * args.fps))
+
+    encoders = [("opencv mp4v", OpenCVVideoEncoder())]
+    for codec in ("libx264", "libx265"):
+        for preset in args.presets.split(","):
+            encoders.append(
+                (
+                    f"{codec} {preset} crf={args.crf}",
+                    FFmpegVideoEncoder(codec=codec, preset=preset, crf=args.crf),
+                )
+            )
+
+    print(f"{'encoder':<32}{'encode fps':>12}{'MB/min':>10}")
+    for name, encoder in encoders:
+        try:
+            result = run(encoder, clip, args.fps)
+        except Exception as e:
+            print(f"{name:<32}  failed: {e}")
+            continue
+        print(
+            f"{name:<32}{result['encode_fps']:>12.1f}"
+            f"{result['bytes_per_minute'] / 1e6:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
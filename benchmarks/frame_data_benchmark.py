@@ -0,0 +1,91 @@
+# benchmarks/frame_data_benchmark.py
+#
+# 比較每幀資料用 pydantic FrameDataModel 與 __slots__ 的 FrameData 的成本：
+# 建立 + 各階段寫入欄位 + 轉成 h5 欄位 (to_columns)，以及傳給工作程序時的 pickle
+#
+#   python benchmarks/frame_data_benchmark.py --frames 20000 --boxes 4
+
+import argparse
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import FrameData, FrameDataModel  # noqa: E402
+
+
+def make_boxes(rng, count):
+    boxes = rng.uniform(0, 1000, size=(count, 4)).astype(np.float32)
+    boxes[:, 2:] += boxes[:, :2]
+    return boxes
+
+
+def fill(data, people, blackboards):
+    # 與處理管道中各階段寫入的欄位相同
+    data.frame_size = (1920, 1080)
+    data.detection_class = ("person", "blackboard")
+    data.people_boxes = people
+    data.blackboard_boxes = blackboards
+    data.person_detection_stage_finish = True
+    data.roi = (100, 80, 1800, 1000)
+    data.deblurring_stage_finish = True
+    data.stage_mask |= 0b111
+
+
+def bench_model(people, blackboards, frames):
+    # 原本的做法：每幀建立 pydantic 模型，框為 list
+    people, blackboards = list(people), list(blackboards)
+    start = time.perf_counter()
+    for i in range(frames):
+        data = FrameDataModel(timestamp=float(i), source=0)
+        fill(data, people, blackboards)
+        data.to_columns()
+    return time.perf_counter() - start, data
+
+
+def bench_record(people, blackboards, frames):
+    start = time.perf_counter()
+    for i in range(frames):
+        data = FrameData(timestamp=float(i), source=0)
+        fill(data, people, blackboards)
+        data.to_columns()
+    return time.perf_counter() - start, data
+
+
+def bench_pickle(data, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.loads(payload)
+    return time.perf_counter() - start, len(payload)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--boxes", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    people = make_boxes(rng, args.boxes)
+    blackboards = make_boxes(rng, 1)
+
+    results = {
+        "FrameDataModel": bench_model(people, blackboards, args.frames),
+        "FrameData": bench_record(people, blackboards, args.frames),
+    }
+    print(f"{args.frames} frames, {args.boxes} people + 1 blackboard")
+    for label, (elapsed, data) in results.items():
+        pickled, size = bench_pickle(data, args.frames)
+        print(
+            f"  {label:16s} build+columns {elapsed / args.frames * 1e6:7.2f} us/frame"
+            f"  pickle {pickled / args.frames * 1e6:7.2f} us/frame ({size} bytes)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/h5_writer_benchmark.py
+#
+# 比較逐列 resize 寫入與 BufferedH5Writer 批次寫入的吞吐量
+#
+#   python benchmarks/h5_writer_benchmark.py --rows 20000
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import h5py
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.h5_writer import BufferedH5Writer  # noqa: E402
+
+
+def make_rows(count: int):
+    start = time.time()
+    return [
+        (i, start + i / 30, json.dumps({"timestamp": start + i / 30}))
+        for i in range(count)
+    ]
+
+
+def per_row(path: str, rows) -> None:
+    # 原本 SaveThread 的寫法：每列 resize 三個 dataset
+    with h5py.File(path, "w") as h5_file:
+        h5_file.create_dataset("frame_indices", shape=(0,), maxshape=(None,), dtype="i")
+        h5_file.create_dataset("timestamps", shape=(0,), maxshape=(None,), dtype="f8")
+        h5_file.create_dataset(
+            "data",
+            shape=(0,),
+            maxshape=(None,),
+            dtype=h5py.string_dtype(encoding="utf-8"),
+        )
+        for frame_index, timestamp, data in rows:
+            for name, value in (
+                ("frame_indices", frame_index),
+                ("timestamps", timestamp),
+                ("data", data),
+            ):
+                h5_file[name].resize((h5_file[name].shape[0] + 1,))
+                h5_file[name][-1] = value
+
+
+def batched(path: str, rows, flush_rows: int, compression) -> None:
+    with h5py.File(path, "w") as h5_file:
+        writer = BufferedH5Writer(
+            h5_file,
+            {
+                "frame_indices": "i4",
+                "timestamps": "f8",
+                "data": h5py.string_dtype(encoding="utf-8"),
+            },
+            flush_rows=flush_rows,
+            compression=compression,
+        )
+        for frame_index, timestamp, data in rows:
+            writer.append(frame_indices=frame_index, timestamps=timestamp, data=data)
+        writer.close()
+
+
+def measure(name: str, func, rows) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.h5")
+        start = time.perf_counter()
+        func(path)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+    print(f"{name:<28}{len(rows) / elapsed:>14.0f}{size / 1e6:>10.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--flush-rows", type=int, default=256)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    print(f"{'writer':<28}{'rows/s':>14}{'MB':>10}")
+    measure("per-row resize", lambda p: per_row(p, rows), rows)
+    measure(
+        f"batched ({args.flush_rows} rows)",
+        lambda p: batched(p, rows, args.flush_rows, None),
+        rows,
+    )
+    measure(
+        "batched + gzip",
+        lambda p: batched(p, rows, args.flush_rows, "gzip"),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
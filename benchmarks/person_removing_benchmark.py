@@ -0,0 +1,98 @@
+# benchmarks/person_removing_benchmark.py
+#
+# 比較 PersonRemovingStage 原本的 np.where 寫法與遮罩 / 矩形更新的每幀耗時
+#
+#   python benchmarks/person_removing_benchmark.py --frames 200 --people 3
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import FrameData  # noqa: E402
+from pipeline.stages.person_removing_stage import (  # noqa: E402
+    PersonRemovingStage,
+    UPDATE_MODE_MASK,
+    UPDATE_MODE_RECTS,
+)
+
+RESOLUTIONS = {"1080p": (1080, 1920), "4K": (2160, 3840)}
+
+
+def legacy_process(frame, people_boxes, canvas, padding=31):
+    # 原本的寫法：把人物區域設為 0 後以 np.where 找出非零像素
+    for box in people_boxes:
+        px1, py1, px2, py2 = map(int, box)
+        bx1 = max(px1 - padding, 0)
+        by1 = max(py1 - padding, 0)
+        bx2 = min(px2 + padding, frame.shape[1])
+        by2 = min(py2 + padding, frame.shape[0])
+        frame[by1:by2, bx1:bx2] = 0
+    non_zero_indices = np.where(frame != 0)
+    canvas[non_zero_indices] = frame[non_zero_indices]
+    return canvas
+
+
+def make_boxes(rng, shape, count, frames):
+    # 人物在畫面中緩慢移動
+    height, width = shape
+    boxes = []
+    for _ in range(count):
+        w, h = width // 8, height // 2
+        x = rng.integers(0, width - w)
+        y = rng.integers(height // 4, height - h)
+        boxes.append([x, y, w, h, rng.integers(-8, 9)])
+    per_frame = []
+    for i in range(frames):
+        frame_boxes = []
+        for x, y, w, h, dx in boxes:
+            fx = int(np.clip(x + dx * i, 0, width - w))
+            frame_boxes.append(np.array([fx, y, fx + w, y + h], dtype=np.float32))
+        per_frame.append(frame_boxes)
+    return per_frame
+
+
+def bench(name, shape, frames, people):
+    rng = np.random.default_rng(0)
+    source = rng.integers(0, 256, size=shape + (3,), dtype=np.uint8)
+    per_frame = make_boxes(rng, shape, people, frames)
+
+    # 原本的寫法會修改輸入，每幀需要一份新的 frame
+    canvas = np.zeros_like(source)
+    elapsed = 0.0
+    for boxes in per_frame:
+        frame = source.copy()
+        start = time.perf_counter()
+        legacy_process(frame, boxes, canvas)
+        elapsed += time.perf_counter() - start
+    results = {"legacy np.where": elapsed}
+
+    for mode in (UPDATE_MODE_MASK, UPDATE_MODE_RECTS):
+        stage = PersonRemovingStage(update_mode=mode)
+        start = time.perf_counter()
+        for boxes in per_frame:
+            data = FrameData(timestamp=0.0, people_boxes=boxes)
+            stage.process(source, data)
+        results[mode] = time.perf_counter() - start
+
+    print(f"{name} ({shape[1]}x{shape[0]}, {people} people)")
+    for label, total in results.items():
+        print(f"  {label:16s} {total / frames * 1000:7.2f} ms/frame")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--people", type=int, default=3)
+    args = parser.parse_args()
+
+    for name, shape in RESOLUTIONS.items():
+        bench(name, shape, args.frames, args.people)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/playback_seek_benchmark.py
+#
+# 量測多軌播放「時間 t 對應哪一幀」的延遲
+#
+#   python benchmarks/playback_seek_benchmark.py --hours 3 --tracks 4
+#   python benchmarks/playback_seek_benchmark.py --recording recordings/2024-09-15_22-44-08
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RecordingReader"
+    ),
+)
+
+
+def synthetic_timestamps(hours: float, fps: float, seed: int) -> np.ndarray:
+    # 帶抖動與偶爾掉幀的捕捉時間戳
+    rng = np.random.default_rng(seed)
+    count = int(hours * 3600 * fps)
+    intervals = rng.normal(1 / fps, 0.002 / fps * 30, size=count).clip(0.001)
+    intervals[rng.random(count) < 0.01] *= 2
+    return 1.7e9 + np.cumsum(intervals)
+
+
+def bench_lookup(hours: float, tracks: int, fps: float, seeks: int) -> None:
+    timelines = [synthetic_timestamps(hours, fps, seed) for seed in range(tracks)]
+    start = min(t[0] for t in timelines)
+    end = max(t[-1] for t in timelines)
+    targets = np.random.default_rng(42).uniform(start, end, size=seeks)
+
+    begin = time.perf_counter()
+    for t in targets:
+        for timeline in timelines:
+            np.searchsorted(timeline, t, side="right")
+    elapsed = time.perf_counter() - begin
+
+    frames = sum(len(t) for t in timelines)
+    print(f"{tracks} tracks x {hours}h ({frames} frames total)")
+    print(f"lookup: {elapsed / seeks * 1e6:.1f} us per seek (all tracks)")
+
+
+def bench_recording(path: str, seeks: int) -> None:
+    from storage_reader import StorageReader
+    from playback import PlaybackEngine
+
+    reader = StorageReader(path)
+    engine = PlaybackEngine(reader, audio_output=False)
+    targets = np.random.default_rng(42).uniform(engine.start_time, engine.end_time, seeks)
+    latencies = []
+    for t in targets:
+        begin = time.perf_counter()
+        engine.seek(t)
+        engine.frames_at(t)
+        latencies.append(time.perf_counter() - begin)
+    engine.close()
+    reader.close()
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f"{path}: {len(reader.video_tracks)} video tracks, {engine.duration:.0f}s")
+    print(
+        f"seek + decode ms: p50={np.percentile(latencies_ms, 50):.1f} "
+        f"p95={np.percentile(latencies_ms, 95):.1f} max={latencies_ms.max():.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, default=3)
+    parser.add_argument("--tracks", type=int, default=4)
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--seeks", type=int, default=10000)
+    parser.add_argument("--recording", help="實際錄製資料夾，量測含解碼的跳轉延遲")
+    args = parser.parse_args()
+
+    bench_lookup(args.hours, args.tracks, args.fps, args.seeks)
+    if args.recording:
+        bench_recording(args.recording, min(args.seeks, 200))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# benchmarks/startup_benchmark.py
+#
+# 量測啟動時 `import main` 的耗時（python -X importtime），並檢查重量級的函式庫
+# 沒有在啟動時匯入；超出預算或匯入了 DEFERRED_MODULES 時以非零狀態結束，可放在 CI 中防止退化
+#
+#   python benchmarks/startup_benchmark.py --runs 5 --budget-ms 1500
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只在對應的階段 / 功能第一次使用時才匯入的模組
+DEFERRED_MODULES = (
+    "ultralytics",  # 推論服務第一次推論 (pipeline/model_registry.py)
+    "torch",
+    "supervision",  # ObjectDetectionStage 第一次處理
+    "skimage",  # ImageBinarizationStage(method="skimage")
+    "pydantic",  # FrameDataModel（對外序列化）
+    "h5py",  # 第一次錄製
+    "sounddevice",  # 音訊來源開始捕獲
+)
+
+
+def import_profile(target: str) -> Dict[str, Tuple[int, int]]:
+    """
+    以 -X importtime 匯入 target，返回 模組 → (self, cumulative) 微秒
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {target} failed:\n{result.stderr[-2000:]}")
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+
+def import_wall_ms(target: str) -> float:
+    # 不含直譯器本身的啟動時間
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {target}; print((time.perf_counter() - start) * 1000)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {target} failed:\n{result.stderr[-2000:]}")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    profile = import_profile(args.target)
+    wall = [import_wall_ms(args.target) for _ in range(args.runs)]
+    median = statistics.median(wall)
+
+    print(f"import {args.target}: median {median:.1f} ms over {args.runs} runs")
+    print("slowest modules (self time):")
+    slowest = sorted(profile.items(), key=lambda item: item[1][0], reverse=True)
+    for name, (self_us, cumulative_us) in slowest[: args.top]:
+        print(f"  {self_us / 1000:8.2f} ms  {cumulative_us / 1000:8.2f} ms  {name}")
+
+    failed = False
+    loaded = sorted(
+        {name.split(".")[0] for name in profile} & set(DEFERRED_MODULES)
+    )
+    if loaded:
+        failed = True
+        print(f"FAIL: deferred modules imported at startup: {', '.join(loaded)}")
+    if median > args.budget_ms:
+        failed = True
+        print(f"FAIL: startup {median:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+    if failed:
+        sys.exit(1)
+    print(f"OK: within {args.budget_ms:.0f} ms budget, no deferred modules imported")
+
+
+if __name__ == "__main__":
+    main()
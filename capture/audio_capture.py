@@ -2,7 +2,6 @@ import threading
 import queue
 import time
 from typing import Optional
-import sounddevice as sd
 from .logger import logger
 
 
@@ -58,6 +57,9 @@ class AudioCapture:
             logger.warning("Audio capture is already running.")
             return
 
+        # PortAudio 只在有音訊來源開始捕獲時載入
+        import sounddevice as sd
+
         self.is_running = True
         try:
             self.stream = sd.InputStream(
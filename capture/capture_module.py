@@ -2,30 +2,61 @@ import threading
 import queue
 import time
 from datetime import datetime
-from capture.video_capture import VideoCapture
+from capture.video_capture import VideoCapture, EXECUTION_THREAD
 from capture.audio_capture import AudioCapture
-from typing import List, Optional
-from collections import defaultdict
+from capture.frame_ring_buffer import DROP_POLICY_LATEST
+from capture.latest_frame import FrameRecord
+from capture.preview import (
+    AdaptivePreviewQuality,
+    EncodedFrame,
+    PreviewService,
+    preview_payload,
+)
+from capture.preview_server import PreviewServer
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
 
 from controller import ControllerModule
 from .logger import logger
-from models.frame_data_model import FrameDataModel
 from pipeline.pipeline_stage import PipelineStage
-from storage.storage_module import StorageModule
+from pipeline.inference_server import get_inference_stats, shutdown_inference_server
 import cv2
 import numpy as np
-import base64
 from io import BytesIO
 
+if TYPE_CHECKING:
+    from storage.storage_module import StorageModule
+
+# 控制端串流使用的預覽設定
+PREVIEW_PROFILE_CONTROLLER = "controller"
+
 
 class VideoSource:
     def __init__(
         self,
         source: Optional[int] = None,
         pipelines: Optional[List[PipelineStage]] = [],
+        buffer_size: int = 4,
+        drop_policy: str = DROP_POLICY_LATEST,
+        encoder: Optional[Dict[str, Any]] = None,
+        frame_budget_ms: Optional[float] = None,
+        target_fps: Optional[float] = None,
+        optional_stages: Optional[List[str]] = None,
+        execution: str = EXECUTION_THREAD,
     ):
         self.source = source
         self.pipelines = pipelines
+        self.buffer_size = buffer_size
+        self.drop_policy = drop_policy
+        # 儲存時的編碼設定，例如 {"codec": "libx265", "crf": 28, "preset": "fast"}
+        self.encoder = encoder
+        # 每幀處理時間的預算（毫秒）；未指定時依 target_fps，都沒有則為攝影機的一幀時間
+        if frame_budget_ms is None and target_fps:
+            frame_budget_ms = 1000 / target_fps
+        self.frame_budget_ms = frame_budget_ms
+        # 超出預算時可略過的階段（類別名稱）
+        self.optional_stages = optional_stages or []
+        # 處理管道的執行方式，"process" 時在獨立的工作程序中執行（不受 GIL 限制）
+        self.execution = execution
 
 
 class AudioSource:
@@ -42,6 +73,7 @@ class CaptureModule:
         audio_sources: List[AudioSource] = [],
         preview_mode: bool = False,
         controller_module: Optional[ControllerModule] = None,
+        preview_config: Optional[Dict[str, Any]] = None,
     ):
         """
         初始化捕獲模組，包含影片和音頻來源。
@@ -49,26 +81,69 @@ class CaptureModule:
         參數：
         - video_sources: 影片來源列表。
         - audio_sources: 音頻來源列表。
+        - preview_config: 預覽設定 (fps, max_width, max_height, quality, binary,
+          adaptive, target_latency_ms, ack)。
         """
         self.video_captures: List[VideoCapture] = []
         self.audio_captures: List[AudioCapture] = []
-        self.storage_module: Optional[StorageModule] = None
+        self.storage_module: Optional["StorageModule"] = None
         self.preview_windows = {}
         self.preview_mode = preview_mode
         self.controller_module = controller_module
         self.is_running = True
         self.is_streaming: bool = False
+        self.encoder_configs: Dict[Any, Optional[Dict[str, Any]]] = {
+            source.source: source.encoder for source in video_sources
+        }
 
         # 初始化影片捕獲
         for source in video_sources:
             vc = VideoCapture(
                 source.source,
                 source.pipelines,
+                buffer_size=source.buffer_size,
+                drop_policy=source.drop_policy,
+                frame_budget_ms=source.frame_budget_ms,
+                optional_stages=source.optional_stages,
+                execution=source.execution,
             )
             self.video_captures.append(vc)
 
         logger.info(f"Video sources: {[vc.source for vc in self.video_captures]}")
 
+        # 預覽只在有訂閱者（本機視窗、串流）時編碼
+        preview_config = dict(preview_config or {})
+        # False 時串流沿用舊的 base64 frame_dict 格式
+        self.preview_binary: bool = preview_config.pop("binary", True)
+        adaptive = preview_config.pop("adaptive", True)
+        target_latency_ms = preview_config.pop("target_latency_ms", 200.0)
+        ack = preview_config.pop("ack", True)
+        self.preview = PreviewService(self.video_captures, **preview_config)
+        # 控制端串流有自己的預覽設定，依上行的送出延遲調整品質，
+        # 本機視窗與 HTTP 預覽維持原本的設定
+        self.preview_quality: Optional[AdaptivePreviewQuality] = None
+        # 本機 HTTP 預覽 (create_preview_server)
+        self.preview_server: Optional[PreviewServer] = None
+        if self.controller_module is not None:
+            self.preview.add_profile(PREVIEW_PROFILE_CONTROLLER)
+            if adaptive:
+                self.preview_quality = AdaptivePreviewQuality(
+                    self.preview,
+                    profile=PREVIEW_PROFILE_CONTROLLER,
+                    target_latency_ms=target_latency_ms,
+                )
+            # 預覽幀只送最新一幀，收到確認後才送下一幀
+            self.controller_module.open_stream(
+                "preview",
+                "DATA",
+                ack=ack,
+                on_sent=(
+                    self.preview_quality.report
+                    if self.preview_quality is not None
+                    else None
+                ),
+            )
+
         # 初始化音頻捕獲
         for source in audio_sources:
             ac = AudioCapture(
@@ -83,100 +158,114 @@ class CaptureModule:
 
     def start_preview(self):
         """
-        開始預覽，創建一個獨立的線程來顯示影片幀。
-        """
-        threading.Thread(target=self.__preview_loop, daemon=True).start()
-
-    def __preview_loop(self):
-        """
-        預覽循環，持續顯示所有影片來源的最新幀。
-        """
-        fps = 30
-        frame_interval = 1.0 / fps
-        last_send_time = time.time()
-
-        # 初始化每個影片來源的預覽視窗
-        for video_capture in self.video_captures:
-            source_id = video_capture.source
-            window_name = f"Preview - {source_id}"
-            self.preview_windows[source_id] = window_name
-
-            # 為每個影片來源創建視窗
-            logger.info(f"👀 Starting preview: {source_id}")
-            cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-        frame_dict = defaultdict(lambda: None)
-        # 顯示預覽的主循環
-        while self.is_running:
-            current_time = time.time()
-            elapsed_time = current_time - last_send_time
-
-            # 如果已經過的時間超過或等於一個幀的間隔，則發送幀
-            if elapsed_time >= frame_interval:
-                frame_dict = {}  # 重置 frame_dict 每次發送前
-
-                for video_capture in self.video_captures:
-                    frame = video_capture.buffer.get("frame")
-
-                    if frame is not None:
-                        # 檢查影像格式並處理
-                        if len(frame.shape) == 2:
-                            # 單通道灰階影像，轉換為 BGR
-                            frame_bgr = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-                        else:
-                            frame_bgr = frame
-
-                        # 編碼為 JPEG
-                        success, buffer = cv2.imencode(".jpg", frame_bgr)
-                        if success:
-                            # 將 JPEG 編碼轉為 base64 字串
-                            frame_bgr_base64 = base64.b64encode(buffer).decode("utf-8")
-                            frame_dict[video_capture.source] = frame_bgr_base64
-
-                            if self.preview_mode:
-                                # 顯示影像
-                                window_name = self.preview_windows.get(
-                                    video_capture.source, "Preview"
-                                )
-                                cv2.imshow(window_name, frame_bgr)
-                        else:
-                            print(f"Failed to encode frame from {video_capture.source}")
-
-                # 發送幀數據到控制器模塊
-                if frame_dict and self.is_streaming:  # 只有在有幀數據時才發送
-                    self.controller_module.send_event(
-                        "DATA", {"frame_dict": frame_dict}
-                    )
-                    # print(f"Sent frame_dict at {current_time}")
-
-                    # 更新最後發送時間
-                    last_send_time = current_time
-
-            # 處理視窗事件和顯示延遲
-            if cv2.waitKey(1) & 0xFF == ord("q"):
-                self.is_running = False
-
-            # 為了減少 CPU 使用率，可以在每次循環末尾稍作休眠
-            time.sleep(0.001)  # 1 毫秒
-        # 停止預覽時清理並關閉所有視窗
-        cv2.destroyAllWindows()
+        啟動預覽服務；預覽模式時以本機視窗訂閱，串流由 toggle_preview 訂閱。
+        """
+        if self.preview_mode:
+            for video_capture in self.video_captures:
+                window_name = f"Preview - {video_capture.source}"
+                self.preview_windows[video_capture.source] = window_name
+                # 為每個影片來源創建視窗
+                logger.info(f"👀 Starting preview: {video_capture.source}")
+                cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+            self.preview.subscribe("window", self._show_preview)
+        self.preview.start()
+
+    def _show_preview(self, frames: Dict[Any, EncodedFrame]) -> None:
+        """
+        在本機視窗顯示縮小後的預覽幀（與串流共用同一次縮放）。
+        """
+        for source, frame in frames.items():
+            # HTTP 預覽的線程可能同時在同一個緩衝區編碼較新的幀，先複製再顯示
+            image = self.preview.encoder.copy_image(frame)
+            cv2.imshow(self.preview_windows.get(source, "Preview"), image)
+        if cv2.waitKey(1) & 0xFF == ord("q"):
+            self.is_running = False
+            self.preview.unsubscribe("window")
+            cv2.destroyAllWindows()
+
+    def _send_preview(self, frames: Dict[Any, EncodedFrame]) -> None:
+        """
+        將預覽幀送到控制器模塊，JPEG 以二進位附件傳送。
+        """
+        self.controller_module.stream(
+            "preview", preview_payload(frames, binary=self.preview_binary)
+        )
+
+    def get_frame_buffer(self) -> Dict[int, Optional[FrameRecord]]:
+        """
+        獲取所有影片來源的最新幀紀錄。
+
+        返回：
+        - records: 幀紀錄字典，鍵為來源ID；紀錄內的幀、資料和時間戳來自同一次處理。
+        """
+        return {vc.source: vc.latest.get() for vc in self.video_captures}
 
-    def get_frame_buffer(self):
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        獲取每個來源各處理階段的耗時分佈、捕捉/丟幀統計，錄製中時包含儲存端統計。
+        推論服務已啟動時包含每個來源的推論延遲與批次大小（以程序模式執行的管道
+        使用工作程序內的推論服務，不在這裡）。
+        """
+        metrics: Dict[str, Any] = {
+            "sources": {
+                str(vc.source): {
+                    "stages": vc.processing_pipeline.get_metrics(),
+                    "capture": vc.get_stats(),
+                }
+                for vc in self.video_captures
+            }
+        }
+        metrics["preview"] = self.preview.get_stats()
+        if self.preview_quality is not None:
+            metrics["preview"]["adaptive"] = self.preview_quality.get_stats()
+        if self.preview_server is not None:
+            metrics["preview"]["server"] = self.preview_server.get_stats()
+        if self.controller_module is not None:
+            metrics["controller"] = self.controller_module.get_stats()
+        inference = get_inference_stats()
+        if inference is not None:
+            metrics["inference"] = inference
+        storage_module = self.storage_module
+        if storage_module is not None:
+            metrics["storage"] = storage_module.get_metrics()
+        return metrics
+
+    def create_preview_server(self, **config: Any) -> PreviewServer:
         """
-        獲取所有影片來源的幀、資料和時間戳。
+        建立本機 HTTP 預覽服務（MJPEG / 快照），與其他預覽消費者共用編碼快取。
+        需在事件迴圈中 await start() 啟動。
+
+        參數：
+        - config: 見 PreviewServer (host, port, fps, max_clients)
 
         返回：
-        - videos: 影片幀字典，鍵為來源ID。
-        - data: 資料字典，鍵為來源ID。
-        - timestamp: 時間戳字典，鍵為來源ID。
+        - preview_server: 預覽服務
+        """
+        self.preview_server = PreviewServer(self.preview, **config)
+        return self.preview_server
+
+    def get_stage_names(self, source: Any) -> List[str]:
+        """
+        獲取影片來源處理管道的階段名稱（依序），對應逐幀的 stage_mask / shed_mask。
+        """
+        for vc in self.video_captures:
+            if vc.source == source:
+                return vc.processing_pipeline.get_stage_names()
+        return []
+
+    def set_frame_budget(self, source: Any, frame_budget_ms: Optional[float]) -> None:
+        """
+        設置影片來源每幀處理時間的預算（毫秒），None 為不限。
         """
-        videos = {}
-        data = {}
-        timestamp = {}
         for vc in self.video_captures:
-            videos[vc.source] = vc.buffer.get("frame")
-            data[vc.source] = vc.buffer.get("data")
-            timestamp[vc.source] = vc.buffer.get("timestamp")
-        return videos, data, timestamp
+            if vc.source == source:
+                vc.processing_pipeline.set_frame_budget(frame_budget_ms)
+
+    def get_encoder_config(self, source: Any) -> Optional[Dict[str, Any]]:
+        """
+        獲取影片來源的編碼設定，None 表示使用預設值。
+        """
+        return self.encoder_configs.get(source)
 
     def check_all_ready(self):
         """
@@ -186,7 +275,7 @@ class CaptureModule:
         - True 如果所有影片來源都有幀，否則 False。
         """
         for vc in self.video_captures:
-            if vc.buffer.get("frame") is None:
+            if vc.latest.get() is None:
                 return False
         return True
 
@@ -200,8 +289,7 @@ class CaptureModule:
         for ac in self.audio_captures:
             logger.info(f"🎙️ Starting audio capture: {ac.source}")
             ac.start()
-        if self.preview_mode:
-            self.start_preview()
+        self.start_preview()
 
     def stop_all_captures(self):
         """
@@ -209,10 +297,12 @@ class CaptureModule:
         """
         self.is_running = False
         logger.info("🛑 Stopping all captures")
+        self.preview.stop()
         for vc in self.video_captures:
             vc.stop()
         for ac in self.audio_captures:
             ac.stop()
+        shutdown_inference_server()
         cv2.destroyAllWindows()
         # 如果錄製正在進行，停止它
         if self.storage_module:
@@ -222,27 +312,41 @@ class CaptureModule:
         """
         開始錄製，初始化 StorageModule 並啟動保存線程。
         """
+        # h5py 等儲存相關的函式庫在第一次錄製時才匯入
+        from storage.storage_module import StorageModule, VIDEO_MODE_TIMELINE
+
         file_name = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         self.storage_module = StorageModule(file_name, self)
         while not self.check_all_ready():
             time.sleep(0.1)  # 避免忙等待
         for ac in self.audio_captures:
             ac.audio_buffer = self.storage_module.audio_buffers[ac.source]
+        if self.storage_module.video_mode == VIDEO_MODE_TIMELINE:
+            for vc in self.video_captures:
+                vc.record_queue = self.storage_module.video_queue
         self.storage_module.start()
 
     def stop_recording(self) -> None:
         """
         停止錄製，並釋放 StorageModule 資源。
         """
+        for vc in self.video_captures:
+            vc.record_queue = None
+        for ac in self.audio_captures:
+            ac.audio_buffer = None
+
         if self.storage_module:
             self.storage_module.stop()
             self.storage_module = None
 
-        for ac in self.audio_captures:
-            ac.audio_buffer = None
-
     def toggle_preview(self):
         """
         切換預覽模式。
         """
         self.is_streaming = not self.is_streaming
+        if self.is_streaming:
+            self.preview.subscribe(
+                "controller", self._send_preview, profile=PREVIEW_PROFILE_CONTROLLER
+            )
+        else:
+            self.preview.unsubscribe("controller")
@@ -0,0 +1,187 @@
+# capture/frame_ring_buffer.py
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 丟幀策略
+DROP_POLICY_LATEST = "latest"  # 只處理最新的一幀，其餘全部丟棄
+DROP_POLICY_DROP_OLDEST = "drop_oldest"  # 依序處理，滿了就覆寫最舊的一幀
+DROP_POLICY_BLOCK = "block"  # 依序處理，滿了就讓捕捉端等待
+DROP_POLICIES = (DROP_POLICY_LATEST, DROP_POLICY_DROP_OLDEST, DROP_POLICY_BLOCK)
+
+# 槽位狀態
+_FREE = 0
+_FILLING = 1
+_READY = 2
+_IN_USE = 3
+
+
+class FrameRingBuffer:
+    def __init__(self, capacity: int = 4, drop_policy: str = DROP_POLICY_LATEST):
+        """
+        固定大小、預先配置的影片幀環形緩衝區（單一生產者/單一消費者）
+
+        每個槽位的 numpy 陣列在第一次寫入後重複使用，捕捉端直接讀入槽位，
+        不會每幀配置新的記憶體
+
+        參數：
+        - capacity: 槽位數（至少 3：一個寫入中、一個處理中、一個待處理）
+        - drop_policy: 丟幀策略，見 DROP_POLICIES
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.capacity = max(3, capacity)
+        self.drop_policy = drop_policy
+
+        self.slots: List[Optional[np.ndarray]] = [None] * self.capacity
+        self.states: List[int] = [_FREE] * self.capacity
+        self.timestamps: List[float] = [0.0] * self.capacity
+        self.sequences: List[int] = [0] * self.capacity
+        self.next_sequence: int = 0
+
+        self.condition = threading.Condition()
+        self.closed: bool = False
+
+        # 統計
+        self.captured: int = 0
+        self.processed: int = 0
+        self.dropped: int = 0
+        self.blocked_time: float = 0.0
+
+    def preallocate(self, slots: List[np.ndarray]) -> None:
+        """
+        指定各槽位使用的陣列（例如共享記憶體），需在第一次寫入前呼叫
+
+        參數：
+        - slots: 與 capacity 等長的陣列列表
+        """
+        if len(slots) != self.capacity:
+            raise ValueError(f"Expected {self.capacity} slots, got {len(slots)}")
+        with self.condition:
+            self.slots = list(slots)
+
+    def begin_write(self) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        取得一個可寫入的槽位
+
+        返回：
+        - index: 槽位索引，緩衝區已關閉時為 -1
+        - slot: 可重複使用的陣列（第一次寫入前為 None）
+        """
+        with self.condition:
+            while not self.closed:
+                index = self._find_state(_FREE)
+                if index < 0 and self.drop_policy != DROP_POLICY_BLOCK:
+                    # 回收最舊、尚未處理的一幀
+                    index = self._oldest_ready()
+                    if index >= 0:
+                        self.dropped += 1
+                if index >= 0:
+                    self.states[index] = _FILLING
+                    return index, self.slots[index]
+                start = time.perf_counter()
+                self.condition.wait(timeout=0.1)
+                self.blocked_time += time.perf_counter() - start
+            return -1, None
+
+    def commit_write(self, index: int, frame: np.ndarray, timestamp: float) -> None:
+        """
+        寫入完成，將槽位交給處理端
+
+        參數：
+        - index: begin_write 取得的槽位索引
+        - frame: 讀入的影片幀（通常就是槽位本身；尺寸改變時為新陣列）
+        - timestamp: 捕捉時間戳
+        """
+        with self.condition:
+            self.slots[index] = frame
+            self.timestamps[index] = timestamp
+            self.sequences[index] = self.next_sequence
+            self.next_sequence += 1
+            self.states[index] = _READY
+            self.captured += 1
+            self.condition.notify_all()
+
+    def abort_write(self, index: int) -> None:
+        with self.condition:
+            self.states[index] = _FREE
+            self.condition.notify_all()
+
+    def acquire(
+        self, timeout: Optional[float] = None
+    ) -> Optional[Tuple[int, np.ndarray, float]]:
+        """
+        取得下一幀來處理；latest 策略會取最新一幀並丟棄較舊的幀
+
+        參數：
+        - timeout: 最多等待秒數
+
+        返回：
+        - (index, frame, timestamp)，逾時或已關閉時為 None
+        """
+        with self.condition:
+            deadline = None if timeout is None else time.perf_counter() + timeout
+            while True:
+                if self.drop_policy == DROP_POLICY_LATEST:
+                    index = self._newest_ready()
+                    if index >= 0:
+                        for i in range(self.capacity):
+                            if i != index and self.states[i] == _READY:
+                                self.states[i] = _FREE
+                                self.dropped += 1
+                else:
+                    index = self._oldest_ready()
+
+                if index >= 0:
+                    self.states[index] = _IN_USE
+                    return index, self.slots[index], self.timestamps[index]
+                if self.closed:
+                    return None
+
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(timeout=remaining)
+
+    def release(self, index: int) -> None:
+        """
+        處理完成，歸還槽位
+        """
+        with self.condition:
+            self.states[index] = _FREE
+            self.processed += 1
+            self.condition.notify_all()
+
+    def close(self) -> None:
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.condition:
+            return {
+                "drop_policy": self.drop_policy,
+                "capacity": self.capacity,
+                "captured": self.captured,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "blocked_ms": self.blocked_time * 1000,
+                "pending": self.states.count(_READY),
+            }
+
+    def _find_state(self, state: int) -> int:
+        for i, s in enumerate(self.states):
+            if s == state:
+                return i
+        return -1
+
+    def _oldest_ready(self) -> int:
+        ready = [i for i in range(self.capacity) if self.states[i] == _READY]
+        return min(ready, key=lambda i: self.sequences[i]) if ready else -1
+
+    def _newest_ready(self) -> int:
+        ready = [i for i in range(self.capacity) if self.states[i] == _READY]
+        return max(ready, key=lambda i: self.sequences[i]) if ready else -1
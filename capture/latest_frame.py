@@ -0,0 +1,79 @@
+# capture/latest_frame.py
+
+import threading
+import time
+from typing import Any, NamedTuple, Optional
+
+
+class FrameRecord(NamedTuple):
+    """
+    不可變的幀紀錄，幀、資料與時間戳永遠來自同一次處理
+    """
+
+    seq: int
+    frame: Any
+    data: Any
+    timestamp: float
+
+
+class LatestFrameSlot:
+    def __init__(self) -> None:
+        """
+        帶序號的「最新一幀」槽位
+
+        寫入端以單一參考替換發布新的 FrameRecord，讀取端 get() 不需上鎖；
+        需要等待新幀的消費者使用 wait_newer() 阻塞等待，而不是輪詢
+        """
+        self._record: Optional[FrameRecord] = None
+        self._seq: int = 0
+        self._condition = threading.Condition()
+
+    def publish(self, frame: Any, data: Any, timestamp: float) -> FrameRecord:
+        """
+        發布新的一幀
+
+        返回：
+        - record: 發布的紀錄
+        """
+        with self._condition:
+            self._seq += 1
+            record = FrameRecord(self._seq, frame, data, timestamp)
+            self._record = record  # 單一參考替換
+            self._condition.notify_all()
+        return record
+
+    def get(self) -> Optional[FrameRecord]:
+        """
+        獲取目前最新的一幀，尚未有幀時為 None
+        """
+        return self._record
+
+    @property
+    def seq(self) -> int:
+        record = self._record
+        return record.seq if record is not None else 0
+
+    def wait_newer(self, seq: int, timeout: Optional[float] = None) -> Optional[FrameRecord]:
+        """
+        等待序號大於 seq 的幀
+
+        參數：
+        - seq: 已經處理過的序號
+        - timeout: 最多等待秒數
+
+        返回：
+        - record: 較新的紀錄，逾時則為 None
+        """
+        record = self._record
+        if record is not None and record.seq > seq:
+            return record
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                record = self._record
+                if record is not None and record.seq > seq:
+                    return record
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(timeout=remaining)
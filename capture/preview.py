@@ -0,0 +1,481 @@
+# capture/preview.py
+
+import base64
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .latest_frame import FrameRecord
+from .logger import logger
+
+# 預設的預覽設定（本機視窗與 HTTP 預覽），其他消費者可以另外建立自己的設定
+PROFILE_DEFAULT = "default"
+
+
+class EncodedFrame(NamedTuple):
+    """
+    一個來源某一幀的預覽編碼結果，所有預覽消費者共用
+    """
+
+    source: Any
+    seq: int
+    timestamp: float
+    width: int
+    height: int
+    jpeg: bytes
+    # 縮小後的 BGR 影像，為重複使用的緩衝區，其他線程隨時可能編碼下一幀並覆寫；
+    # 需要影像的消費者以 PreviewEncoder.copy_image() 取得複本
+    image: np.ndarray
+
+
+class _SourceBuffers:
+    def __init__(self) -> None:
+        self.resized: Optional[np.ndarray] = None
+        self.bgr: Optional[np.ndarray] = None
+        self.cached: Optional[EncodedFrame] = None
+
+
+class PreviewEncoder:
+    def __init__(self, max_width: int = 640, max_height: int = 360, quality: int = 70):
+        """
+        預覽編碼：先縮小到預覽解析度再 JPEG 編碼，每個來源依序號快取最新一幀，
+        同一幀不論有多少消費者都只編碼一次；縮小與色彩轉換的緩衝區重複使用
+
+        參數：
+        - max_width / max_height: 預覽解析度上限（維持長寬比）
+        - quality: JPEG 品質 (1-100)
+        """
+        self.max_width = max_width
+        self.max_height = max_height
+        self.quality = quality
+        self.encode_params: List[int] = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.buffers: Dict[Any, _SourceBuffers] = {}
+        self.lock = threading.Lock()
+        self.encoded: int = 0
+        self.cache_hits: int = 0
+
+    def configure(
+        self,
+        max_width: Optional[int] = None,
+        max_height: Optional[int] = None,
+        quality: Optional[int] = None,
+    ) -> None:
+        """
+        調整預覽解析度與品質，已快取的編碼結果失效
+        """
+        with self.lock:
+            if max_width is not None:
+                self.max_width = max(16, int(max_width))
+            if max_height is not None:
+                self.max_height = max(16, int(max_height))
+            if quality is not None:
+                self.quality = int(np.clip(quality, 1, 100))
+                self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+            for buffers in self.buffers.values():
+                buffers.cached = None
+
+    def encode(self, source: Any, record: FrameRecord) -> Optional[EncodedFrame]:
+        """
+        取得這一幀的預覽編碼，已經編碼過的序號直接回傳快取
+
+        參數：
+        - source: 影片來源ID
+        - record: 來源的最新幀紀錄
+
+        返回：
+        - encoded: 編碼結果，編碼失敗時為 None
+        """
+        with self.lock:
+            buffers = self.buffers.setdefault(source, _SourceBuffers())
+            cached = buffers.cached
+            if cached is not None and cached.seq == record.seq:
+                self.cache_hits += 1
+                return cached
+
+            image = self._resize(buffers, record.frame)
+            success, jpeg = cv2.imencode(".jpg", image, self.encode_params)
+            if not success:
+                logger.warning(f"Failed to encode preview frame from {source}")
+                return None
+            self.encoded += 1
+            height, width = image.shape[:2]
+            buffers.cached = EncodedFrame(
+                source,
+                record.seq,
+                record.timestamp,
+                width,
+                height,
+                jpeg.tobytes(),
+                image,
+            )
+            return buffers.cached
+
+    def copy_image(self, encoded: EncodedFrame) -> np.ndarray:
+        """
+        在編碼鎖內複製縮小後的影像，不會拿到編碼到一半的緩衝區
+        （緩衝區已被同一來源較新的幀覆寫時，得到的是較新的完整影像）
+        """
+        with self.lock:
+            return encoded.image.copy()
+
+    def _resize(self, buffers: _SourceBuffers, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.max_width / width, self.max_height / height)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if scale < 1.0:
+            shape = (size[1], size[0]) + frame.shape[2:]
+            if buffers.resized is None or buffers.resized.shape != shape:
+                buffers.resized = np.empty(shape, dtype=frame.dtype)
+            cv2.resize(frame, size, dst=buffers.resized, interpolation=cv2.INTER_AREA)
+            frame = buffers.resized
+        if frame.ndim == 2:
+            # 單通道灰階影像轉成 BGR
+            shape = frame.shape + (3,)
+            if buffers.bgr is None or buffers.bgr.shape != shape:
+                buffers.bgr = np.empty(shape, dtype=frame.dtype)
+            cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR, dst=buffers.bgr)
+            frame = buffers.bgr
+        return frame
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_width": self.max_width,
+            "max_height": self.max_height,
+            "quality": self.quality,
+            "encoded": self.encoded,
+            "cache_hits": self.cache_hits,
+        }
+
+
+def preview_payload(frames: Dict[Any, EncodedFrame], binary: bool = True) -> dict:
+    """
+    組成送給控制端的 DATA 事件內容
+
+    參數：
+    - frames: 以來源ID為鍵的編碼結果
+    - binary: True 時 JPEG 以 Socket.IO 二進位附件傳送，False 時為舊的 base64 frame_dict
+
+    返回：
+    - payload: 事件內容
+    """
+    if not binary:
+        return {
+            "frame_dict": {
+                source: base64.b64encode(frame.jpeg).decode("utf-8")
+                for source, frame in frames.items()
+            }
+        }
+    return {
+        "preview": {
+            str(source): {
+                "seq": frame.seq,
+                "timestamp": frame.timestamp,
+                "width": frame.width,
+                "height": frame.height,
+                "jpeg": frame.jpeg,
+            }
+            for source, frame in frames.items()
+        }
+    }
+
+
+class _Profile:
+    def __init__(self, encoder: PreviewEncoder, fps: float) -> None:
+        # 一組預覽設定：自己的編碼器（解析度、品質、快取）與推送頻率
+        self.encoder = encoder
+        self.fps = fps
+        self.last_push: float = 0.0
+        self.last_seqs: Dict[Any, int] = {}  # 每個來源上次推送過的序號
+
+
+class PreviewService:
+    def __init__(
+        self,
+        video_captures: List[Any],
+        fps: float = 15.0,
+        max_width: int = 640,
+        max_height: int = 360,
+        quality: int = 70,
+    ):
+        """
+        預覽服務：有訂閱者時才以固定頻率編碼各來源的新幀並推送給訂閱者
+
+        每個訂閱者屬於一組設定 (add_profile)，同一組設定的訂閱者共用編碼結果；
+        不同的設定各自編碼，例如控制端串流依上行頻寬降低品質時不影響本機預覽
+
+        參數：
+        - video_captures: 影片捕捉模塊列表（讀取各自的 latest 槽位）
+        - fps: 推送頻率上限
+        - max_width / max_height / quality: 見 PreviewEncoder
+        """
+        self.video_captures = video_captures
+        self.fps = fps
+        self.encoder = PreviewEncoder(max_width, max_height, quality)
+        self.profiles: Dict[str, _Profile] = {PROFILE_DEFAULT: _Profile(self.encoder, fps)}
+        # 訂閱者名稱 → (設定名稱, 回呼 (frames: {來源ID: EncodedFrame}) -> None)，在預覽線程中呼叫
+        self.subscribers: Dict[
+            str, Tuple[str, Callable[[Dict[Any, EncodedFrame]], None]]
+        ] = {}
+        self.condition = threading.Condition()
+        self.is_running: bool = False
+        self.thread: Optional[threading.Thread] = None
+
+    def add_profile(
+        self,
+        name: str,
+        fps: Optional[float] = None,
+        max_width: Optional[int] = None,
+        max_height: Optional[int] = None,
+        quality: Optional[int] = None,
+    ) -> PreviewEncoder:
+        """
+        建立一組預覽設定，未指定的參數沿用預設設定
+
+        返回：
+        - encoder: 這組設定的編碼器
+        """
+        encoder = PreviewEncoder(
+            max_width or self.encoder.max_width,
+            max_height or self.encoder.max_height,
+            quality or self.encoder.quality,
+        )
+        with self.condition:
+            self.profiles[name] = _Profile(encoder, fps or self.fps)
+        return encoder
+
+    def set_profile_fps(self, name: str, fps: float) -> None:
+        self.profiles[name].fps = fps
+        if name == PROFILE_DEFAULT:
+            self.fps = fps
+
+    def subscribe(
+        self,
+        name: str,
+        callback: Callable[[Dict[Any, EncodedFrame]], None],
+        profile: str = PROFILE_DEFAULT,
+    ) -> None:
+        with self.condition:
+            if profile not in self.profiles:
+                raise ValueError(f"Unknown preview profile: {profile}")
+            self.subscribers[name] = (profile, callback)
+            self.condition.notify_all()
+        logger.info(f"👀 Preview subscriber added: {name}")
+
+    def unsubscribe(self, name: str) -> None:
+        with self.condition:
+            if self.subscribers.pop(name, None) is not None:
+                logger.info(f"👀 Preview subscriber removed: {name}")
+
+    def get_frame(self, source: Any) -> Optional[EncodedFrame]:
+        """
+        取得來源最新一幀的預覽編碼（與推送共用快取），尚未有幀時為 None
+        """
+        vc = self._find(source)
+        if vc is None:
+            return None
+        record = vc.latest.get()
+        return None if record is None else self.encoder.encode(source, record)
+
+    def wait_frame(
+        self, source: Any, seq: int = 0, timeout: Optional[float] = None
+    ) -> Optional[EncodedFrame]:
+        """
+        等待來源序號大於 seq 的幀並取得其預覽編碼（與推送共用快取）
+
+        參數：
+        - source: 影片來源ID
+        - seq: 已經取得過的序號
+        - timeout: 最多等待秒數
+
+        返回：
+        - encoded: 編碼結果，逾時或沒有此來源時為 None
+        """
+        vc = self._find(source)
+        if vc is None:
+            return None
+        record = vc.latest.wait_newer(seq, timeout=timeout)
+        return None if record is None else self.encoder.encode(source, record)
+
+    def _find(self, source: Any) -> Optional[Any]:
+        for vc in self.video_captures:
+            if vc.source == source:
+                return vc
+        return None
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _loop(self) -> None:
+        while True:
+            with self.condition:
+                # 沒有訂閱者時不讀取也不編碼
+                while self.is_running and not self.subscribers:
+                    self.condition.wait()
+                if not self.is_running:
+                    break
+                # 設定名稱 → 該設定的訂閱者
+                active: Dict[str, List[Tuple[str, Callable]]] = {}
+                for name, (profile, callback) in self.subscribers.items():
+                    active.setdefault(profile, []).append((name, callback))
+
+            tick_start = time.perf_counter()
+            for profile_name, subscribers in active.items():
+                profile = self.profiles[profile_name]
+                # 各設定依自己的頻率推送（容許一點誤差，避免因排程晚一點而跳過一輪）
+                if tick_start - profile.last_push < 0.9 / profile.fps:
+                    continue
+                profile.last_push = tick_start
+                frames = self._encode_new(profile)
+                if not frames:
+                    continue
+                for name, callback in subscribers:
+                    try:
+                        callback(frames)
+                    except Exception as e:
+                        logger.error(f"Preview subscriber {name} failed: {e}")
+
+            fastest = max(self.profiles[name].fps for name in active)
+            remaining = 1.0 / fastest - (time.perf_counter() - tick_start)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def _encode_new(self, profile: _Profile) -> Dict[Any, EncodedFrame]:
+        frames: Dict[Any, EncodedFrame] = {}
+        for vc in self.video_captures:
+            record = vc.latest.get()
+            # 沒有新幀時不重複推送
+            if record is None or record.seq == profile.last_seqs.get(vc.source):
+                continue
+            encoded = profile.encoder.encode(vc.source, record)
+            if encoded is not None:
+                profile.last_seqs[vc.source] = record.seq
+                frames[vc.source] = encoded
+        return frames
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.condition:
+            subscribers = {name: profile for name, (profile, _) in self.subscribers.items()}
+        return {
+            "fps": self.fps,
+            "subscribers": list(subscribers),
+            **self.encoder.get_stats(),
+            "profiles": {
+                name: {
+                    "fps": profile.fps,
+                    "subscribers": [s for s, p in subscribers.items() if p == name],
+                    **profile.encoder.get_stats(),
+                }
+                for name, profile in self.profiles.items()
+            },
+        }
+
+
+# 自動調整時的各級設定：(fps 倍數, 解析度倍數, JPEG 品質差)，第 0 級為設定值
+PREVIEW_STEPS = (
+    (1.0, 1.0, 0),
+    (1.0, 0.75, -10),
+    (0.67, 0.75, -20),
+    (0.5, 0.5, -25),
+    (0.33, 0.5, -30),
+)
+
+
+class AdaptivePreviewQuality:
+    def __init__(
+        self,
+        service: PreviewService,
+        profile: str = PROFILE_DEFAULT,
+        target_latency_ms: float = 200.0,
+        down_cooldown: float = 1.0,
+        up_cooldown: float = 5.0,
+    ):
+        """
+        依串流實際的送出延遲調整預覽的 fps、解析度與 JPEG 品質（見 PREVIEW_STEPS）
+
+        只調整指定的預覽設定 (profile)，其他消費者不受影響。
+        延遲的移動平均超過目標就降一級；低於目標的一半且維持 up_cooldown 秒才升一級，
+        避免來回跳動。設定值為最高一級
+
+        參數：
+        - service: 預覽服務
+        - profile: 要調整的預覽設定名稱
+        - target_latency_ms: 目標送出延遲（毫秒）
+        - down_cooldown / up_cooldown: 兩次降級 / 升級之間至少間隔的秒數
+        """
+        self.service = service
+        self.profile = profile
+        self.target_latency_ms = target_latency_ms
+        self.down_cooldown = down_cooldown
+        self.up_cooldown = up_cooldown
+        settings = service.profiles[profile]
+        encoder = settings.encoder
+        self.base = (settings.fps, encoder.max_width, encoder.max_height, encoder.quality)
+        self.level: int = 0
+        self.latency_ms: Optional[float] = None
+        self.last_change: float = time.monotonic()
+        self.level_changes: int = 0
+
+    def report(self, latency: float) -> None:
+        """
+        回報一次送出的延遲（秒）
+        """
+        latency_ms = latency * 1000
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms = self.latency_ms * 0.8 + latency_ms * 0.2
+
+        since_change = time.monotonic() - self.last_change
+        if (
+            self.latency_ms > self.target_latency_ms
+            and self.level < len(PREVIEW_STEPS) - 1
+            and since_change > self.down_cooldown
+        ):
+            self.set_level(self.level + 1)
+        elif (
+            self.latency_ms < self.target_latency_ms / 2
+            and self.level > 0
+            and since_change > self.up_cooldown
+        ):
+            self.set_level(self.level - 1)
+
+    def set_level(self, level: int) -> None:
+        fps_scale, size_scale, quality_delta = PREVIEW_STEPS[level]
+        fps, max_width, max_height, quality = self.base
+        self.service.set_profile_fps(self.profile, max(1.0, fps * fps_scale))
+        self.service.profiles[self.profile].encoder.configure(
+            max_width=int(max_width * size_scale),
+            max_height=int(max_height * size_scale),
+            quality=quality + quality_delta,
+        )
+        logger.info(
+            f"👀 Preview {self.profile} level {self.level} -> {level} "
+            f"(send latency {self.latency_ms:.0f} ms, target {self.target_latency_ms:.0f} ms)"
+        )
+        self.level = level
+        self.level_changes += 1
+        self.last_change = time.monotonic()
+        self.latency_ms = None  # 以新設定重新量測
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "level": self.level,
+            "level_changes": self.level_changes,
+            "latency_ms": round(self.latency_ms or 0.0, 2),
+            "target_latency_ms": self.target_latency_ms,
+        }
@@ -0,0 +1,179 @@
+# capture/preview_server.py
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from .logger import logger
+from .preview import PreviewService
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+BOUNDARY = "frame"
+
+
+class PreviewServer:
+    def __init__(
+        self,
+        preview: PreviewService,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        fps: Optional[float] = None,
+        max_clients: int = 8,
+    ):
+        """
+        本機預覽 HTTP 服務 (aiohttp)，不經過控制端連線
+
+        - GET /                       來源列表
+        - GET /stream/{source}.mjpg   multipart/x-mixed-replace MJPEG 串流
+        - GET /snapshot/{source}.jpg  最新一幀的 JPEG
+
+        畫面直接讀取各來源的 latest 槽位並經過 PreviewService 的編碼快取，
+        同一幀不論有多少觀看者都只編碼一次
+
+        參數：
+        - preview: 預覽服務（共用編碼設定與快取）
+        - host / port: 監聽位址，教室內其他電腦觀看時設為 "0.0.0.0"
+        - fps: 每個串流的頻率上限，預設與預覽服務相同
+        - max_clients: 同時觀看的串流上限，超過時回應 503
+        """
+        self.preview = preview
+        self.host = host
+        self.port = port
+        self.fps = fps or preview.fps
+        self.max_clients = max_clients
+        # 等待新幀會阻塞，每個串流在這裡佔一個線程；多留兩個給快照的編碼
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_clients + 2, thread_name_prefix="preview-server"
+        )
+        self.runner: Optional["web.AppRunner"] = None
+        self.is_running: bool = False
+
+        # 統計
+        self.clients: int = 0
+        self.frames_sent: int = 0
+        self.snapshots: int = 0
+        self.rejected: int = 0
+
+    @property
+    def sources(self) -> Dict[str, Any]:
+        # URL 中的來源名稱 → 來源ID
+        return {str(vc.source): vc.source for vc in self.preview.video_captures}
+
+    async def start(self) -> None:
+        # aiohttp 只在啟用本機預覽時匯入
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/", self._index)
+        app.router.add_get("/stream/{source}.mjpg", self._stream)
+        app.router.add_get("/snapshot/{source}.jpg", self._snapshot)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.is_running = True
+        logger.info(f"📺 Preview server available at http://{self.host}:{self.port}/")
+
+    async def stop(self) -> None:
+        self.is_running = False
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+        self.executor.shutdown(wait=False)
+        logger.info("📺 Preview server stopped.")
+
+    async def _index(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        items = "".join(
+            f'<li>{name}: <a href="/stream/{name}.mjpg">stream</a> · '
+            f'<a href="/snapshot/{name}.jpg">snapshot</a></li>'
+            for name in self.sources
+        )
+        return web.Response(
+            text=f"<html><body><h3>Preview</h3><ul>{items}</ul></body></html>",
+            content_type="text/html",
+        )
+
+    async def _snapshot(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        source = self._source(request)
+        # 縮小與 JPEG 編碼不在事件迴圈（同時處理 Socket.IO）中執行
+        encoded = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.preview.get_frame, source
+        )
+        if encoded is None:
+            raise web.HTTPServiceUnavailable(text="No frame yet")
+        self.snapshots += 1
+        return web.Response(
+            body=encoded.jpeg,
+            content_type="image/jpeg",
+            headers={"Cache-Control": "no-store"},
+        )
+
+    async def _stream(self, request: "web.Request") -> "web.StreamResponse":
+        from aiohttp import web
+
+        source = self._source(request)
+        if self.clients >= self.max_clients:
+            self.rejected += 1
+            raise web.HTTPServiceUnavailable(text="Too many preview clients")
+        # 在第一個 await 之前計入，同時連線時不會超過上限
+        self.clients += 1
+        try:
+            response = web.StreamResponse(
+                headers={
+                    "Content-Type": f"multipart/x-mixed-replace; boundary={BOUNDARY}",
+                    "Cache-Control": "no-store",
+                }
+            )
+            await response.prepare(request)
+            loop = asyncio.get_running_loop()
+            logger.info(
+                f"📺 Preview client connected to {source} ({self.clients} watching)"
+            )
+            seq = 0
+            while self.is_running:
+                tick_start = time.perf_counter()
+                encoded = await loop.run_in_executor(
+                    self.executor, self.preview.wait_frame, source, seq, 1.0
+                )
+                if encoded is None:
+                    continue
+                seq = encoded.seq
+                await response.write(
+                    f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(encoded.jpeg)}\r\n\r\n".encode()
+                    + encoded.jpeg
+                    + b"\r\n"
+                )
+                self.frames_sent += 1
+                remaining = 1.0 / self.fps - (time.perf_counter() - tick_start)
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+        except ConnectionResetError:
+            pass  # 觀看者關閉連線
+        finally:
+            self.clients -= 1
+            logger.info(f"📺 Preview client left {source} ({self.clients} watching)")
+        return response
+
+    def _source(self, request: "web.Request") -> Any:
+        from aiohttp import web
+
+        name = request.match_info["source"]
+        source = self.sources.get(name)
+        if source is None:
+            raise web.HTTPNotFound(text=f"Unknown source {name}")
+        return source
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "clients": self.clients,
+            "frames_sent": self.frames_sent,
+            "snapshots": self.snapshots,
+            "rejected": self.rejected,
+        }
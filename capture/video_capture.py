@@ -1,12 +1,21 @@
-from collections import defaultdict
+import queue
 import threading
 from datetime import timedelta
 import time
-from typing import List, Optional, Callable
+from typing import List, Optional, Callable, Union
 import cv2
+import numpy as np
 from .logger import logger
+from .frame_ring_buffer import FrameRingBuffer, DROP_POLICY_LATEST
+from .latest_frame import LatestFrameSlot
 from pipeline import ProcessingPipeline
 from pipeline.pipeline_stage import PipelineStage
+from pipeline.remote_pipeline import RemotePipeline
+
+# 處理管道的執行方式
+EXECUTION_THREAD = "thread"  # 在本程序的處理線程中執行
+EXECUTION_PROCESS = "process"  # 在獨立的工作程序中執行，幀經由共享記憶體傳遞
+EXECUTIONS = (EXECUTION_THREAD, EXECUTION_PROCESS)
 
 
 class VideoCapture:
@@ -14,6 +23,11 @@ class VideoCapture:
         self,
         source=0,
         pipelines: Optional[List[PipelineStage]] = [],
+        buffer_size: int = 4,
+        drop_policy: str = DROP_POLICY_LATEST,
+        frame_budget_ms: Optional[float] = None,
+        optional_stages: Optional[List[str]] = None,
+        execution: str = EXECUTION_THREAD,
     ):
         """
         初始化影片捕捉模塊
@@ -21,8 +35,15 @@ class VideoCapture:
         參數：
         - source: 攝像頭索引或影片文件路徑
         - pipelines: 處理管道階段列表
-        - out_func: 輸出函數，用於處理後的影片幀
+        - buffer_size: 捕捉與處理之間環形緩衝區的槽位數
+        - drop_policy: 處理跟不上時的丟幀策略 (latest / drop_oldest / block)
+        - frame_budget_ms: 每幀處理時間的預算，None 時為攝影機的一幀時間
+        - optional_stages: 超出預算時可略過的階段（類別名稱）
+        - execution: 處理管道的執行方式 (thread / process)；process 模式下使用推論服務的
+          階段（ObjectDetectionStage）會在工作程序中另外載入一份模型，不與其他來源批次推論
         """
+        if execution not in EXECUTIONS:
+            raise ValueError(f"Unknown execution mode: {execution}")
         self.source = source
         # Use OpenCV to capture video
         self.cap = cv2.VideoCapture(self.source)
@@ -32,23 +53,65 @@ class VideoCapture:
         self.is_running: bool = False
         self.start_time: Optional[float] = None
         self.thread: Optional[threading.Thread] = None
-        self.processing_pipeline = self._initialize_pipeline(pipelines)
-        self.buffer = defaultdict(lambda: None)
+        self.process_thread: Optional[threading.Thread] = None
+        self.ring_buffer = FrameRingBuffer(capacity=buffer_size, drop_policy=drop_policy)
+        if frame_budget_ms is None:
+            fps = self.cap.get(cv2.CAP_PROP_FPS)
+            frame_budget_ms = 1000 / fps if fps and fps > 0 else None
+        self.execution = execution
+        self.processing_pipeline = self._initialize_pipeline(
+            pipelines, frame_budget_ms, optional_stages or []
+        )
+        if execution == EXECUTION_PROCESS:
+            self._share_ring_buffer()
+        self.latest = LatestFrameSlot()
+        # 錄製時由 StorageModule 指定，每一幀處理完都會放入：(source, FrameRecord)
+        self.record_queue: Optional[queue.Queue] = None
+        # 處理管道拋出例外而丟棄的幀
+        self.failed_frames: int = 0
+        self.last_failure_log: float = 0.0
 
     def _initialize_pipeline(
         self,
         pipelines: Optional[List[PipelineStage]] = [],
-    ) -> ProcessingPipeline:
-        processing_pipeline = ProcessingPipeline(source=self.source)
+        frame_budget_ms: Optional[float] = None,
+        optional_stages: List[str] = [],
+    ) -> Union[ProcessingPipeline, RemotePipeline]:
+        pipeline_class = (
+            RemotePipeline if self.execution == EXECUTION_PROCESS else ProcessingPipeline
+        )
+        processing_pipeline = pipeline_class(
+            source=self.source, frame_budget_ms=frame_budget_ms
+        )
         for stage in pipelines:
-            processing_pipeline.add_stage(stage.__class__.__name__, stage)
+            stage_name = stage.__class__.__name__
+            processing_pipeline.add_stage(
+                stage_name, stage, optional=stage_name in optional_stages
+            )
 
         logger.info(
             "Processing pipeline initialized with stages: {}",
             ", ".join([name for name, _ in processing_pipeline.stages]),
         )
+        if isinstance(processing_pipeline, RemotePipeline):
+            processing_pipeline.start()
         return processing_pipeline
 
+    def _share_ring_buffer(self) -> None:
+        """
+        環形緩衝區的槽位改用共享記憶體，捕捉端直接讀入，工作程序不需複製就能讀取
+        """
+        width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if width <= 0 or height <= 0:
+            # 無法預先得知解析度，每幀複製到工作程序的暫存槽位
+            return
+        self.ring_buffer.preallocate(
+            self.processing_pipeline.create_frame_slots(
+                (height, width, 3), self.ring_buffer.capacity
+            )
+        )
+
     def get_elapsed_time(self) -> str:
         """
         獲取錄制已經進行的時間
@@ -60,23 +123,71 @@ class VideoCapture:
 
     def capture_loop(self) -> None:
         """
-        捕捉循環，持續捕捉影片幀，並根據需要處理
+        捕捉循環，只負責把影片幀讀入環形緩衝區，處理交給 process_loop
         """
         while self.is_running:
-            ret, frame = self.cap.read()
+            index, slot = self.ring_buffer.begin_write()
+            if index < 0:
+                break
+            # 直接讀入槽位，重複使用同一塊記憶體
+            ret, frame = self.cap.read(slot) if slot is not None else self.cap.read()
             if not ret:
+                self.ring_buffer.abort_write(index)
                 logger.error("Error: Failed to grab frame.")
                 break
-            timestamp = time.time()
+            self.ring_buffer.commit_write(index, frame, time.time())
 
-            # Process the frame using the pipeline
-            frame, data, timestamp = self.processing_pipeline.process(frame, timestamp)
+        self.ring_buffer.close()
+        self.cap.release()
 
-            self.buffer["frame"] = frame
-            self.buffer["data"] = data
-            self.buffer["timestamp"] = timestamp
+    def process_loop(self) -> None:
+        """
+        處理循環，從環形緩衝區取幀並執行處理管道
+        """
+        while True:
+            item = self.ring_buffer.acquire(timeout=0.5)
+            if item is None:
+                if self.ring_buffer.closed:
+                    break
+                continue
+            index, slot, timestamp = item
+            try:
+                # Process the frame using the pipeline
+                frame, data, timestamp = self.processing_pipeline.process(
+                    slot, timestamp
+                )
+                # 輸出仍指向槽位時需複製，否則槽位會被下一幀覆寫
+                if isinstance(frame, np.ndarray) and np.may_share_memory(frame, slot):
+                    frame = frame.copy()
+            except Exception as e:
+                # 單一幀失敗不能結束這個來源的處理線程：丟棄這一幀繼續處理
+                self.failed_frames += 1
+                self._log_failure(e)
+                continue
+            finally:
+                self.ring_buffer.release(index)
 
-        self.cap.release()
+            record = self.latest.publish(frame, data, timestamp)
+            record_queue = self.record_queue
+            if record_queue is not None:
+                record_queue.put((self.source, record))
+
+    def _log_failure(self, error: Exception) -> None:
+        # 每個來源最多每 5 秒記錄一次，避免每幀失敗時洗版
+        now = time.monotonic()
+        if now - self.last_failure_log < 5.0:
+            return
+        self.last_failure_log = now
+        logger.opt(exception=error).error(
+            f"Pipeline failed on source {self.source}, frame dropped "
+            f"({self.failed_frames} failed so far)"
+        )
+
+    def get_stats(self) -> dict:
+        """
+        獲取捕捉與丟幀統計
+        """
+        return {**self.ring_buffer.get_stats(), "failed": self.failed_frames}
 
     def start(self) -> None:
         """
@@ -88,12 +199,18 @@ class VideoCapture:
         self.start_time = time.time()
         self.thread = threading.Thread(target=self.capture_loop)
         self.thread.start()
+        self.process_thread = threading.Thread(target=self.process_loop)
+        self.process_thread.start()
 
     def stop(self) -> None:
         """
         停止影片捕捉
         """
         self.is_running = False
+        self.ring_buffer.close()
         if self.thread is not None:
             self.thread.join()
+        if self.process_thread is not None:
+            self.process_thread.join()
         self.cap.release()
+        self.processing_pipeline.close()
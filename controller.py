@@ -1,14 +1,149 @@
 # controller.py
 
 import asyncio
+from collections import deque
 from functools import partial
 import json
-from typing import Dict, Callable
+import threading
+import time
+from typing import Any, Deque, Dict, Callable, Optional
 import socketio
 from logger import logger
 
 retry_interval = 3  # 重試間隔（秒）
 
+# 一般事件每種最多排隊的數量，超過時丟棄最舊的
+EVENT_QUEUE_SIZE = 32
+# 連續這麼多次等不到確認時，視為伺服器不回 ack，改為送出即算完成
+ACK_PROBE_LIMIT = 3
+
+
+class StreamChannel:
+    def __init__(
+        self,
+        sio: socketio.AsyncClient,
+        loop: asyncio.AbstractEventLoop,
+        event_name: str,
+        maxlen: int = 1,
+        ack: bool = False,
+        ack_timeout: float = 2.0,
+        on_sent: Optional[Callable[[float], None]] = None,
+    ):
+        """
+        單一事件種類的傳送通道：有界佇列，上一筆送出（或確認）之後才送下一筆
+
+        maxlen=1 時為「只送最新」，適合預覽幀：連線慢時舊的幀直接被新的取代並計入 dropped，
+        不會在事件迴圈中無限堆積
+
+        參數：
+        - sio: Socket.IO 客戶端
+        - loop: 事件迴圈，put() 可以從任何線程呼叫
+        - event_name: 送出的 Socket.IO 事件名稱
+        - maxlen: 佇列長度，滿了時丟棄最舊的一筆
+        - ack: 等待伺服器確認 (Socket.IO ack) 後才送下一筆
+        - ack_timeout: 等待確認的秒數
+        - on_sent: 每送出一筆後以延遲（秒）呼叫，在事件迴圈中執行
+        """
+        self.sio = sio
+        self.loop = loop
+        self.event_name = event_name
+        self.ack = ack
+        self.ack_timeout = ack_timeout
+        self.on_sent = on_sent
+        self.queue: Deque[Any] = deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.acked: bool = False  # 是否收到過確認
+        self.ack_misses: int = 0
+
+        # 統計
+        self.sent: int = 0
+        self.dropped: int = 0  # 被較新的一筆取代或佇列已滿
+        self.dropped_disconnected: int = 0
+        self.ack_timeouts: int = 0
+        self.latency_ms: float = 0.0  # 送出延遲的移動平均
+
+    def put(self, payload: Any) -> None:
+        """
+        排入一筆資料（任何線程皆可呼叫）
+        """
+        with self.lock:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(payload)
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = self.loop.create_task(self._run())
+        self.wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while True:
+                with self.lock:
+                    if not self.queue:
+                        break
+                    payload = self.queue.popleft()
+                if not self.sio.connected:
+                    self.dropped_disconnected += 1
+                    continue
+                await self._send(payload)
+
+    async def _send(self, payload: Any) -> None:
+        start = time.perf_counter()
+        try:
+            if self.ack and (self.acked or self.ack_misses < ACK_PROBE_LIMIT):
+                await self.sio.call(self.event_name, payload, timeout=self.ack_timeout)
+                self.acked = True
+            else:
+                await self.sio.emit(self.event_name, payload)
+        except socketio.exceptions.TimeoutError:
+            self.ack_timeouts += 1
+            if not self.acked:
+                self.ack_misses += 1
+                if self.ack_misses == ACK_PROBE_LIMIT:
+                    logger.warning(
+                        f"No ack for '{self.event_name}', sending without flow control"
+                    )
+            # 逾時的延遲只是 ack_timeout，不是實際的送出延遲，不回報給 on_sent
+            self.sent += 1
+            return
+        except Exception as e:
+            logger.error(f"Failed to send event: {e}")
+            return
+        latency = time.perf_counter() - start
+        self.sent += 1
+        self.latency_ms = (
+            latency * 1000
+            if self.sent == 1
+            else self.latency_ms * 0.8 + latency * 1000 * 0.2
+        )
+        if self.on_sent is not None:
+            self.on_sent(latency)
+
+    def cancel(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            pending = len(self.queue)
+        return {
+            "event": self.event_name,
+            "sent": self.sent,
+            "pending": pending,
+            "dropped": self.dropped,
+            "dropped_disconnected": self.dropped_disconnected,
+            "ack": self.ack and (self.acked or self.ack_misses < ACK_PROBE_LIMIT),
+            "ack_timeouts": self.ack_timeouts,
+            "latency_ms": round(self.latency_ms, 2),
+        }
+
 
 class ControllerModule:
     def __init__(self, ws_uri: str, token: str):
@@ -30,6 +165,9 @@ class ControllerModule:
         self.on_initial = Callable
         self._register_internal_handlers()
         self.loop = asyncio.get_event_loop()
+        # 通道名稱 → 傳送通道；一般事件以事件名稱為通道名稱
+        self.channels: Dict[str, StreamChannel] = {}
+        self.channels_lock = threading.Lock()
 
     def _register_internal_handlers(self):
         """
@@ -116,6 +254,8 @@ class ControllerModule:
             except asyncio.CancelledError:
                 logger.info("Watchdog task cancelled.")
             self.watchdog_task = None
+        for channel in self.channels.values():
+            channel.cancel()
 
     async def _authenticate(self) -> None:
         """
@@ -129,7 +269,8 @@ class ControllerModule:
             event, data = await self._wait_for_event("authenticated", "unauthorized")
             if event == "authenticated":
                 logger.info("✅ Authentication successful.")
-                self.on_initial()
+                # on_initial 可能查詢工作程序中的處理管道，不在事件迴圈中執行
+                await asyncio.get_running_loop().run_in_executor(None, self.on_initial)
             else:
                 logger.error("❌ Authentication failed.")
         except asyncio.TimeoutError:
@@ -173,25 +314,66 @@ class ControllerModule:
             for event in event_names:
                 self.sio.handlers["/"].pop(event, None)
 
+    def open_stream(
+        self,
+        name: str,
+        event_name: str,
+        ack: bool = True,
+        ack_timeout: float = 2.0,
+        on_sent: Optional[Callable[[float], None]] = None,
+    ) -> StreamChannel:
+        """
+        建立只送最新一筆、以確認控制流量的串流通道（例如預覽幀）
+
+        參數：
+        - name: 通道名稱，stream() 以此名稱送出
+        - event_name: Socket.IO 事件名稱
+        - ack / ack_timeout / on_sent: 見 StreamChannel
+        """
+        channel = StreamChannel(
+            self.sio,
+            self.loop,
+            event_name,
+            maxlen=1,
+            ack=ack,
+            ack_timeout=ack_timeout,
+            on_sent=on_sent,
+        )
+        with self.channels_lock:
+            self.channels[name] = channel
+        return channel
+
+    def stream(self, name: str, payload: dict) -> None:
+        """
+        送出串流資料，連線跟不上時只保留最新一筆（任何線程皆可呼叫）
+        """
+        self.channels[name].put(payload)
+
     def send_event(self, event_name: str, payload: dict) -> None:
-        if self.sio.connected:
-            future = asyncio.run_coroutine_threadsafe(
-                self._send_event_async(event_name, payload), self.loop
-            )
-            # try:
-            #     future.result(timeout=5)  # Optional: handle result or timeout
-            # except Exception as e:
-            #     logger.error(f"Failed to send event: {e}")
-        else:
-            pass
+        """
+        送出一般事件（任何線程皆可呼叫），每種事件各自排隊，最多 EVENT_QUEUE_SIZE 筆
+        """
+        if not self.sio.connected:
             # logger.warning("Socket.IO is not connected. Cannot send event.")
+            return
+        channel = self.channels.get(event_name)
+        if channel is None:
+            with self.channels_lock:
+                channel = self.channels.get(event_name)
+                if channel is None:
+                    channel = StreamChannel(
+                        self.sio, self.loop, event_name, maxlen=EVENT_QUEUE_SIZE
+                    )
+                    self.channels[event_name] = channel
+        channel.put(payload)
 
-    async def _send_event_async(self, event_name: str, payload: dict) -> None:
-        try:
-            await self.sio.emit(event_name, payload)
-            # logger.info(f"Sent event: {event_name} with payload: {json.dumps(payload)}")
-        except Exception as e:
-            logger.error(f"Failed to send event: {e}")
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        各傳送通道的送出、丟棄與延遲統計
+        """
+        with self.channels_lock:
+            channels = dict(self.channels)
+        return {name: channel.get_stats() for name, channel in channels.items()}
 
     def __del__(self):
         if self.watchdog_task:
@@ -11,6 +11,8 @@ from pipeline.stages import (
     PersonRemovingStage,
     ObjectDetectionStage,
 )
+from pipeline.inference_server import configure_inference_server
+from pipeline.metrics import configure_metrics, shutdown_metrics
 from recording_sys import RecordingSys
 
 # Sources
@@ -28,6 +30,8 @@ video_sources = [
             DeblurringStage(),
             # ImageBinarizationStage(),
         ],
+        # 超出每幀預算時先略過清晰化
+        optional_stages=["DeblurringStage"],
     ),
     VideoSource(
         source=2,
@@ -38,6 +42,8 @@ video_sources = [
 
 async def main() -> None:
     config = load_config()
+    configure_inference_server(**config.get("inference", {}))
+    configure_metrics(**config.get("metrics", {}))
     ws_uri: str = config["ws_uri"]
     controller_module = ControllerModule(ws_uri, token=config["token"])
 
@@ -46,9 +52,22 @@ async def main() -> None:
         video_sources=video_sources,
         audio_sources=audio_sources,
         preview_mode=config["preview"],
+        # 例如 {"fps": 15, "max_width": 640, "max_height": 360, "quality": 70, "binary": true}
+        preview_config=config.get("preview_stream", {}),
     )
 
+    # 本機 MJPEG 預覽，例如 {"enabled": true, "host": "0.0.0.0", "port": 8080}
+    preview_server_config = dict(config.get("preview_server", {}))
+    preview_server = None
+    if preview_server_config.pop("enabled", False):
+        preview_server = recording_sys.capture_module.create_preview_server(
+            **preview_server_config
+        )
+
     try:
+        if preview_server is not None:
+            await preview_server.start()
+
         # 啟動 controller module (WebSocket listener)
         await controller_module.start()
 
@@ -62,6 +81,9 @@ async def main() -> None:
         logger.error(f"Some error occurred: {e}")
     finally:
         logger.warning("Shutting down the program...")
+        shutdown_metrics()
+        if preview_server is not None:
+            await preview_server.stop()
         await recording_sys.shutdown()
         await controller_module.stop()
         logger.info("Program exited.")
@@ -73,6 +95,23 @@ def load_config():
         "ws_uri": "ws://127.0.0.1:3001",
         "token": "your_token_here",
         "preview": True,
+        "inference": {
+            "model_path": "yolov8n-fp16.engine",
+            "max_batch_size": 4,
+            "max_wait_ms": 5,
+        },
+        # 本機 HTTP 預覽：http://<host>:<port>/stream/<source>.mjpg
+        "preview_server": {
+            "enabled": False,
+            "host": "0.0.0.0",
+            "port": 8080,
+        },
+        # 處理階段耗時統計 (GET_METRICS)，預設關閉；textfile / port 為選用的 Prometheus 匯出
+        "metrics": {
+            "enabled": False,
+            "textfile": None,
+            "port": None,
+        },
     }
     if not os.path.exists(config_path):
         with open(config_path, "w") as f:
@@ -1,5 +1,31 @@
 # models/__init__.py
 
-from .frame_data_model import FrameDataModel
+from .frame_data import (
+    FrameData,
+    FRAME_COLUMNS,
+    FRAME_RAGGED_COLUMNS,
+    STAGE_FLAG_FIELDS,
+    BOARD_EVENT_NONE,
+    BOARD_EVENT_LOCKED,
+    BOARD_EVENT_UNLOCKED,
+)
 
-__all__ = ["FrameDataModel"]
+__all__ = [
+    "FrameData",
+    "FrameDataModel",
+    "FRAME_COLUMNS",
+    "FRAME_RAGGED_COLUMNS",
+    "STAGE_FLAG_FIELDS",
+    "BOARD_EVENT_NONE",
+    "BOARD_EVENT_LOCKED",
+    "BOARD_EVENT_UNLOCKED",
+]
+
+
+def __getattr__(name: str):
+    # FrameDataModel 需要 pydantic，只有對外序列化時才匯入
+    if name == "FrameDataModel":
+        from .frame_data_model import FrameDataModel
+
+        return FrameDataModel
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,199 @@
+# models/frame_data.py
+
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# 每幀的布林旗標（處理階段完成等），依序對應 flags 欄位的 bit 0, 1, 2, ...
+STAGE_FLAG_FIELDS = (
+    "person_detection_stage_finish",
+    "image_cropping_stage_finish",
+    "image_binarization_stage_finish",
+    "deblurring_stage_finish",
+    "blackboard_locked",
+)
+
+# 黑板鎖定事件（board_events 欄位）
+BOARD_EVENT_NONE = 0
+BOARD_EVENT_LOCKED = 1  # 這一幀開始使用鎖定的黑板框
+BOARD_EVENT_UNLOCKED = -1  # 偵測到鏡頭移動，解除鎖定
+
+# h5 中每幀一列的欄位
+FRAME_COLUMNS = {
+    "frame_indices": "i4",
+    "timestamps": "f8",
+    "flags": "u1",
+    "vocabulary_ids": "i2",  # 對應 attrs["detection_vocabularies"] 的索引，-1 表示沒有偵測
+    "roi": ("i4", (4,)),  # 下游階段處理的黑板區域 (x1, y1, x2, y2)，-1 表示整個幀
+    "board_events": "i1",  # 這一幀的黑板鎖定 / 解除事件，值為 BOARD_EVENT_*
+    "stage_mask": "u4",  # bit i：管道中第 i 個階段在這一幀有執行（名稱見 attrs["pipeline_stages"]）
+    "shed_mask": "u4",  # bit i：第 i 個可選階段因預算不足被略過
+}
+
+# h5 中每幀長度不固定的欄位群組（攤平 + offsets/counts 索引）
+FRAME_RAGGED_COLUMNS = {
+    "people_boxes": {"xyxy": ("f4", (4,))},
+    "blackboard_boxes": {"xyxy": ("f4", (4,))},
+    "detections": {
+        "xyxy": ("f4", (4,)),
+        "confidence": "f4",
+        "class_id": "i2",
+    },
+}
+
+# 沒有框時共用的空陣列（唯讀）
+EMPTY_BOXES = np.empty((0, 4), dtype=np.float32)
+EMPTY_BOXES.flags.writeable = False
+_EMPTY_CONFIDENCE = np.empty((0,), dtype=np.float32)
+_EMPTY_CLASS_ID = np.empty((0,), dtype=np.int16)
+_NO_ROI = (-1, -1, -1, -1)
+
+
+def as_boxes(boxes: Any) -> np.ndarray:
+    """
+    轉成 float32 (N, 4) 的框陣列，已經是該格式時不複製
+    """
+    if boxes is None or len(boxes) == 0:
+        return EMPTY_BOXES
+    return np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+
+
+def _flag_property(field: str) -> property:
+    mask = 1 << STAGE_FLAG_FIELDS.index(field)
+
+    def getter(self) -> bool:
+        return bool(self.flags & mask)
+
+    def setter(self, value: bool) -> None:
+        if value:
+            self.flags |= mask
+        else:
+            self.flags &= ~mask
+
+    return property(getter, setter)
+
+
+class FrameData:
+    """
+    處理管道中每幀的資料紀錄
+
+    每一幀每個來源都會建立一次，所以用 __slots__ 的一般類別而不是 pydantic：
+    建立時不做驗證，框為 float32 (N, 4) 陣列，階段完成旗標打包在 flags 的 bit 中
+    （仍可用 data.deblurring_stage_finish = True 設定）。
+    對外的序列化格式見 FrameDataModel（from_record / to_record）
+    """
+
+    __slots__ = (
+        "timestamp",
+        "source",
+        "flags",
+        "board_event",
+        "detection_class",
+        "detections",
+        "people_boxes",
+        "blackboard_boxes",
+        "frame_size",
+        "roi",
+        "deadline",
+        "stage_mask",
+        "shed_mask",
+    )
+
+    person_detection_stage_finish = _flag_property("person_detection_stage_finish")
+    image_cropping_stage_finish = _flag_property("image_cropping_stage_finish")
+    image_binarization_stage_finish = _flag_property("image_binarization_stage_finish")
+    deblurring_stage_finish = _flag_property("deblurring_stage_finish")
+    # 黑板框是否沿用鎖定的結果
+    blackboard_locked = _flag_property("blackboard_locked")
+
+    def __init__(
+        self,
+        timestamp: float,
+        source: Any = None,
+        flags: int = 0,
+        board_event: int = BOARD_EVENT_NONE,
+        detection_class: Sequence[str] = (),
+        detections: Any = None,
+        people_boxes: Any = None,
+        blackboard_boxes: Any = None,
+        frame_size: Optional[Tuple[int, int]] = None,
+        roi: Optional[Tuple[int, int, int, int]] = None,
+        deadline: Optional[float] = None,
+        stage_mask: int = 0,
+        shed_mask: int = 0,
+    ):
+        """
+        參數：
+        - timestamp: 捕捉時間戳
+        - source: 影像來源ID
+        - flags: 處理階段完成旗標（見 STAGE_FLAG_FIELDS）
+        - board_event: 這一幀的黑板鎖定事件
+        - detection_class: 偵測類別
+        - detections: 偵測到的物件們 (sv.Detections)
+        - people_boxes / blackboard_boxes: 完整幀座標的框 (N, 4)
+        - frame_size: 原始幀大小 (寬, 高)
+        - roi: ROI 階段處理的區域 (x1, y1, x2, y2)，None 表示整個幀
+        - deadline: 處理的截止時間 (time.perf_counter)，None 表示不限；
+          執行階段時為該階段的截止時間（已扣除之後必要階段的預估耗時）
+        - stage_mask / shed_mask: 依管道中的階段順序，有執行 / 因預算不足被略過的階段
+        """
+        self.timestamp = timestamp
+        self.source = source
+        self.flags = flags
+        self.board_event = board_event
+        self.detection_class = detection_class
+        self.detections = detections
+        self.people_boxes = as_boxes(people_boxes)
+        self.blackboard_boxes = as_boxes(blackboard_boxes)
+        self.frame_size = frame_size
+        self.roi = roi
+        self.deadline = deadline
+        self.stage_mask = stage_mask
+        self.shed_mask = shed_mask
+
+    def __repr__(self) -> str:
+        return (
+            f"FrameData(timestamp={self.timestamp}, source={self.source}, "
+            f"flags={self.flags:#x}, people={len(self.people_boxes)}, "
+            f"blackboards={len(self.blackboard_boxes)}, roi={self.roi})"
+        )
+
+    def to_columns(self) -> Dict[str, Any]:
+        """
+        轉成 h5 欄位格式（FRAME_COLUMNS / FRAME_RAGGED_COLUMNS），不經過 JSON
+
+        返回：
+        - columns: 欄位字典，frame_indices 與 vocabulary_ids 由儲存端填入
+        """
+        detections = self.detections
+        if detections is None or len(detections) == 0:
+            xyxy, confidence, class_id = EMPTY_BOXES, _EMPTY_CONFIDENCE, _EMPTY_CLASS_ID
+        else:
+            xyxy = detections.xyxy.astype(np.float32, copy=False)
+            count = len(detections)
+            confidence = (
+                detections.confidence.astype(np.float32, copy=False)
+                if detections.confidence is not None
+                else np.full((count,), np.nan, dtype=np.float32)
+            )
+            class_id = (
+                detections.class_id.astype(np.int16, copy=False)
+                if detections.class_id is not None
+                else np.full((count,), -1, dtype=np.int16)
+            )
+        return {
+            "timestamps": self.timestamp,
+            "flags": self.flags,
+            "roi": self.roi if self.roi is not None else _NO_ROI,
+            "board_events": self.board_event,
+            "stage_mask": self.stage_mask,
+            "shed_mask": self.shed_mask,
+            "people_boxes": {"xyxy": as_boxes(self.people_boxes)},
+            "blackboard_boxes": {"xyxy": as_boxes(self.blackboard_boxes)},
+            "detections": {
+                "xyxy": xyxy,
+                "confidence": confidence,
+                "class_id": class_id,
+            },
+        }
@@ -1,33 +1,109 @@
 # models/frame_data_model.py
 
 from pydantic import BaseModel, ConfigDict
-from typing import List, Any, Optional
-from ultralytics import YOLOWorld
-import supervision as sv
+from typing import Dict, List, Any, Optional, Tuple
 import json
-import numpy as np
+
+from .frame_data import (
+    FrameData,
+    STAGE_FLAG_FIELDS,
+    BOARD_EVENT_NONE,
+)
 
 
 class FrameDataModel(BaseModel):
+    """
+    幀數據的對外格式（驗證 / 序列化用）；處理管道內使用的是 FrameData
+    """
+
     timestamp: float
+    source: Any = None
 
     person_detection_stage_finish: bool = False  # 是這樣嗎xd
     image_cropping_stage_finish: bool = False
     image_binarization_stage_finish: bool = False
     deblurring_stage_finish: bool = False
 
-    # 初始化YOLO model/分類類別 /偵測到的物件們
-    model: Optional[YOLOWorld] = None
+    # 黑板框是否沿用鎖定的結果，以及這一幀的鎖定事件
+    blackboard_locked: bool = False
+    board_event: int = BOARD_EVENT_NONE
+
+    # 分類類別 /偵測到的物件們 (sv.Detections)
     detection_class: List[str] = []
-    detections: Optional[sv.Detections] = None
+    detections: Optional[Any] = None
 
     # 單獨物件列表
     people_boxes: List[Any] = []
     blackboard_boxes: List[Any] = []
 
+    # 原始幀大小 (寬, 高) 與 ROI 階段處理的區域 (x1, y1, x2, y2)，None 表示整個幀
+    frame_size: Optional[Tuple[int, int]] = None
+    roi: Optional[Tuple[int, int, int, int]] = None
+
+    # 這一幀處理的截止時間 (time.perf_counter)，None 表示不限
+    deadline: Optional[float] = None
+
+    # 依管道中的階段順序，哪些階段有執行、哪些因預算不足被略過
+    stage_mask: int = 0
+    shed_mask: int = 0
+
     # 配置项，允许任意类型
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
+    @classmethod
+    def from_record(cls, record: FrameData) -> "FrameDataModel":
+        """
+        由處理管道的 FrameData 建立，框轉成列表
+        """
+        return cls(
+            timestamp=record.timestamp,
+            source=record.source,
+            board_event=record.board_event,
+            detection_class=list(record.detection_class),
+            detections=record.detections,
+            people_boxes=record.people_boxes.tolist(),
+            blackboard_boxes=record.blackboard_boxes.tolist(),
+            frame_size=record.frame_size,
+            roi=record.roi,
+            deadline=record.deadline,
+            stage_mask=record.stage_mask,
+            shed_mask=record.shed_mask,
+            **{field: getattr(record, field) for field in STAGE_FLAG_FIELDS},
+        )
+
+    def to_record(self) -> FrameData:
+        return FrameData(
+            timestamp=self.timestamp,
+            source=self.source,
+            flags=self.stage_flags(),
+            board_event=self.board_event,
+            detection_class=self.detection_class,
+            detections=self.detections,
+            people_boxes=self.people_boxes,
+            blackboard_boxes=self.blackboard_boxes,
+            frame_size=self.frame_size,
+            roi=self.roi,
+            deadline=self.deadline,
+            stage_mask=self.stage_mask,
+            shed_mask=self.shed_mask,
+        )
+
+    def stage_flags(self) -> int:
+        """
+        將處理階段完成旗標打包成 bitmask（見 STAGE_FLAG_FIELDS）
+        """
+        flags = 0
+        for bit, field in enumerate(STAGE_FLAG_FIELDS):
+            if getattr(self, field):
+                flags |= 1 << bit
+        return flags
+
+    def to_columns(self) -> Dict[str, Any]:
+        """
+        轉成 h5 欄位格式（見 FrameData.to_columns）
+        """
+        return self.to_record().to_columns()
+
     def serialized(self):
         return json.dumps(
             {
@@ -1,7 +1,7 @@
 # pipeline/__init__.py
 
+# 處理階段不在這裡匯入，需要時從 pipeline.stages 匯入（依名稱延遲載入）
 from .processing_pipeline import ProcessingPipeline
 from .pipeline_stage import PipelineStage
-from .stages import *
 
 __all__ = ["ProcessingPipeline", "PipelineStage"]
@@ -0,0 +1,416 @@
+# pipeline/inference_server.py
+
+import queue
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from logger import logger
+from .model_registry import get_model
+
+if TYPE_CHECKING:
+    import supervision as sv
+
+
+class InferenceRequest:
+    def __init__(self, source: Any, frame: Any, conf: float, classes: Tuple[str, ...]):
+        """
+        單一影片幀的推論請求
+
+        參數：
+        - source: 影片來源ID
+        - frame: 待推論的影片幀
+        - conf: 信心閾值
+        - classes: 偵測類別
+        """
+        self.source = source
+        self.frame = frame
+        self.conf = conf
+        self.classes = classes
+        self.submit_time: float = time.perf_counter()
+        self.done = threading.Event()
+        self.result: Optional["sv.Detections"] = None
+        self.error: Optional[Exception] = None
+
+
+class SourceStats:
+    def __init__(self) -> None:
+        """
+        單一來源的推論統計
+        """
+        self.frames: int = 0
+        self.total_latency: float = 0.0
+        self.max_latency: float = 0.0
+        self.total_batch_size: int = 0
+        self.first_time: Optional[float] = None
+        self.last_time: Optional[float] = None
+
+    def record(self, latency: float, batch_size: int, now: float) -> None:
+        if self.first_time is None:
+            self.first_time = now
+        self.last_time = now
+        self.frames += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_batch_size += batch_size
+
+    def to_dict(self) -> Dict[str, float]:
+        duration = 0.0
+        if self.first_time is not None and self.last_time is not None:
+            duration = self.last_time - self.first_time
+        return {
+            "frames": self.frames,
+            "avg_latency_ms": (
+                self.total_latency / self.frames * 1000 if self.frames else 0.0
+            ),
+            "max_latency_ms": self.max_latency * 1000,
+            "avg_batch_size": (
+                self.total_batch_size / self.frames if self.frames else 0.0
+            ),
+            "fps": (self.frames - 1) / duration if duration > 0 else 0.0,
+        }
+
+
+class ClassEmbeddingCache:
+    def __init__(self, maxsize: int = 8) -> None:
+        """
+        以類別組合為鍵的文字嵌入 LRU 快取
+
+        YOLO-World 的 set_classes 每次都會經過 CLIP 重新編碼類別提示，
+        這裡把編碼結果記下來，切換回用過的類別組合時直接還原
+
+        參數：
+        - maxsize: 最多保留的類別組合數
+        """
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[Tuple[str, ...], Any]" = OrderedDict()
+        self.reencode_count: int = 0  # 實際經過 CLIP 重新編碼的次數
+        self.hit_count: int = 0
+
+    def apply(self, model: Any, classes: Tuple[str, ...]) -> None:
+        """
+        將類別套用到模型，快取命中時不重新編碼
+
+        參數：
+        - model: YOLO / YOLOWorld 模型
+        - classes: 偵測類別
+        """
+        if classes in self.entries:
+            self.entries.move_to_end(classes)
+            self._restore(model, classes, self.entries[classes])
+            self.hit_count += 1
+            return
+
+        if hasattr(model, "set_classes"):
+            model.set_classes(list(classes))
+            self.reencode_count += 1
+        embeddings = self._snapshot(model)
+        if embeddings is None:
+            # 模型不支援直接還原嵌入（例如匯出的 engine），下次仍需 set_classes
+            return
+        self.entries[classes] = embeddings
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def _snapshot(self, model: Any) -> Optional[Any]:
+        inner = getattr(model, "model", None)
+        return getattr(inner, "txt_feats", None)
+
+    def _restore(self, model: Any, classes: Tuple[str, ...], embeddings: Any) -> None:
+        inner = model.model
+        inner.txt_feats = embeddings
+        inner.model[-1].nc = len(classes)
+        inner.names = list(classes)
+        predictor = getattr(model, "predictor", None)
+        if predictor is not None:
+            predictor.model.names = list(classes)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "class_reencodes": self.reencode_count,
+            "class_cache_hits": self.hit_count,
+            "class_cache_size": len(self.entries),
+        }
+
+
+class InferenceServer:
+    def __init__(
+        self,
+        model_path: str = "yolov8n-fp16.engine",
+        max_batch_size: int = 4,
+        max_wait_ms: float = 5.0,
+        class_cache_size: int = 8,
+        request_timeout: float = 10.0,
+    ) -> None:
+        """
+        全程序共用的推論服務，將所有影片來源的幀收集成小批次後一次推論
+
+        參數：
+        - model_path: 模型權重路徑
+        - max_batch_size: 單一批次最多的幀數
+        - max_wait_ms: 收集批次時最多等待的時間（毫秒）
+        - class_cache_size: 類別文字嵌入快取的大小
+        - request_timeout: 呼叫端等待推論結果的秒數，逾時拋出 TimeoutError
+        """
+        self.model_path = model_path
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.request_timeout = request_timeout
+        # 同一個權重檔在程序中只載入一次，服務重新建立時沿用
+        self.model = get_model(model_path)
+        self.current_classes: Optional[Tuple[str, ...]] = None
+        self.class_cache = ClassEmbeddingCache(maxsize=class_cache_size)
+        self.batch_supported: bool = True
+
+        self.requests: "queue.Queue[InferenceRequest]" = queue.Queue()
+        self.stats: Dict[Any, SourceStats] = defaultdict(SourceStats)
+        self.source_last_seen: Dict[Any, float] = {}
+        self.lock = threading.Lock()
+        # is_running 的檢查與放入佇列在同一個鎖內，stop() 之後不會再有請求進入佇列
+        self.submit_lock = threading.Lock()
+
+        self.is_running: bool = False
+        self.thread: Optional[threading.Thread] = None
+
+    def configure(
+        self,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        request_timeout: Optional[float] = None,
+    ) -> None:
+        """
+        調整批次參數，可在執行中呼叫
+        """
+        if max_batch_size is not None:
+            self.max_batch_size = max(1, int(max_batch_size))
+        if max_wait_ms is not None:
+            self.max_wait_ms = max(0.0, float(max_wait_ms))
+        if request_timeout is not None:
+            self.request_timeout = max(0.1, float(request_timeout))
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._serve_loop, daemon=True)
+        self.thread.start()
+        logger.info(
+            f"🧠 Inference server started: {self.model_path} "
+            f"(max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait_ms})"
+        )
+
+    def stop(self) -> None:
+        with self.submit_lock:
+            self.is_running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        # 讓仍在等待的呼叫端結束等待
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            request.error = RuntimeError("Inference server stopped")
+            request.done.set()
+        logger.info("🧠 Inference server stopped")
+
+    def infer(
+        self, source: Any, frame: Any, conf: float, classes: Tuple[str, ...]
+    ) -> "sv.Detections":
+        """
+        提交一張影片幀並等待推論結果
+
+        參數：
+        - source: 影片來源ID
+        - frame: 待推論的影片幀
+        - conf: 信心閾值
+        - classes: 偵測類別
+
+        返回：
+        - detections: 偵測到的物件們
+        """
+        request = InferenceRequest(source, frame, conf, tuple(classes))
+        with self.submit_lock:
+            if not self.is_running:
+                raise RuntimeError("Inference server is not running")
+            self.requests.put(request)
+        if not request.done.wait(self.request_timeout):
+            raise TimeoutError(
+                f"Inference for source {source} timed out after {self.request_timeout}s"
+            )
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        獲取每個來源的延遲與吞吐量統計，以及類別重新編碼的次數
+
+        返回：
+        - stats: {"sources": 以來源ID為鍵的統計字典, "class_reencodes": ..., ...}
+        """
+        with self.lock:
+            sources = {str(source): s.to_dict() for source, s in self.stats.items()}
+        return {"sources": sources, **self.class_cache.get_stats()}
+
+    def _active_source_count(self, now: float) -> int:
+        # 最近一秒內有提交過請求的來源數
+        return sum(1 for t in self.source_last_seen.values() if now - t < 1.0)
+
+    def _collect_batch(self) -> List[InferenceRequest]:
+        try:
+            first = self.requests.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        now = time.perf_counter()
+        self.source_last_seen[first.source] = now
+        deadline = now + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            # 每個活躍來源都已經到齊時不必再等
+            if len({r.source for r in batch}) >= self._active_source_count(now):
+                break
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            self.source_last_seen[request.source] = time.perf_counter()
+            batch.append(request)
+        return batch
+
+    def _serve_loop(self) -> None:
+        while self.is_running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            # 依照 (conf, classes) 分組，同組只推論一次
+            groups: Dict[Tuple[float, Tuple[str, ...]], List[InferenceRequest]] = (
+                defaultdict(list)
+            )
+            for request in batch:
+                groups[(request.conf, request.classes)].append(request)
+
+            for (conf, classes), requests in groups.items():
+                self._run_batch(conf, classes, requests)
+
+    def _run_batch(
+        self, conf: float, classes: Tuple[str, ...], requests: List[InferenceRequest]
+    ) -> None:
+        try:
+            import supervision as sv
+
+            self._apply_classes(classes)
+            results = self._predict([r.frame for r in requests], conf)
+
+            now = time.perf_counter()
+            for request, result in zip(requests, results):
+                request.result = sv.Detections.from_ultralytics(result)
+                with self.lock:
+                    self.stats[request.source].record(
+                        now - request.submit_time, len(requests), now
+                    )
+                request.done.set()
+        except Exception as e:
+            logger.error(f"Inference failed: {e}")
+            # 服務線程不能因為單一批次失敗而結束，尚未完成的請求都回報錯誤
+            for request in requests:
+                if not request.done.is_set():
+                    request.error = e
+                    request.done.set()
+            return
+
+        # 模型回傳的結果數不足時，避免呼叫端一直等待
+        for request in requests:
+            if not request.done.is_set():
+                request.error = RuntimeError("Inference returned no result")
+                request.done.set()
+
+    def _apply_classes(self, classes: Tuple[str, ...]) -> None:
+        if classes == self.current_classes:
+            return
+        self.class_cache.apply(self.model, classes)
+        self.current_classes = classes
+        logger.info(
+            f"🧠 Detection classes switched to {list(classes)} "
+            f"(re-encodes so far: {self.class_cache.reencode_count})"
+        )
+
+    def _predict(self, frames: List[Any], conf: float) -> List[Any]:
+        if self.batch_supported and len(frames) > 1:
+            try:
+                return self.model.predict(frames, conf=conf, verbose=False)
+            except Exception as e:
+                # 例如固定 batch=1 的 TensorRT engine，改為逐張推論
+                logger.warning(
+                    f"Batched inference not supported, falling back to per-frame: {e}"
+                )
+                self.batch_supported = False
+        return [self.model.predict(f, conf=conf, verbose=False)[0] for f in frames]
+
+
+_server: Optional[InferenceServer] = None
+_server_config: Dict[str, Any] = {}
+_server_lock = threading.Lock()
+
+
+def configure_inference_server(**kwargs: Any) -> None:
+    """
+    設定共用推論服務的參數（model_path, max_batch_size, max_wait_ms, request_timeout）
+
+    服務尚未建立時，參數會在第一次使用時生效
+    """
+    with _server_lock:
+        _server_config.update(kwargs)
+        if _server is not None:
+            _server.configure(
+                max_batch_size=kwargs.get("max_batch_size"),
+                max_wait_ms=kwargs.get("max_wait_ms"),
+                request_timeout=kwargs.get("request_timeout"),
+            )
+
+
+def get_inference_server_config() -> Dict[str, Any]:
+    """
+    獲取目前的推論服務參數，例如傳給處理管道的工作程序
+    """
+    with _server_lock:
+        return dict(_server_config)
+
+
+def get_inference_server() -> InferenceServer:
+    """
+    獲取全程序共用的推論服務，第一次呼叫時才載入模型
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = InferenceServer(**_server_config)
+            _server.start()
+        return _server
+
+
+def get_inference_stats() -> Optional[Dict[str, Any]]:
+    """
+    獲取共用推論服務的統計（見 InferenceServer.get_stats），不會啟動服務
+
+    返回：
+    - stats: 統計字典，服務尚未建立時為 None
+    """
+    with _server_lock:
+        server = _server
+    return server.get_stats() if server is not None else None
+
+
+def shutdown_inference_server() -> None:
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.stop()
+            _server = None
@@ -0,0 +1,276 @@
+# pipeline/metrics.py
+
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from logger import logger
+
+# 直方圖的桶上界（毫秒），0.05 ms ~ 約 10 s，每桶放大 1.25 倍
+BUCKET_BOUNDS_MS: List[float] = [0.05 * 1.25**i for i in range(56)]
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        """
+        固定桶的延遲直方圖，記錄成本固定，百分位數以桶內線性插值估計
+        """
+        self.counts: List[int] = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def record(self, value_ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = self.count * q / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKET_BOUNDS_MS[i - 1] if i > 0 else 0.0
+                upper = BUCKET_BOUNDS_MS[i] if i < len(BUCKET_BOUNDS_MS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        summary = {f"p{q}": round(self.percentile(q), 3) for q in PERCENTILES}
+        summary["mean"] = round(self.total / self.count, 3) if self.count else 0.0
+        summary["max"] = round(self.max, 3)
+        return summary
+
+
+class StageMetrics:
+    def __init__(self):
+        """
+        單一處理階段的統計：牆鐘 / CPU 時間直方圖、進出幀數與例外次數
+        """
+        self.wall = LatencyHistogram()
+        self.cpu = LatencyHistogram()
+        self.frames_in: int = 0
+        self.frames_out: int = 0
+        self.exceptions: int = 0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "wall_ms": self.wall.summary(),
+            "cpu_ms": self.cpu.summary(),
+            "frames_in": self.frames_in,
+            "frames_out": self.frames_out,
+            "exceptions": self.exceptions,
+        }
+
+
+class PipelineMetrics:
+    # 整條管道（所有階段加總）使用的名稱
+    TOTAL = "_total"
+
+    def __init__(self, source: Any):
+        """
+        一個來源的處理管道統計，由處理線程寫入，控制端與匯出器讀取
+
+        參數：
+        - source: 影像來源ID
+        """
+        self.source = source
+        self.stages: Dict[str, StageMetrics] = {}
+        self.lock = threading.Lock()
+
+    def stage(self, stage_name: str) -> StageMetrics:
+        metrics = self.stages.get(stage_name)
+        if metrics is None:
+            with self.lock:
+                metrics = self.stages.setdefault(stage_name, StageMetrics())
+        return metrics
+
+    def record(
+        self,
+        stage_name: str,
+        wall_s: float,
+        cpu_s: float,
+        ok: bool = True,
+    ) -> None:
+        metrics = self.stage(stage_name)
+        with self.lock:
+            metrics.frames_in += 1
+            if ok:
+                metrics.frames_out += 1
+            else:
+                metrics.exceptions += 1
+            metrics.wall.record(wall_s * 1000)
+            metrics.cpu.record(cpu_s * 1000)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {name: m.summary() for name, m in self.stages.items()}
+
+    def to_prometheus(self) -> List[str]:
+        """
+        Prometheus text format 的樣本行（不含 HELP/TYPE）
+        """
+        lines = []
+        with self.lock:
+            for name, m in self.stages.items():
+                labels = f'source="{self.source}",stage="{name}"'
+                for kind, histogram in (("wall", m.wall), ("cpu", m.cpu)):
+                    metric = f"recording_stage_{kind}_seconds"
+                    cumulative = 0
+                    for bound, count in zip(BUCKET_BOUNDS_MS, histogram.counts):
+                        cumulative += count
+                        lines.append(
+                            f'{metric}_bucket{{{labels},le="{bound / 1000:.6g}"}} {cumulative}'
+                        )
+                    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f"{metric}_sum{{{labels}}} {histogram.total / 1000:.6f}")
+                    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+                lines.append(f"recording_stage_frames_in_total{{{labels}}} {m.frames_in}")
+                lines.append(f"recording_stage_frames_out_total{{{labels}}} {m.frames_out}")
+                lines.append(f"recording_stage_exceptions_total{{{labels}}} {m.exceptions}")
+        return lines
+
+
+PROMETHEUS_HEADER = [
+    "# TYPE recording_stage_wall_seconds histogram",
+    "# TYPE recording_stage_cpu_seconds histogram",
+    "# TYPE recording_stage_frames_in_total counter",
+    "# TYPE recording_stage_frames_out_total counter",
+    "# TYPE recording_stage_exceptions_total counter",
+]
+
+
+class MetricsExporter:
+    def __init__(
+        self,
+        textfile: Optional[str] = None,
+        port: Optional[int] = None,
+        interval: float = 5.0,
+    ):
+        """
+        以 Prometheus text format 匯出所有已註冊管道的統計
+
+        參數：
+        - textfile: 定期寫入的檔案路徑（node_exporter textfile collector 可讀取）
+        - port: 在本機此埠提供 /metrics
+        - interval: 寫入檔案的間隔（秒）
+        """
+        self.textfile = textfile
+        self.port = port
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def render(self) -> str:
+        lines = list(PROMETHEUS_HEADER)
+        for metrics in list(_registry):
+            lines += metrics.to_prometheus()
+        return "\n".join(lines) + "\n"
+
+    def start(self) -> None:
+        self.stop_event.clear()
+        if self.textfile:
+            self.thread = threading.Thread(target=self._write_loop, daemon=True)
+            self.thread.start()
+        if self.port:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = exporter.render().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            logger.info(f"Metrics available at http://127.0.0.1:{self.port}/metrics")
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.textfile:
+            self._write_textfile()
+
+    def _write_loop(self) -> None:
+        while not self.stop_event.is_set():
+            self._write_textfile()
+            self.stop_event.wait(self.interval)
+
+    def _write_textfile(self) -> None:
+        # 先寫暫存檔再改名，讀取端不會看到寫到一半的內容
+        temp_path = f"{self.textfile}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(self.render())
+        os.replace(temp_path, self.textfile)
+
+
+_enabled: bool = False
+_registry: List[PipelineMetrics] = []
+_exporter: Optional[MetricsExporter] = None
+
+
+def configure_metrics(
+    enabled: bool = False,
+    textfile: Optional[str] = None,
+    port: Optional[int] = None,
+    interval: float = 5.0,
+) -> None:
+    """
+    設定處理管道的統計，需在建立 ProcessingPipeline 之前呼叫；
+    預設關閉，關閉時管道不做任何計時
+    """
+    global _enabled, _exporter
+    _enabled = enabled
+    if enabled and (textfile or port):
+        _exporter = MetricsExporter(textfile=textfile, port=port, interval=interval)
+        _exporter.start()
+
+
+def metrics_enabled() -> bool:
+    return _enabled
+
+
+def create_pipeline_metrics(source: Any) -> Optional[PipelineMetrics]:
+    """
+    統計開啟時建立並註冊一個來源的 PipelineMetrics，否則回傳 None
+    """
+    if not _enabled:
+        return None
+    metrics = PipelineMetrics(source)
+    _registry.append(metrics)
+    return metrics
+
+
+def release_pipeline_metrics(metrics: Optional[PipelineMetrics]) -> None:
+    """
+    取消註冊，匯出器不再輸出這組統計
+    """
+    if metrics in _registry:
+        _registry.remove(metrics)
+
+
+def shutdown_metrics() -> None:
+    global _exporter
+    if _exporter is not None:
+        _exporter.stop()
+        _exporter = None
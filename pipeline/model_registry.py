@@ -0,0 +1,53 @@
+# pipeline/model_registry.py
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from logger import logger
+
+_models: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def _load_yolo(model_path: str) -> Any:
+    # ultralytics（與 torch）只在第一次載入模型時匯入
+    from ultralytics import YOLO
+
+    return YOLO(model_path, verbose=False)
+
+
+def get_model(model_path: str, loader: Optional[Callable[[str], Any]] = None) -> Any:
+    """
+    獲取模型，每個權重檔在同一個程序中只載入一次
+
+    參數：
+    - model_path: 模型權重路徑
+    - loader: 載入函式，預設為 ultralytics YOLO
+
+    返回：
+    - model: 已載入的模型
+    """
+    with _lock:
+        model = _models.get(model_path)
+        if model is None:
+            start = time.perf_counter()
+            model = (loader or _load_yolo)(model_path)
+            _models[model_path] = model
+            logger.info(
+                f"🧠 Loaded model {model_path} in {time.perf_counter() - start:.2f}s"
+            )
+        return model
+
+
+def loaded_models() -> List[str]:
+    with _lock:
+        return list(_models)
+
+
+def release_models() -> None:
+    """
+    釋放所有已載入的模型，之後的 get_model 會重新載入
+    """
+    with _lock:
+        _models.clear()
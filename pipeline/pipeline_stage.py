@@ -1,11 +1,18 @@
 # pipeline/pipeline_stage.py
 
 from typing import Any, Tuple
-from models import FrameDataModel
+from models import FrameData
 
 
 class PipelineStage:
-    def process(self, frame: Any, data: FrameDataModel) -> Tuple[Any, FrameDataModel]:
+    # 回傳的 frame 是階段內部重複使用的緩衝區時設為 True
+    reuses_output_buffer: bool = False
+    # 為 True 時管道只傳入黑板 ROI 的視圖 (data.roi)，而不是完整的幀
+    roi_aware: bool = False
+    # 使用全程序共用的推論服務 (get_inference_server) 時設為 True
+    uses_inference_server: bool = False
+
+    def process(self, frame: Any, data: FrameData) -> Tuple[Any, FrameData]:
         """
         處理影片幀的抽象方法
 
@@ -30,3 +37,12 @@ class PipelineStage:
 
     def set_parameters(self, params: dict) -> None:
         pass
+
+    def get_stats(self) -> dict:
+        """
+        獲取處理階段的執行統計，預設沒有
+
+        返回：
+        - stats: 統計字典
+        """
+        return {}
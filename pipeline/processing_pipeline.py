@@ -1,37 +1,63 @@
 # pipeline/processing_pipeline.py
 
 import os
-from typing import List, Tuple, Dict, Any, TYPE_CHECKING
-from models import FrameDataModel
+import time
+from typing import List, Optional, Tuple, Dict, Any, TYPE_CHECKING
+from models import FrameData
 from .pipeline_stage import PipelineStage
-from ultralytics import YOLO
+from .roi_smoother import Roi, RoiSmoother
+from .metrics import (
+    PipelineMetrics,
+    create_pipeline_metrics,
+    release_pipeline_metrics,
+)
 from logger import logger
 
 
 class ProcessingPipeline:
-    def __init__(self, source=0) -> None:
+    def __init__(
+        self,
+        source=0,
+        roi_smoother: Optional[RoiSmoother] = None,
+        frame_budget_ms: Optional[float] = None,
+    ) -> None:
         """
         初始化處理管道，管理處理階段和其配置
 
-        out_func: (frame: Any, data: FrameDataModel) -> None
+        out_func: (frame: Any, data: FrameData) -> None
+
+        參數：
+        - source: 影像來源
+        - roi_smoother: 平滑黑板 ROI 的設定，None 時使用預設值
+        - frame_budget_ms: 每幀處理時間的預算；預估會超時時略過可選階段，
+          可降級的階段依 data.deadline 選擇較便宜的做法；None 為不限
         """
         self.source = source
+        self.roi_smoother = roi_smoother or RoiSmoother()
+        self.frame_budget_ms: Optional[float] = frame_budget_ms
+        # 統計關閉時為 None，處理時不做任何計時
+        self.metrics: Optional[PipelineMetrics] = create_pipeline_metrics(source)
         self.stages: List[Tuple[str, PipelineStage]] = []
         self.stage_configs: Dict[str, Dict[str, Any]] = {}
-        self.shared_data = {
-            "model": YOLO("yolov8n-fp16.engine", verbose=False),
-        }
+        # 各階段耗時的移動平均（毫秒），用來預估這一幀剩下的工作
+        self.stage_costs: Dict[str, float] = {}
+        self.shed_counts: Dict[str, int] = {}
+        # 模型由全程序共用的推論服務持有 (pipeline/inference_server.py)
+        self.shared_data: Dict[str, Any] = {}
 
-    def add_stage(self, stage_name: str, stage: PipelineStage) -> None:
+    def add_stage(
+        self, stage_name: str, stage: PipelineStage, optional: bool = False
+    ) -> None:
         """
         添加處理階段
 
         參數：
         - stage_name: 處理階段名稱，需唯一
         - stage: 處理階段實例
+        - optional: 可選階段在這一幀預估會超出預算時略過
         """
         self.stages.append((stage_name, stage))
-        self.stage_configs[stage_name] = {"enabled": True}
+        self.stage_configs[stage_name] = {"enabled": True, "optional": optional}
 
     def set_stage_enabled(self, stage_name: str, enabled: bool) -> None:
         """
@@ -45,6 +71,13 @@ class ProcessingPipeline:
             self.stage_configs[stage_name]["enabled"] = enabled
             print(f"Stage '{stage_name}' enabled: {enabled}")
 
+    def set_frame_budget(self, frame_budget_ms: Optional[float]) -> None:
+        """
+        設置每幀處理時間的預算（毫秒），None 為不限
+        """
+        self.frame_budget_ms = frame_budget_ms
+        logger.info(f"Frame budget for source {self.source}: {frame_budget_ms} ms")
+
     def set_stage_parameter(self, stage_name: str, params: dict) -> None:
         """
         設置處理階段的參數
@@ -84,6 +117,10 @@ class ProcessingPipeline:
                     "status": self.stage_configs[stage_name]["enabled"],
                 },
                 "params": stage.get_parameters(),
+                "stats": stage.get_stats(),
+                "optional": self.stage_configs[stage_name].get("optional", False),
+                "shed": self.shed_counts.get(stage_name, 0),
+                "cost_ms": round(self.stage_costs.get(stage_name, 0.0), 3),
             }
             stages_info.append(stage_info)
         return stages_info
@@ -99,7 +136,7 @@ class ProcessingPipeline:
 
     def process(
         self, frame: Any, timestamp: float
-    ) -> Tuple[Any, FrameDataModel, float]:
+    ) -> Tuple[Any, FrameData, float]:
         """
         處理影片幀，按照添加的處理階段順序進行處理
 
@@ -107,14 +144,141 @@ class ProcessingPipeline:
         - frame: 待處理的影片幀
         - timestamp: 幀的時間戳
         """
-        data = FrameDataModel(timestamp=timestamp)
+        if self.metrics is not None:
+            wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        data = FrameData(timestamp=timestamp, source=self.source)
+        frame_deadline = None
+        if self.frame_budget_ms is not None:
+            frame_deadline = time.perf_counter() + self.frame_budget_ms / 1000
         data = self.copy_shared_data(data)
-        for stage_name, stage in self.stages:
-            if self.stage_configs[stage_name]["enabled"]:
-                frame, data = stage.process(frame, data)
+        height, width = frame.shape[:2]
+        data.frame_size = (width, height)
+        shared_output = False  # 目前的 frame 是否為某階段重複使用的緩衝區
+        in_roi = False
+        enabled = [
+            (index, stage_name, stage)
+            for index, (stage_name, stage) in enumerate(self.stages)
+            if self.stage_configs[stage_name]["enabled"]
+        ]
+        for position, (index, stage_name, stage) in enumerate(enabled):
+            if frame_deadline is not None:
+                # 這個階段的截止時間：保留之後必要階段的預估耗時
+                reserve_ms = sum(
+                    self.stage_costs.get(name, 0.0)
+                    for _, name, _ in enabled[position + 1 :]
+                    if not self.stage_configs[name].get("optional")
+                )
+                data.deadline = frame_deadline - reserve_ms / 1000
+                if self.stage_configs[stage_name].get("optional") and self._should_shed(
+                    stage_name, data.deadline
+                ):
+                    data.shed_mask |= 1 << index
+                    continue
 
+            if stage.roi_aware and not in_roi:
+                # 第一個只處理 ROI 的階段之前切成黑板區域的視圖（不複製）
+                in_roi = True
+                data.roi = self.update_roi(data, frame.shape)
+                if data.roi is not None:
+                    x1, y1, x2, y2 = data.roi
+                    frame = frame[y1:y2, x1:x2]
+            start = time.perf_counter()
+            if self.metrics is None:
+                result, data = stage.process(frame, data)
+            else:
+                result, data = self._timed_process(stage_name, stage, frame, data)
+            self._record_cost(stage_name, time.perf_counter() - start)
+            data.stage_mask |= 1 << index
+            if result is not frame:
+                shared_output = stage.reuses_output_buffer
+            frame = result
+        data.deadline = frame_deadline
+
+        if shared_output:
+            # 輸出會被發布與存檔，不能在下一幀被階段覆寫
+            frame = frame.copy()
+        if self.metrics is not None:
+            self.metrics.record(
+                PipelineMetrics.TOTAL,
+                time.perf_counter() - wall_start,
+                time.thread_time() - cpu_start,
+            )
         return frame, data, timestamp
 
-    def copy_shared_data(self, data: FrameDataModel):
-        data.model = self.shared_data["model"]
+    def _should_shed(self, stage_name: str, deadline: float) -> bool:
+        """
+        可選階段的預估耗時超過剩餘時間時略過；略過期間預估值逐漸下降，之後會再嘗試
+        """
+        cost = self.stage_costs.get(stage_name)
+        if cost is None:
+            return False  # 還沒量測過，先執行一次
+        if cost <= (deadline - time.perf_counter()) * 1000:
+            return False
+        self.stage_costs[stage_name] = cost * 0.98
+        self.shed_counts[stage_name] = self.shed_counts.get(stage_name, 0) + 1
+        return True
+
+    def _record_cost(self, stage_name: str, elapsed: float) -> None:
+        cost = elapsed * 1000
+        previous = self.stage_costs.get(stage_name)
+        self.stage_costs[stage_name] = (
+            cost if previous is None else previous * 0.8 + cost * 0.2
+        )
+
+    def get_stage_names(self) -> List[str]:
+        """
+        依序的階段名稱，對應 FrameData.stage_mask / shed_mask 的 bit
+        """
+        return [stage_name for stage_name, _ in self.stages]
+
+    def _timed_process(
+        self, stage_name: str, stage: PipelineStage, frame: Any, data: FrameData
+    ) -> Tuple[Any, FrameData]:
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            result = stage.process(frame, data)
+        except Exception:
+            self.metrics.record(
+                stage_name,
+                time.perf_counter() - wall_start,
+                time.thread_time() - cpu_start,
+                ok=False,
+            )
+            raise
+        self.metrics.record(
+            stage_name, time.perf_counter() - wall_start, time.thread_time() - cpu_start
+        )
+        return result
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        獲取各處理階段的耗時分佈 (p50/p95/p99)、進出幀數與例外次數；統計關閉時為空
+        """
+        if self.metrics is None:
+            return {}
+        return self.metrics.snapshot()
+
+    def close(self) -> None:
+        """
+        釋放管道的資源（取消統計註冊）
+        """
+        release_pipeline_metrics(self.metrics)
+        self.metrics = None
+
+    def update_roi(self, data: FrameData, shape) -> Optional[Roi]:
+        """
+        以最大的黑板框更新平滑後的 ROI
+        """
+        box = None
+        if len(data.blackboard_boxes):
+            box = max(
+                data.blackboard_boxes,
+                key=lambda b: (b[2] - b[0]) * (b[3] - b[1]),
+            )
+        return self.roi_smoother.update(box, shape)
+
+    def copy_shared_data(self, data: FrameData):
+        for key, value in self.shared_data.items():
+            setattr(data, key, value)
         return data
@@ -0,0 +1,441 @@
+# pipeline/remote_pipeline.py
+
+import itertools
+import multiprocessing as mp
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait as wait_connections
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models import FrameData
+from logger import logger
+from .inference_server import (
+    configure_inference_server,
+    get_inference_server_config,
+    shutdown_inference_server,
+)
+from .metrics import (
+    configure_metrics,
+    create_pipeline_metrics,
+    metrics_enabled,
+    release_pipeline_metrics,
+)
+from .pipeline_stage import PipelineStage
+from .processing_pipeline import ProcessingPipeline
+
+# 通道的訊息，送出時前面加上序號，回覆帶回同一個序號
+MSG_PROCESS = "process"  # 幀通道：(MSG_PROCESS, 輸入記憶體名稱, shape, dtype, timestamp)
+MSG_CALL = "call"  # 控制通道：(MSG_CALL, ProcessingPipeline 的方法名稱, args)
+MSG_STOP = "stop"  # 控制通道
+
+REPLY_OK = "ok"
+REPLY_ERROR = "error"
+
+# 等待工作程序回覆的秒數，逾時視為工作程序卡住
+PROCESS_TIMEOUT = 30.0  # 一幀（包含等待推論服務）
+CONTROL_TIMEOUT = 5.0  # 控制呼叫，最多等工作程序處理完目前這一幀
+
+# 處理結果的位置
+RESULT_INPUT = "input"  # 輸入槽位本身或其視圖：(RESULT_INPUT, shape, dtype, offset, strides)
+RESULT_OUTPUT = "output"  # 工作程序的輸出記憶體：(RESULT_OUTPUT, 記憶體名稱, shape, dtype)
+
+
+def _address(array: np.ndarray) -> int:
+    return array.__array_interface__["data"][0]
+
+
+def _release(segment: shared_memory.SharedMemory, unlink: bool) -> None:
+    try:
+        segment.close()
+    except BufferError:
+        # 仍有陣列指向這塊記憶體（例如環形緩衝區的槽位），交給 GC 回收映射
+        pass
+    if unlink:
+        segment.unlink()
+
+
+def _worker_main(
+    conn: Any,
+    control: Any,
+    source: Any,
+    stages: List[Tuple[str, PipelineStage, bool]],
+    frame_budget_ms: Optional[float],
+    settings: Dict[str, Any],
+) -> None:
+    """
+    工作程序：在獨立的程序（獨立的 GIL）中執行一個來源的 ProcessingPipeline
+
+    影片幀經由共享記憶體傳遞，幀通道只傳送記憶體名稱、shape 與 FrameData；
+    控制呼叫走另一條通道，不必和處理線程搶同一條
+    """
+    # 中斷由主程序處理，主程序會送出 MSG_STOP
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_metrics(enabled=settings["metrics"])
+    configure_inference_server(**settings["inference"])
+
+    pipeline = ProcessingPipeline(source=source, frame_budget_ms=frame_budget_ms)
+    for stage_name, stage, optional in stages:
+        pipeline.add_stage(stage_name, stage, optional=optional)
+
+    inputs: Dict[str, shared_memory.SharedMemory] = {}
+    output: Optional[shared_memory.SharedMemory] = None
+    try:
+        running = True
+        while running:
+            ready = wait_connections([control, conn])
+            # 控制呼叫優先處理
+            for channel in (control, conn):
+                if channel not in ready:
+                    continue
+                try:
+                    seq, *message = channel.recv()
+                except EOFError:
+                    running = False
+                    break
+                if message[0] == MSG_STOP:
+                    running = False
+                    break
+                try:
+                    if message[0] == MSG_PROCESS:
+                        reply, output = _process_frame(
+                            pipeline, inputs, output, *message[1:]
+                        )
+                    else:
+                        _, method, args = message
+                        reply = (REPLY_OK, getattr(pipeline, method)(*args))
+                except Exception as e:
+                    logger.exception(f"Pipeline worker for source {source} failed")
+                    reply = (REPLY_ERROR, f"{type(e).__name__}: {e}")
+                channel.send((seq,) + reply)
+    finally:
+        shutdown_inference_server()
+        pipeline.close()
+        for segment in inputs.values():
+            _release(segment, unlink=False)
+        if output is not None:
+            _release(output, unlink=True)
+        conn.close()
+        control.close()
+
+
+def _process_frame(
+    pipeline: ProcessingPipeline,
+    inputs: Dict[str, shared_memory.SharedMemory],
+    output: Optional[shared_memory.SharedMemory],
+    name: str,
+    shape: Tuple[int, ...],
+    dtype: str,
+    timestamp: float,
+) -> Tuple[tuple, Optional[shared_memory.SharedMemory]]:
+    """
+    處理共享記憶體中的一幀
+
+    返回：
+    - reply: (REPLY_OK, data, 結果的位置)
+    - output: 工作程序的輸出記憶體（可能重新配置）
+    """
+    segment = inputs.get(name)
+    if segment is None:
+        segment = inputs[name] = shared_memory.SharedMemory(name=name)
+    frame = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+    result, data, _ = pipeline.process(frame, timestamp)
+    if np.may_share_memory(result, frame):
+        location = (
+            RESULT_INPUT,
+            result.shape,
+            result.dtype.str,
+            _address(result) - _address(frame),
+            result.strides,
+        )
+    else:
+        if output is None or output.size < result.nbytes:
+            if output is not None:
+                _release(output, unlink=True)
+            # 多留一些空間，ROI 大小稍微變動時不需重新配置
+            output = shared_memory.SharedMemory(
+                create=True, size=int(result.nbytes * 1.25) + 1
+            )
+        view = np.ndarray(result.shape, result.dtype, buffer=output.buf)
+        np.copyto(view, result)
+        del view
+        location = (RESULT_OUTPUT, output.name, result.shape, result.dtype.str)
+    del frame, result
+    return (REPLY_OK, data, location), output
+
+
+class RemotePipeline:
+    # 主程序端記錄的往返時間（送出幀到收到結果）
+    ROUNDTRIP = "_roundtrip"
+
+    def __init__(self, source=0, frame_budget_ms: Optional[float] = None) -> None:
+        """
+        在工作程序中執行的處理管道，介面與 ProcessingPipeline 相同
+
+        CPU 密集的階段不再與其他來源的線程搶同一個 GIL。影片幀放在共享記憶體的槽位中，
+        不經過 pickle；捕捉端可以用 create_frame_slots() 的槽位直接讀入，完全不複製。
+        階段的啟用、參數與預算設定經由控制通道轉送到工作程序。
+        工作程序以 spawn 建立，階段在 start() 時傳入，之後不能再新增。
+
+        注意：推論服務是每個程序各一個，使用推論服務的階段（uses_inference_server）
+        在工作程序中會另外載入一份模型，不與其他來源的幀批次推論，GPU 記憶體隨之倍增
+
+        參數：
+        - source: 影像來源
+        - frame_budget_ms: 每幀處理時間的預算，None 為不限
+        """
+        self.source = source
+        self.frame_budget_ms: Optional[float] = frame_budget_ms
+        self.stages: List[Tuple[str, PipelineStage]] = []
+        self.optional: Dict[str, bool] = {}
+        self.metrics = create_pipeline_metrics(source)
+
+        self.process_handle: Optional[mp.process.BaseProcess] = None
+        self.conn: Any = None  # 幀通道，處理線程使用
+        self.control: Any = None  # 控制通道，事件處理使用
+        self.lock = threading.Lock()
+        self.control_lock = threading.Lock()
+        self.seq = itertools.count(1)
+
+        # 輸入槽位：資料位址 → 共享記憶體，捕捉端直接讀入這些槽位時不需複製
+        self.slots: Dict[int, shared_memory.SharedMemory] = {}
+        self.staging: Optional[shared_memory.SharedMemory] = None
+        self.outputs: Dict[str, shared_memory.SharedMemory] = {}
+
+    def add_stage(
+        self, stage_name: str, stage: PipelineStage, optional: bool = False
+    ) -> None:
+        if self.process_handle is not None:
+            raise RuntimeError("Cannot add stages after the pipeline worker started")
+        self.stages.append((stage_name, stage))
+        self.optional[stage_name] = optional
+
+    def start(self) -> None:
+        """
+        啟動工作程序，階段實例會複製（pickle）到工作程序
+        """
+        if self.process_handle is not None:
+            return
+        context = mp.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.control, child_control = context.Pipe()
+        settings = {
+            "metrics": metrics_enabled(),
+            "inference": get_inference_server_config(),
+        }
+        stages = [(name, stage, self.optional[name]) for name, stage in self.stages]
+        inference_stages = [
+            name for name, stage in self.stages if stage.uses_inference_server
+        ]
+        if inference_stages:
+            logger.warning(
+                f"Pipeline worker for source {self.source} runs {', '.join(inference_stages)} "
+                "with its own copy of the model and its own inference server: "
+                "frames are not batched with other sources and GPU memory is multiplied. "
+                'Prefer execution="thread" for sources with detection.'
+            )
+        self.process_handle = context.Process(
+            target=_worker_main,
+            args=(
+                child_conn,
+                child_control,
+                self.source,
+                stages,
+                self.frame_budget_ms,
+                settings,
+            ),
+            name=f"pipeline-{self.source}",
+            daemon=True,
+        )
+        self.process_handle.start()
+        child_conn.close()
+        child_control.close()
+        logger.info(
+            f"Pipeline worker for source {self.source} started (pid {self.process_handle.pid})"
+        )
+
+    def create_frame_slots(
+        self, shape: Tuple[int, ...], count: int, dtype=np.uint8
+    ) -> List[np.ndarray]:
+        """
+        配置共享記憶體中的影片幀槽位，交給捕捉端的環形緩衝區重複使用
+
+        參數：
+        - shape: 影片幀的 shape
+        - count: 槽位數
+
+        返回：
+        - slots: 以共享記憶體為底的陣列
+        """
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        arrays = []
+        for _ in range(count):
+            segment = shared_memory.SharedMemory(create=True, size=nbytes)
+            array = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+            self.slots[_address(array)] = segment
+            arrays.append(array)
+        return arrays
+
+    def process(
+        self, frame: Any, timestamp: float
+    ) -> Tuple[Any, FrameData, float]:
+        """
+        交給工作程序處理一幀
+
+        參數：
+        - frame: 待處理的影片幀
+        - timestamp: 幀的時間戳
+
+        返回：
+        - frame: 處理後的影片幀；只有在結果為輸入幀的視圖時才與輸入共用記憶體
+        - data: 幀的數據模型
+        - timestamp: 幀的時間戳
+        """
+        if self.metrics is not None:
+            wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        segment = self.slots.get(_address(frame))
+        staged = (
+            segment is None
+            or frame.nbytes > segment.size
+            or not frame.flags.c_contiguous
+        )
+        if staged:
+            # 不是共享記憶體槽位（例如解析度改變），複製到暫存槽位
+            if self.staging is None or self.staging.size < frame.nbytes:
+                if self.staging is not None:
+                    _release(self.staging, unlink=True)
+                self.staging = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+            segment = self.staging
+            np.copyto(np.ndarray(frame.shape, frame.dtype, buffer=segment.buf), frame)
+
+        _, data, location = self._request(
+            (MSG_PROCESS, segment.name, frame.shape, frame.dtype.str, timestamp),
+            control=False,
+        )
+
+        if location[0] == RESULT_INPUT:
+            _, shape, dtype, offset, strides = location
+            result = np.ndarray(
+                shape, dtype=dtype, buffer=segment.buf, offset=offset, strides=strides
+            )
+            if staged:
+                result = result.copy()
+        else:
+            _, name, shape, dtype = location
+            output = self.outputs.get(name)
+            if output is None:
+                for stale in self.outputs.values():
+                    _release(stale, unlink=False)
+                self.outputs = {name: shared_memory.SharedMemory(name=name)}
+                output = self.outputs[name]
+            # 工作程序下一幀會覆寫輸出記憶體
+            result = np.ndarray(shape, dtype=dtype, buffer=output.buf).copy()
+
+        if self.metrics is not None:
+            self.metrics.record(
+                self.ROUNDTRIP,
+                time.perf_counter() - wall_start,
+                time.thread_time() - cpu_start,
+            )
+        return result, data, timestamp
+
+    def set_stage_enabled(self, stage_name: str, enabled: bool) -> None:
+        self._call("set_stage_enabled", stage_name, enabled)
+
+    def set_stage_parameter(self, stage_name: str, params: dict) -> None:
+        self._call("set_stage_parameter", stage_name, params)
+
+    def get_stage_parameter(self, stage_name: str) -> Any:
+        return self._call("get_stage_parameter", stage_name)
+
+    def set_frame_budget(self, frame_budget_ms: Optional[float]) -> None:
+        self.frame_budget_ms = frame_budget_ms
+        self._call("set_frame_budget", frame_budget_ms)
+
+    def get_stages(self):
+        return self._call("get_stages")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        工作程序內各階段的統計，加上主程序端的往返時間
+        """
+        metrics = self._call("get_metrics")
+        if self.metrics is not None:
+            metrics.update(self.metrics.snapshot())
+        return metrics
+
+    def get_stage_names(self) -> List[str]:
+        return [stage_name for stage_name, _ in self.stages]
+
+    def _call(self, method: str, *args: Any) -> Any:
+        return self._request((MSG_CALL, method, args))[1]
+
+    def _request(self, message: tuple, control: bool = True) -> tuple:
+        """
+        送出訊息並等待回覆，逾時拋出 TimeoutError（不會無限期阻塞呼叫端）
+
+        參數：
+        - message: 訊息
+        - control: True 走控制通道，False 走幀通道
+        """
+        if self.conn is None:
+            self.start()
+        conn, lock, timeout = (
+            (self.control, self.control_lock, CONTROL_TIMEOUT)
+            if control
+            else (self.conn, self.lock, PROCESS_TIMEOUT)
+        )
+        with lock:
+            seq = next(self.seq)
+            try:
+                conn.send((seq,) + message)
+                while True:
+                    if not conn.poll(timeout):
+                        raise TimeoutError(
+                            f"Pipeline worker for source {self.source} "
+                            f"did not reply within {timeout}s"
+                        )
+                    reply_seq, *reply = conn.recv()
+                    # 略過先前逾時的請求遲到的回覆
+                    if reply_seq == seq:
+                        break
+            except (EOFError, OSError) as e:
+                raise RuntimeError(
+                    f"Pipeline worker for source {self.source} is not running"
+                ) from e
+        if reply[0] == REPLY_ERROR:
+            raise RuntimeError(f"Pipeline worker for source {self.source}: {reply[1]}")
+        return reply
+
+    def close(self) -> None:
+        """
+        停止工作程序並釋放共享記憶體
+        """
+        if self.process_handle is not None:
+            with self.control_lock:
+                try:
+                    self.control.send((next(self.seq), MSG_STOP))
+                except (BrokenPipeError, OSError):
+                    pass
+            self.process_handle.join(timeout=5)
+            if self.process_handle.is_alive():
+                logger.warning(f"Pipeline worker for source {self.source} did not stop")
+                self.process_handle.terminate()
+            self.conn.close()
+            self.control.close()
+            self.process_handle = None
+            self.conn = None
+            self.control = None
+
+        for segment in list(self.slots.values()) + [self.staging]:
+            if segment is not None:
+                _release(segment, unlink=True)
+        self.slots = {}
+        self.staging = None
+        for output in self.outputs.values():
+            _release(output, unlink=False)
+        self.outputs = {}
+        release_pipeline_metrics(self.metrics)
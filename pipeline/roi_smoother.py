@@ -0,0 +1,77 @@
+# pipeline/roi_smoother.py
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+Roi = Tuple[int, int, int, int]
+
+
+class RoiSmoother:
+    def __init__(
+        self,
+        alpha: float = 0.3,
+        deadband: int = 8,
+        hold_frames: int = 15,
+        padding: int = 0,
+    ):
+        """
+        平滑每幀偵測到的黑板框，輸出穩定的 ROI (x1, y1, x2, y2)
+
+        框的四個邊先做指數移動平均，只有平均值偏離目前輸出超過 deadband 時才更新輸出，
+        因此 ROI 的大小大多數時間固定，下游階段的緩衝區不需重新配置
+
+        參數：
+        - alpha: 移動平均中新框所佔的權重 (0~1)
+        - deadband: 輸出更新前允許的偏移（像素）
+        - hold_frames: 偵測不到黑板時沿用上一個 ROI 的幀數
+        - padding: ROI 向外擴張的像素
+        """
+        self.alpha = alpha
+        self.deadband = deadband
+        self.hold_frames = hold_frames
+        self.padding = padding
+        self.average: Optional[np.ndarray] = None
+        self.anchor: Optional[np.ndarray] = None  # 上次更新輸出時的平均框
+        self.roi: Optional[Roi] = None
+        self.missed: int = 0
+
+    def reset(self) -> None:
+        self.average = None
+        self.anchor = None
+        self.roi = None
+        self.missed = 0
+
+    def update(self, box: Optional[Sequence[float]], shape) -> Optional[Roi]:
+        """
+        以這一幀的黑板框更新 ROI
+
+        參數：
+        - box: 這一幀的黑板框 (x1, y1, x2, y2)，沒有偵測到時為 None
+        - shape: 完整幀的 shape
+
+        返回：
+        - roi: 限制在幀內的整數 ROI，沒有可用的黑板時為 None
+        """
+        if box is None:
+            self.missed += 1
+            if self.missed > self.hold_frames:
+                self.reset()
+            return self.roi
+        self.missed = 0
+
+        box = np.array(box[:4], dtype=np.float64)
+        if self.average is None:
+            self.average = box
+        else:
+            self.average += self.alpha * (box - self.average)
+
+        if self.anchor is None or np.abs(self.average - self.anchor).max() > self.deadband:
+            height, width = shape[:2]
+            x1, y1, x2, y2 = np.rint(self.average).astype(int)
+            x1, y1 = max(x1 - self.padding, 0), max(y1 - self.padding, 0)
+            x2, y2 = min(x2 + self.padding, width), min(y2 + self.padding, height)
+            if x1 < x2 and y1 < y2:
+                self.anchor = self.average.copy()
+                self.roi = (int(x1), int(y1), int(x2), int(y2))
+        return self.roi
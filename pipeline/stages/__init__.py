@@ -1,15 +1,27 @@
 # pipeline/stages/__init__.py
 
-from .image_cropping_stage import ImageCroppingStage
-from .deblurring_stage import DeblurringStage
-from .image_binarization_stage import ImageBinarizationStage
-from .obj_detection_stage import ObjectDetectionStage
-from .person_removing_stage import PersonRemovingStage
-
-__all__ = [
-    "ImageCroppingStage",
-    "DeblurringStage",
-    "ImageBinarizationStage",
-    "ObjectDetectionStage",
-    "PersonRemovingStage",
-]
+import importlib
+
+# 階段名稱 → 模組，第一次存取時才匯入（以及該階段需要的函式庫）
+_STAGE_MODULES = {
+    "ImageCroppingStage": ".image_cropping_stage",
+    "DeblurringStage": ".deblurring_stage",
+    "ImageBinarizationStage": ".image_binarization_stage",
+    "ObjectDetectionStage": ".obj_detection_stage",
+    "PersonRemovingStage": ".person_removing_stage",
+}
+
+__all__ = list(_STAGE_MODULES)
+
+
+def __getattr__(name: str):
+    module_name = _STAGE_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    stage = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = stage
+    return stage
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,24 +1,96 @@
 # pipeline/stages/deblurring_stage.py
 
-from typing import Any, Tuple
+import time
+from typing import Any, Dict, Optional, Tuple
 from pipeline import PipelineStage
-from models import FrameDataModel
+from models import FrameData
+import cv2
 import numpy as np
 
+# 由貴到便宜排列，超出預算時往後降級
+MODE_WIENER = "wiener"  # 高斯 PSF 的 Wiener 反捲積（頻域）
+MODE_ADAPTIVE = "adaptive"  # 依 Laplacian 變異數調整強度的 unsharp mask
+MODE_UNSHARP = "unsharp"  # 固定強度的 unsharp mask
+MODE_KERNEL = "kernel"  # 3x3 銳化卷積
+MODE_OFF = "off"  # 不處理
+MODES = (MODE_WIENER, MODE_ADAPTIVE, MODE_UNSHARP, MODE_KERNEL, MODE_OFF)
+
 
 class DeblurringStage(PipelineStage):
-    def __init__(self, strength: float = 1.0):
+    roi_aware = True
+    # 輸出寫入重複使用的緩衝區
+    reuses_output_buffer = True
+
+    def __init__(
+        self,
+        strength: float = 1.0,
+        mode: str = MODE_ADAPTIVE,
+        sigma: float = 1.5,
+        target_sharpness: float = 300.0,
+        wiener_nsr: float = 0.01,
+        budget_safety: float = 1.2,
+    ):
         """
         初始化圖像清晰化階段
 
         參數：
-        - strength: 清晰化強度
+        - strength: 清晰化強度（unsharp mask 的倍數）
+        - mode: "wiener" / "adaptive" / "unsharp" / "kernel" / "off"
+        - sigma: 模糊核（unsharp 的高斯模糊與 Wiener 的 PSF）的標準差
+        - target_sharpness: adaptive 模式中 Laplacian 變異數達到此值時不再銳化
+        - wiener_nsr: Wiener 濾波的雜訊訊號比，越大越保守
+        - budget_safety: 預估耗時乘上此倍數後與剩餘預算比較
         """
         self.strength: float = strength
+        self.mode: str = mode
+        self.sigma: float = sigma
+        self.target_sharpness: float = target_sharpness
+        self.wiener_nsr: float = wiener_nsr
+        self.budget_safety: float = budget_safety
+
+        # 各模式每百萬像素的耗時（毫秒，移動平均），用來預估不同 ROI 大小的成本
+        self.cost_per_mp: Dict[str, float] = {}
+        self.mode_counts: Dict[str, int] = {mode: 0 for mode in MODES}
+        self.degraded_frames: int = 0
+        self.last_mode: Optional[str] = None
+
+        # 依幀大小配置的緩衝區
+        self.blurred = None
+        self.output = None
+        self.wiener_filter = None  # (shape, sigma, nsr, 頻域濾波器)
+
+    def get_parameters(self):
+        return {
+            "strength": self.strength,
+            "mode": self.mode,
+            "sigma": self.sigma,
+            "target_sharpness": self.target_sharpness,
+            "wiener_nsr": self.wiener_nsr,
+        }
+
+    def set_parameters(self, params):
+        self.strength = float(params.get("strength", self.strength))
+        self.sigma = max(0.1, float(params.get("sigma", self.sigma)))
+        self.target_sharpness = float(
+            params.get("target_sharpness", self.target_sharpness)
+        )
+        self.wiener_nsr = max(1e-4, float(params.get("wiener_nsr", self.wiener_nsr)))
+        if params.get("mode") in MODES:
+            self.mode = params["mode"]
 
-    def process(self, frame: Any, data: FrameDataModel) -> Tuple[Any, FrameDataModel]:
+    def get_stats(self) -> dict:
+        return {
+            "last_mode": self.last_mode,
+            "degraded_frames": self.degraded_frames,
+            "mode_counts": dict(self.mode_counts),
+            "ms_per_megapixel": {
+                mode: round(cost, 3) for mode, cost in self.cost_per_mp.items()
+            },
+        }
+
+    def process(self, frame: Any, data: FrameData) -> Tuple[Any, FrameData]:
         """
-        執行圖像清晰化
+        執行圖像清晰化；管道設定了每幀預算時，預估會超出剩餘時間就改用較便宜的模式
 
         參數：
         - frame: 當前影片幀
@@ -28,9 +100,112 @@ class DeblurringStage(PipelineStage):
         - frame: 處理後的影片幀
         - data: 更新後的數據模型
         """
-        # TODO: 添加實際的清晰化代碼
-        return frame, data
+        mode = self.select_mode(frame, data.deadline)
+        self.last_mode = mode
+        self.mode_counts[mode] += 1
+        if mode != self.mode:
+            self.degraded_frames += 1
+        if mode == MODE_OFF:
+            return frame, data
+
+        if self.output is None or self.output.shape != frame.shape:
+            self.output = np.empty_like(frame)
+            self.blurred = np.empty_like(frame)
+
+        start = time.perf_counter()
+        if mode == MODE_WIENER:
+            self.wiener(frame, self.output)
+        elif mode == MODE_ADAPTIVE:
+            self.unsharp(frame, self.output, self.adaptive_amount(frame))
+        elif mode == MODE_UNSHARP:
+            self.unsharp(frame, self.output, self.strength)
+        else:
+            self.sharpen_kernel(frame, self.output)
+        self.record_cost(mode, time.perf_counter() - start, frame)
+
+        data.deblurring_stage_finish = True
+        return self.output, data
+
+    def select_mode(self, frame, deadline: Optional[float]) -> str:
+        """
+        從設定的模式開始，選第一個預估耗時在剩餘預算內的模式
+        """
+        if deadline is None or self.mode == MODE_OFF:
+            return self.mode
+        remaining_ms = (deadline - time.perf_counter()) * 1000
+        megapixels = frame.shape[0] * frame.shape[1] / 1e6
+        for mode in MODES[MODES.index(self.mode) :]:
+            if mode == MODE_OFF:
+                break
+            # 還沒量測過的模式先試一次
+            estimate = self.cost_per_mp.get(mode, 0.0) * megapixels
+            if estimate * self.budget_safety <= remaining_ms:
+                return mode
+        return MODE_OFF
+
+    def record_cost(self, mode: str, elapsed: float, frame) -> None:
+        megapixels = max(frame.shape[0] * frame.shape[1] / 1e6, 1e-6)
+        cost = elapsed * 1000 / megapixels
+        previous = self.cost_per_mp.get(mode)
+        self.cost_per_mp[mode] = cost if previous is None else previous * 0.9 + cost * 0.1
+
+    def unsharp(self, frame, output, amount: float) -> None:
+        if amount <= 0:
+            np.copyto(output, frame)
+            return
+        cv2.GaussianBlur(frame, (0, 0), self.sigma, dst=self.blurred)
+        # output = frame + amount * (frame - blurred)
+        cv2.addWeighted(frame, 1 + amount, self.blurred, -amount, 0, dst=output)
+
+    def adaptive_amount(self, frame) -> float:
+        """
+        以縮小灰階圖的 Laplacian 變異數估計清晰度，越模糊銳化越強
+        """
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        scale = min(1.0, 320 / gray.shape[1])
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        sharpness = cv2.Laplacian(gray, cv2.CV_32F).var()
+        deficit = 1.0 - sharpness / self.target_sharpness
+        return self.strength * float(np.clip(deficit, 0.0, 1.0))
+
+    def sharpen_kernel(self, frame, output) -> None:
+        amount = self.strength
+        kernel = np.array(
+            [[0, -amount, 0], [-amount, 1 + 4 * amount, -amount], [0, -amount, 0]],
+            dtype=np.float32,
+        )
+        cv2.filter2D(frame, -1, kernel, dst=output)
+
+    def wiener(self, frame, output) -> None:
+        """
+        假設模糊為高斯 PSF，在頻域套用 Wiener 濾波 H / (H^2 + NSR)；
+        高斯的頻率響應為實數，濾波器依幀大小快取
+        """
+        shape = frame.shape[:2]
+        key = (shape, self.sigma, self.wiener_nsr)
+        if self.wiener_filter is None or self.wiener_filter[0] != key:
+            fy = np.fft.fftfreq(shape[0]).astype(np.float32)[:, None]
+            fx = np.fft.fftfreq(shape[1]).astype(np.float32)[None, :]
+            response = np.exp(-2 * (np.pi * self.sigma) ** 2 * (fx ** 2 + fy ** 2))
+            gain = response / (response ** 2 + self.wiener_nsr)
+            # cv2.dft 的複數輸出為 (實部, 虛部) 兩個通道
+            self.wiener_filter = (key, np.repeat(gain[..., None], 2, axis=2))
+        gain = self.wiener_filter[1]
+
+        channels = [frame] if frame.ndim == 2 else cv2.split(frame)
+        restored = []
+        for channel in channels:
+            spectrum = cv2.dft(np.float32(channel), flags=cv2.DFT_COMPLEX_OUTPUT)
+            spectrum *= gain
+            result = cv2.idft(spectrum, flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)
+            restored.append(np.clip(result, 0, 255).astype(np.uint8))
+        if frame.ndim == 2:
+            np.copyto(output, restored[0])
+        else:
+            cv2.merge(restored, dst=output)
 
+    @staticmethod
     def adjust_contrast(image: np.ndarray, factor: float) -> np.ndarray:
         mean = np.mean(image)
         return np.clip((1 - factor) * mean + factor * image, 0, 255).astype(np.uint8)
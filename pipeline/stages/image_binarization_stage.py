@@ -1,25 +1,81 @@
 # pipeline/stages/image_binarization_stage.py
 
-from typing import Any, Tuple
+from typing import Any, Optional, Tuple
 from pipeline import PipelineStage
-from models import FrameDataModel
+from models import FrameData
 import cv2
 import numpy as np
 
+METHOD_GLOBAL = "global"  # 固定閾值
+METHOD_SAUVOLA = "sauvola"  # T = m * (1 + k * (s / R - 1))
+METHOD_NIBLACK = "niblack"  # T = m + k * s
+METHOD_SKIMAGE = "skimage"  # 舊的 skimage Sauvola + 膨脹遮罩流程
+METHODS = (METHOD_GLOBAL, METHOD_SAUVOLA, METHOD_NIBLACK, METHOD_SKIMAGE)
+
 
 class ImageBinarizationStage(PipelineStage):
-    def __init__(self, threshold: int = 127):
+    roi_aware = True
+
+    def __init__(
+        self,
+        threshold: int = 127,
+        method: str = METHOD_GLOBAL,
+        window_size: int = 25,
+        k: Optional[float] = None,
+        r: float = 128.0,
+    ):
         """
         初始化圖像二值化階段
 
         參數：
-        - threshold: 用於二值化的閾值（0-255）
+        - threshold: 用於二值化的閾值（0-255），method="global" 時使用
+        - method: "global" / "sauvola" / "niblack" / "skimage"
+        - window_size: 局部閾值的視窗大小（奇數）
+        - k: 局部閾值的係數，None 時 Sauvola 為 0.2、Niblack 為 -0.2
+        - r: Sauvola 標準差的動態範圍
         """
         self.threshold: int = threshold
+        self.method: str = method
+        self.window_size: int = window_size | 1
+        self.k: Optional[float] = k
+        self.r: float = r
         self.SauvolaWindowSize: int = 3
         self.dilate_iterations: int = 3
 
-    def process(self, frame: Any, data: FrameDataModel) -> Tuple[Any, FrameDataModel]:
+        # 依幀大小配置的工作緩衝區
+        self.buffer_shape: Optional[Tuple[int, ...]] = None
+        self.gray = None  # uint8 灰階
+        self.gray_f = None  # float32 灰階
+        self.mean = None  # 局部平均
+        self.mean_sq = None  # 局部平均的平方
+        self.work = None  # 局部平方平均 → 標準差 → 閾值
+        self.binary = None  # uint8 輸出
+
+    @property
+    def reuses_output_buffer(self) -> bool:
+        # 局部閾值模式輸出到重複使用的緩衝區
+        return self.method in (METHOD_SAUVOLA, METHOD_NIBLACK)
+
+    def get_parameters(self):
+        return {
+            "threshold": self.threshold,
+            "method": self.method,
+            "window_size": self.window_size,
+            "k": self.k,
+            "r": self.r,
+        }
+
+    def set_parameters(self, params):
+        self.threshold = int(params.get("threshold", self.threshold))
+        if params.get("method") in METHODS:
+            self.method = params["method"]
+        if "window_size" in params:
+            self.window_size = max(3, int(params["window_size"]) | 1)
+        if "k" in params:
+            self.k = None if params["k"] is None else float(params["k"])
+        self.r = float(params.get("r", self.r))
+
+    def process(self, frame: Any, data: FrameData) -> Tuple[Any, FrameData]:
         """
         執行圖像二值化
 
@@ -31,28 +87,85 @@ class ImageBinarizationStage(PipelineStage):
         - frame: 處理後的二值化影片幀
         - data: 更新後的數據模型
         """
-        # 假設輸入的 frame 是灰度圖像，否則需要先將其轉換為灰度圖
-        if len(frame.shape) == 3 and frame.shape[2] == 3:
-            gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.method in (METHOD_SAUVOLA, METHOD_NIBLACK):
+            binarized_frame = self.local_threshold(frame)
+        elif self.method == METHOD_SKIMAGE:
+            binarized_frame = self.binarization(self.to_gray(frame))
         else:
-            gray_frame = frame
+            # 二值化處理
+            _, binarized_frame = cv2.threshold(
+                self.to_gray(frame), self.threshold, 255, cv2.THRESH_BINARY
+            )
 
-        # 二值化處理
-        _, binarized_frame = cv2.threshold(
-            gray_frame, self.threshold, 255, cv2.THRESH_BINARY
-        )
-        
         data.image_binarization_stage_finish = True
         # 返回處理後的幀和更新後的數據模型
         return binarized_frame, data
 
+    def to_gray(self, frame: np.ndarray) -> np.ndarray:
+        # 假設輸入的 frame 是灰度圖像，否則需要先將其轉換為灰度圖
+        if len(frame.shape) == 3 and frame.shape[2] == 3:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame
+
+    def local_threshold(self, frame: np.ndarray) -> np.ndarray:
+        """
+        以 boxFilter / sqrBoxFilter 計算局部平均與標準差 (float32)，
+        Sauvola 或 Niblack 逐像素閾值；所有中間結果寫入預先配置的緩衝區
+        """
+        shape = frame.shape[:2]
+        if self.buffer_shape != shape:
+            self.buffer_shape = shape
+            self.gray = np.empty(shape, dtype=np.uint8)
+            self.gray_f = np.empty(shape, dtype=np.float32)
+            self.mean = np.empty(shape, dtype=np.float32)
+            self.mean_sq = np.empty(shape, dtype=np.float32)
+            self.work = np.empty(shape, dtype=np.float32)
+            self.binary = np.empty(shape, dtype=np.uint8)
+
+        if frame.ndim == 3:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+            gray = self.gray
+        else:
+            gray = frame
+        np.copyto(self.gray_f, gray)
+
+        window = (self.window_size, self.window_size)
+        mean, work = self.mean, self.work
+        cv2.boxFilter(self.gray_f, -1, window, dst=mean, borderType=cv2.BORDER_REFLECT)
+        cv2.sqrBoxFilter(self.gray_f, -1, window, dst=work, borderType=cv2.BORDER_REFLECT)
+
+        # 標準差 s = sqrt(E[x^2] - m^2)
+        np.multiply(mean, mean, out=self.mean_sq)
+        work -= self.mean_sq
+        np.maximum(work, 0, out=work)
+        np.sqrt(work, out=work)
+
+        if self.method == METHOD_SAUVOLA:
+            k = 0.2 if self.k is None else self.k
+            # m * (1 + k * (s / R - 1)) = m * (s * k / R + 1 - k)
+            work *= k / self.r
+            work += 1 - k
+            work *= mean
+        else:
+            k = -0.2 if self.k is None else self.k
+            work *= k
+            work += mean
+
+        cv2.compare(self.gray_f, work, cv2.CMP_GT, dst=self.binary)
+        return self.binary
+
+    @staticmethod
     def adjust_contrast(image: np.ndarray, factor: float) -> np.ndarray:
         mean = np.mean(image)
         return np.clip((1 - factor) * mean + factor * image, 0, 255).astype(np.uint8)
 
     def process_image(self, image: np.ndarray) -> np.ndarray:
-        from skimage import img_as_ubyte
-        from skimage.filters import threshold_sauvola
+        # 舊的 skimage 實作為選用依賴，只在 method="skimage" 時匯入
+        try:
+            from skimage import img_as_ubyte
+            from skimage.filters import threshold_sauvola
+        except ImportError as e:
+            raise ImportError("method='skimage' requires scikit-image") from e
 
         # 调整对比度
         low_contrast_image = self.adjust_contrast(image, factor=1.7)
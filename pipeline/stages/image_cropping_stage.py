@@ -2,12 +2,14 @@
 
 from typing import Any, Tuple, List, Optional
 from pipeline import PipelineStage
-from models import FrameDataModel
+from models import FrameData
 import numpy as np
 import cv2
 
 
 class ImageCroppingStage(PipelineStage):
+    roi_aware = True
+
     def __init__(self, crop_size: Tuple[int, int] = (100, 100)):
         """
         初始化圖片裁切階段。
@@ -17,7 +19,7 @@ class ImageCroppingStage(PipelineStage):
         """
         self.crop_size: Tuple[int, int] = crop_size
 
-    def process(self, frame: Any, data: FrameDataModel) -> Tuple[Any, FrameDataModel]:
+    def process(self, frame: Any, data: FrameData) -> Tuple[Any, FrameData]:
         """
         執行圖片裁切，通過合併黑板框並裁切最大的框。
 
@@ -29,8 +31,12 @@ class ImageCroppingStage(PipelineStage):
         - frame: 處理後的視頻幀。
         - data: 更新後的數據模型。
         """
+        # 管道已切成平滑後的黑板 ROI，直接縮放，不再依這一幀的框裁切以免抖動
+        if data.roi is not None:
+            return cv2.resize(frame, self.crop_size), data
+
         # 確保有黑板框可以處理
-        if not data.blackboard_boxes:
+        if len(data.blackboard_boxes) == 0:
             return frame, data
 
         # 合併所有黑板框以找到最大的邊界框
@@ -64,7 +70,7 @@ class ImageCroppingStage(PipelineStage):
         回傳:
         - 最大的框作為列表 [x1, y1, x2, y2]，如果沒有提供框則回傳 None。
         """
-        if not boxes:
+        if len(boxes) == 0:
             return None
 
         # 計算每個框的面積並識別最大的那一個
@@ -2,34 +2,164 @@
 
 import json
 import random
-from typing import Any, Tuple
+import time
+from typing import Any, List, Optional, Tuple, TYPE_CHECKING
 
 import cv2
 from pipeline import PipelineStage
-from models import FrameDataModel
+from pipeline.inference_server import get_inference_server
+from models import FrameData, BOARD_EVENT_LOCKED, BOARD_EVENT_UNLOCKED
+from models.frame_data import EMPTY_BOXES
 import numpy as np
-from ultralytics import YOLOWorld
-import supervision as sv
+
+if TYPE_CHECKING:
+    import supervision as sv
+
+_supervision: Any = None
+
+
+def _sv() -> Any:
+    """
+    supervision 在第一次處理時才匯入（啟動時不載入），之後沿用同一個模組
+    """
+    global _supervision
+    if _supervision is None:
+        import supervision
+
+        _supervision = supervision
+    return _supervision
 
 
 class ObjectDetectionStage(PipelineStage):
-    def __init__(self, conf=0.5):
+    uses_inference_server = True
+
+    def __init__(
+        self,
+        conf=0.5,
+        detect_interval: int = 1,
+        scene_change_threshold: float = 0.0,
+        track_width: int = 320,
+        lock_blackboard: bool = True,
+        board_warmup: int = 30,
+        motion_threshold: float = 8.0,
+    ):
         """
         初始化物件檢測階段
 
         參數：
-        -
+        - conf: 信心閾值
+        - detect_interval: 每 N 幀推論一次，中間的幀以光流追蹤上一次的框；1 為每幀推論
+        - scene_change_threshold: 與上次推論的畫面平均差異（0~255）超過此值時提前推論，0 為關閉
+        - track_width: 光流追蹤時縮小後的畫面寬度
+        - lock_blackboard: 黑板框穩定後鎖定，之後每幀只偵測 person
+        - board_warmup: 鎖定前需要的推論次數（黑板框數量一致且位置穩定）
+        - motion_threshold: 相位相關估計的鏡頭位移（原始幀像素）超過此值時解除鎖定
         """
-        self.classes = ["person", "blackboard"]
+        self.classes: Tuple[str, ...] = ("person", "blackboard")
+        self.classes_version: int = 0  # 類別每變更一次加一
         self.conf = conf
+        self.detect_interval: int = max(1, int(detect_interval))
+        self.scene_change_threshold: float = scene_change_threshold
+        self.track_width: int = track_width
+        self.lock_blackboard: bool = lock_blackboard
+        self.board_warmup: int = max(1, int(board_warmup))
+        self.motion_threshold: float = motion_threshold
+
+        # 追蹤狀態
+        self.last_detections: Optional["sv.Detections"] = None
+        self.frames_since_detection: int = 0
+        self.prev_small: Optional[np.ndarray] = None  # 上一幀的縮小灰階圖
+        self.key_small: Optional[np.ndarray] = None  # 上次推論時的縮小灰階圖
+
+        # 黑板鎖定狀態
+        self.board_samples: List[Tuple[np.ndarray, np.ndarray]] = []  # 暖機期間的 (xyxy, confidence)
+        self.locked_boards: Optional["sv.Detections"] = None
+        self.lock_reference: Optional[np.ndarray] = None  # 鎖定時的縮小灰階圖 (float32)
+        self.lock_window: Optional[np.ndarray] = None  # 相位相關用的 Hanning window
+        self.board_locks: int = 0
+        self.board_unlocks: int = 0
+
+        # 統計
+        self.frame_count: int = 0
+        self.inference_count: int = 0
+        self.inference_time: float = 0.0
+        self.tracking_time: float = 0.0
+        self.first_timestamp: Optional[float] = None
+        self.last_timestamp: Optional[float] = None
 
     def get_parameters(self):
-        return {"conf": self.conf}
+        return {
+            "conf": self.conf,
+            "classes": list(self.classes),
+            "classes_version": self.classes_version,
+            "detect_interval": self.detect_interval,
+            "scene_change_threshold": self.scene_change_threshold,
+            "lock_blackboard": self.lock_blackboard,
+            "board_warmup": self.board_warmup,
+            "motion_threshold": self.motion_threshold,
+        }
 
     def set_parameters(self, params):
         self.conf = params.get("conf", self.conf)
+        if "classes" in params:
+            self.set_classes(params["classes"])
+        if "detect_interval" in params:
+            self.detect_interval = max(1, int(params["detect_interval"]))
+        if "scene_change_threshold" in params:
+            self.scene_change_threshold = float(params["scene_change_threshold"])
+        if "board_warmup" in params:
+            self.board_warmup = max(1, int(params["board_warmup"]))
+        if "motion_threshold" in params:
+            self.motion_threshold = float(params["motion_threshold"])
+        if "lock_blackboard" in params:
+            self.lock_blackboard = bool(params["lock_blackboard"])
+            if not self.lock_blackboard:
+                self.unlock_boards()
+
+    def get_stats(self) -> dict:
+        """
+        實際推論頻率與跳過推論省下的時間
+        """
+        frames = max(self.frame_count, 1)
+        avg_inference = (
+            self.inference_time / self.inference_count if self.inference_count else 0.0
+        )
+        skipped = self.frame_count - self.inference_count
+        duration = (
+            self.last_timestamp - self.first_timestamp
+            if self.first_timestamp is not None
+            else 0.0
+        )
+        return {
+            "frames": self.frame_count,
+            "inferences": self.inference_count,
+            "inference_ratio": self.inference_count / frames,
+            "inference_fps": self.inference_count / duration if duration > 0 else 0.0,
+            "avg_inference_ms": avg_inference * 1000,
+            "avg_tracking_ms": self.tracking_time / max(skipped, 1) * 1000,
+            "saved_ms_per_frame": (skipped * avg_inference - self.tracking_time)
+            / frames
+            * 1000,
+            "blackboard_locked": self.locked_boards is not None,
+            "board_locks": self.board_locks,
+            "board_unlocks": self.board_unlocks,
+        }
+
+    def set_classes(self, classes) -> None:
+        """
+        更新偵測類別，實際的重新編碼由推論服務在下一次推論時進行一次
+
+        參數：
+        - classes: 類別名稱列表
+        """
+        classes = tuple(str(c) for c in classes)
+        if classes and classes != self.classes:
+            self.classes = classes
+            self.classes_version += 1
+            self.unlock_boards()
+            self.last_detections = None  # 下一幀重新推論
 
-    def process(self, frame: Any, data: FrameDataModel) -> Tuple[Any, FrameDataModel]:
+    def process(self, frame: Any, data: FrameData) -> Tuple[Any, FrameData]:
         """
         執行物件檢測
 
@@ -41,15 +171,32 @@ class ObjectDetectionStage(PipelineStage):
         - frame: 處理後的影片幀
         - data: 更新後的數據模型
         """
-        data.model.set_classes(self.classes)
-        data.detections = self.get_detections(frame, data.model)  # 偵測到的物件們
+        data.detection_class = self.classes
+        small = (
+            self._small_gray(frame)
+            if self.detect_interval > 1 or self.lock_blackboard
+            else None
+        )
+        if self.locked_boards is not None and self._camera_moved(small, frame):
+            self.unlock_boards()
+            data.board_event = BOARD_EVENT_UNLOCKED
+
+        detections = self.detect_or_track(frame, data, small)  # 偵測到的物件們
+        if self.locked_boards is None:
+            if self.frames_since_detection == 0 and self.can_lock_boards():
+                if self.collect_board_sample(detections, small, frame):
+                    data.board_event = BOARD_EVENT_LOCKED
+        else:
+            detections = self.with_locked_boards(detections)
+        data.blackboard_locked = self.locked_boards is not None
+        data.detections = detections
         data.people_boxes, data.blackboard_boxes = self.annotate_box(
             data.detections
         )  # 單獨物件列表
 
         # === preview ===
         # using supervisor to draw the boxes
-        round_box_annotator = sv.RoundBoxAnnotator()
+        round_box_annotator = _sv().RoundBoxAnnotator()
         annotated_frame = round_box_annotator.annotate(
             scene=frame.copy(),
             detections=data.detections,
@@ -60,18 +207,224 @@ class ObjectDetectionStage(PipelineStage):
 
         return frame, data
 
-    def get_detections(self, frame, model: YOLOWorld):
-        results = model.predict(frame, conf=self.conf, verbose=False)
-        detection = sv.Detections.from_ultralytics(results[0])
-        return detection
-
-    def annotate_box(self, detection):
-        people_boxes = []
-        blackboard_boxes = []
-
-        for i, (box, class_id) in enumerate(zip(detection.xyxy, detection.class_id)):
-            if class_id == 0:  # Person class
-                people_boxes.append(box)
-            elif class_id == 1:  # Blackboard class
-                blackboard_boxes.append(box)
-        return people_boxes, blackboard_boxes
+    def detect_or_track(
+        self, frame, data: FrameData, small: Optional[np.ndarray] = None
+    ) -> "sv.Detections":
+        """
+        關鍵幀推論，其餘的幀以光流把上一次的框移到目前位置
+
+        參數：
+        - small: 縮小的灰階幀，None 時每幀推論
+        """
+        self.frame_count += 1
+        if self.first_timestamp is None:
+            self.first_timestamp = data.timestamp
+        self.last_timestamp = data.timestamp
+
+        detections = None
+        if (
+            small is not None
+            and self.detect_interval > 1
+            and not self._needs_detection(small)
+        ):
+            start = time.perf_counter()
+            detections = self.track(self.last_detections, self.prev_small, small, frame)
+            self.tracking_time += time.perf_counter() - start
+            self.frames_since_detection += 1
+
+        if detections is None:
+            start = time.perf_counter()
+            detections = self.get_detections(frame, data.source)
+            self.inference_time += time.perf_counter() - start
+            self.inference_count += 1
+            self.frames_since_detection = 0
+            self.key_small = small
+
+        self.last_detections = detections
+        self.prev_small = small
+        return detections
+
+    def active_classes(self) -> Tuple[str, ...]:
+        """
+        實際送去推論的類別，黑板鎖定時只偵測 person
+        """
+        return ("person",) if self.locked_boards is not None else self.classes
+
+    def can_lock_boards(self) -> bool:
+        return (
+            self.lock_blackboard
+            and "person" in self.classes
+            and "blackboard" in self.classes
+        )
+
+    def collect_board_sample(self, detections: "sv.Detections", small, frame) -> bool:
+        """
+        暖機期間收集每次推論的黑板框，數量一致且位置穩定時鎖定
+
+        返回：
+        - locked: 這一幀是否鎖定
+        """
+        is_board = detections.class_id == self._class_id("blackboard")
+        xyxy = detections.xyxy[is_board]
+        order = np.argsort(xyxy[:, 0])  # 依左緣排序以便逐框比對
+        confidence = (
+            detections.confidence[is_board]
+            if detections.confidence is not None
+            else np.ones(len(xyxy), dtype=np.float32)
+        )
+        self.board_samples.append((xyxy[order], confidence[order]))
+        self.board_samples = self.board_samples[-self.board_warmup :]
+        if len(self.board_samples) < self.board_warmup:
+            return False
+
+        counts = {len(boxes) for boxes, _ in self.board_samples}
+        if len(counts) != 1 or 0 in counts:
+            return False
+        boxes = np.stack([boxes for boxes, _ in self.board_samples])
+        mean = boxes.mean(axis=0)
+        if np.abs(boxes - mean).max() > self.motion_threshold:
+            return False
+
+        count = len(mean)
+        self.locked_boards = _sv().Detections(
+            xyxy=mean.astype(np.float32),
+            confidence=np.stack([c for _, c in self.board_samples]).mean(axis=0),
+            class_id=np.full(count, self._class_id("blackboard")),
+        )
+        self.lock_reference = small.astype(np.float32)
+        self.lock_window = cv2.createHanningWindow(
+            (small.shape[1], small.shape[0]), cv2.CV_32F
+        )
+        self.board_samples = []
+        self.board_locks += 1
+        self.last_detections = None  # 下一幀改用只有 person 的類別推論
+        return True
+
+    def unlock_boards(self) -> None:
+        if self.locked_boards is not None:
+            self.board_unlocks += 1
+            self.last_detections = None  # 下一幀重新偵測所有類別
+        self.locked_boards = None
+        self.lock_reference = None
+        self.board_samples = []
+
+    def _camera_moved(self, small, frame) -> bool:
+        """
+        以相位相關估計目前畫面與鎖定時的整體位移
+        """
+        if small is None or self.lock_reference is None:
+            return True
+        if small.shape != self.lock_reference.shape:
+            return True
+        (dx, dy), response = cv2.phaseCorrelate(
+            self.lock_reference, small.astype(np.float32), self.lock_window
+        )
+        scale = small.shape[1] / frame.shape[1]
+        # 回應值太低表示畫面已無法對齊（大幅移動或遮擋）
+        return response < 0.05 or np.hypot(dx, dy) / scale > self.motion_threshold
+
+    def with_locked_boards(self, people: "sv.Detections") -> "sv.Detections":
+        """
+        把只有 person 的推論結果與鎖定的黑板框合併，class_id 對應完整的類別
+        """
+        boards = self.locked_boards
+        people_confidence = (
+            people.confidence
+            if people.confidence is not None
+            else np.ones(len(people), dtype=np.float32)
+        )
+        return _sv().Detections(
+            xyxy=np.concatenate([people.xyxy, boards.xyxy]),
+            confidence=np.concatenate([people_confidence, boards.confidence]),
+            class_id=np.concatenate(
+                [np.full(len(people), self._class_id("person")), boards.class_id]
+            ),
+        )
+
+    def _needs_detection(self, small: np.ndarray) -> bool:
+        if self.last_detections is None or self.prev_small is None:
+            return True
+        if self.prev_small.shape != small.shape:
+            return True
+        if self.frames_since_detection + 1 >= self.detect_interval:
+            return True
+        if self.scene_change_threshold > 0 and self.key_small is not None:
+            # 畫面與上次推論時差異過大（換場景、鏡頭移動）時提前推論
+            difference = cv2.absdiff(small, self.key_small).mean()
+            return difference > self.scene_change_threshold
+        return False
+
+    def _small_gray(self, frame) -> np.ndarray:
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        scale = min(1.0, self.track_width / gray.shape[1])
+        if scale == 1.0:
+            return gray
+        size = (self.track_width, max(1, int(round(gray.shape[0] * scale))))
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    def track(
+        self, detections: "sv.Detections", prev_small, small, frame
+    ) -> Optional["sv.Detections"]:
+        """
+        以金字塔 LK 光流追蹤每個框內的格點，框依格點位移的中位數平移
+
+        返回：
+        - detections: 追蹤後的框；大部分格點追蹤失敗時回傳 None，改為重新推論
+        """
+        if len(detections) == 0:
+            return detections
+        scale = small.shape[1] / frame.shape[1]
+        grid = np.linspace(0.2, 0.8, 4)
+        points = []
+        for x1, y1, x2, y2 in detections.xyxy * scale:
+            xs = x1 + (x2 - x1) * grid
+            ys = y1 + (y2 - y1) * grid
+            points.append(np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2))
+        p0 = np.concatenate(points).astype(np.float32).reshape(-1, 1, 2)
+        p1, status, _ = cv2.calcOpticalFlowPyrLK(
+            prev_small, small, p0, None, winSize=(15, 15), maxLevel=2
+        )
+        status = status.reshape(len(detections), -1).astype(bool)
+        if status.mean() < 0.5:
+            return None
+
+        motion = (p1 - p0).reshape(len(detections), -1, 2)
+        xyxy = detections.xyxy.astype(np.float32, copy=True)
+        for i in range(len(detections)):
+            if status[i].any():
+                dx, dy = np.median(motion[i][status[i]], axis=0) / scale
+                xyxy[i] += (dx, dy, dx, dy)
+        height, width = frame.shape[:2]
+        np.clip(xyxy[:, 0::2], 0, width, out=xyxy[:, 0::2])
+        np.clip(xyxy[:, 1::2], 0, height, out=xyxy[:, 1::2])
+        return _sv().Detections(
+            xyxy=xyxy,
+            confidence=detections.confidence,
+            class_id=detections.class_id,
+            data=detections.data,
+        )
+
+    def get_detections(self, frame, source):
+        # 交給共用推論服務，與其他來源的幀一起批次推論
+        return get_inference_server().infer(
+            source, frame, conf=self.conf, classes=self.active_classes()
+        )
+
+    def annotate_box(self, detection) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        依類別拆出人與黑板的框，返回 float32 (N, 4) 陣列
+        """
+        if len(detection) == 0 or detection.class_id is None:
+            return EMPTY_BOXES, EMPTY_BOXES
+        xyxy = detection.xyxy.astype(np.float32, copy=False)
+
+        # 類別可在執行中變更，依名稱找出對應的 class_id
+        person_id = self._class_id("person")
+        blackboard_id = self._class_id("blackboard")
+        return (
+            xyxy[detection.class_id == person_id],
+            xyxy[detection.class_id == blackboard_id],
+        )
+
+    def _class_id(self, name: str) -> int:
+        return self.classes.index(name) if name in self.classes else -1
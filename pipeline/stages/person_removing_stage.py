@@ -1,65 +1,305 @@
-# pipeline/stages/image_cropping_stage.py
+# pipeline/stages/person_removing_stage.py
 
-from typing import Any, Tuple
+from typing import Any, List, Optional, Tuple
 from pipeline import PipelineStage
-from models import FrameDataModel
+from models import FrameData
+import cv2
 import numpy as np
-import supervision as sv
+
+UPDATE_MODE_MASK = "mask"
+UPDATE_MODE_RECTS = "rects"
+
+# 黑板背景的估計方式
+BACKGROUND_LATEST = "latest"  # 直接使用最新的未遮擋像素
+BACKGROUND_EMA = "ema"  # 逐像素指數移動平均 (float16 緩衝區)
+BACKGROUND_MEDIAN = "median"  # 逐像素近似移動中位數，每幀最多變化 1 (uint8 緩衝區)
+BACKGROUND_MODES = (BACKGROUND_LATEST, BACKGROUND_EMA, BACKGROUND_MEDIAN)
 
 
 class PersonRemovingStage(PipelineStage):
-    def __init__(self, crop_size: Tuple[int, int] = (100, 100)):
+    # 回傳的 canvas 會在下一幀被覆寫，由管道在輸出前複製
+    reuses_output_buffer = True
+    roi_aware = True
+
+    def __init__(
+        self,
+        crop_size: Tuple[int, int] = (100, 100),
+        padding: int = 31,
+        update_mode: str = UPDATE_MODE_MASK,
+        background_mode: str = BACKGROUND_LATEST,
+        decay: float = 0.05,
+    ):
         """
-        初始化圖像裁剪階段
+        初始化人物移除階段：人物以外的區域更新到 canvas，人物遮擋處保留先前的畫面
 
         參數：
-        - crop_size: 裁剪尺寸（寬，高）
+        - crop_size: 裁剪尺寸（寬，高）（未使用）
+        - padding: 人物框向外擴張的像素，以涵蓋邊緣
+        - update_mode: "mask" 以布林遮罩把人物以外的像素複製到 canvas；
+          "rects" 只處理人物框附近的矩形（dirty rectangles）：直接在輸入幀上以 canvas
+          修補人物框，canvas 只更新人物框外圍一圈，其餘像素不複製；人物移動超過
+          padding 時，新遮擋處使用較舊（但沒有人物）的 canvas
+        - background_mode: "latest" / "ema" / "median"；後兩者在黑板區域內維護
+          時間上的背景模型，抑制雜訊與光線變化造成的閃爍
+        - decay: ema 模式每幀新畫面所佔的權重 (0~1)，越小越穩定
         """
         self.crop_size: Tuple[int, int] = crop_size
-        self.first_frame = True
+        self.padding: int = padding
+        self.update_mode: str = update_mode
+        self.background_mode: str = background_mode
+        self.decay: float = decay
         self.canvas = None
+        self.mask = None  # True 為要從 frame 更新的像素
+        self.background: Optional[np.ndarray] = None
+        self.seeded_rect: Optional[Tuple[int, int, int, int]] = None  # 背景已初始化的區域
+        # rects 模式：canvas 在人物框以外完整更新過的區域（完整幀座標）
+        self.synced_rect: Optional[Tuple[int, int, int, int]] = None
+
+    def get_parameters(self):
+        return {
+            "padding": self.padding,
+            "update_mode": self.update_mode,
+            "background_mode": self.background_mode,
+            "decay": self.decay,
+        }
+
+    def set_parameters(self, params):
+        self.padding = int(params.get("padding", self.padding))
+        self.decay = float(np.clip(params.get("decay", self.decay), 0.0, 1.0))
+        if params.get("update_mode") in (UPDATE_MODE_MASK, UPDATE_MODE_RECTS):
+            self.update_mode = params["update_mode"]
+        if params.get("background_mode") in BACKGROUND_MODES:
+            if params["background_mode"] != self.background_mode:
+                self.background = None  # 換模式時重新建立背景
+                self.synced_rect = None  # 背景模式的 canvas 在黑板以外含有人物
+            self.background_mode = params["background_mode"]
 
-    def process(self, frame: Any, data: FrameDataModel) -> Tuple[Any, FrameDataModel]:
+    def process(self, frame: Any, data: FrameData) -> Tuple[Any, FrameData]:
         """
-        執行圖像裁剪
+        執行人物移除
 
         參數：
-        - frame: 當前影片幀
+        - frame: 當前影片幀（管道設定 data.roi 時為黑板 ROI 的視圖）
         - data: 當前幀的數據模型
 
         返回：
-        - frame: 處理後的影片幀
+        - frame: 處理後的影片幀（重複使用的 canvas 中對應的區域；rects 模式為修補後的輸入幀）
         - data: 更新後的數據模型
         """
-        if self.first_frame:
-            self.canvas = np.zeros_like(frame)
-            self.first_frame = False
+        # canvas 與背景以完整幀的座標保存，ROI 移動時保留先前的畫面
+        origin = (0, 0)
+        full_shape = frame.shape
+        if data.roi is not None and data.frame_size is not None:
+            origin = data.roi[:2]
+            width, height = data.frame_size
+            full_shape = (height, width) + frame.shape[2:]
+        if self.canvas is None or self.canvas.shape != full_shape:
+            # 第一幀或解析度改變時重新配置，之後每幀重複使用
+            self.canvas = np.zeros(full_shape, dtype=frame.dtype)
+            self.mask = np.empty(full_shape[:2], dtype=bool)
+            self.background = None
+            self.synced_rect = None
+
+        x0, y0 = origin
+        view = (slice(y0, y0 + frame.shape[0]), slice(x0, x0 + frame.shape[1]))
+        canvas = self.canvas[view]
 
         # 去除黑板區域中的人遮擋的地方 如果有做人的偵測的話
-        self.canvas = self.process_people_area(
-            frame=frame, data=data, canvas=self.canvas, padding=31
-        )
+        if self.background_mode == BACKGROUND_LATEST:
+            canvas = self.process_people_area(
+                frame=frame, data=data, canvas=canvas, padding=self.padding,
+                origin=origin,
+            )
+        else:
+            canvas = self.process_background(
+                frame=frame, data=data, canvas=canvas, padding=self.padding,
+                origin=origin,
+            )
+
+        return canvas, data
+
+    def process_people_area(
+        self, frame, data: FrameData, canvas, padding=30, origin=(0, 0)
+    ):
+        boxes = self.padded_boxes(data.people_boxes, frame.shape, padding, origin)
+        x0, y0 = origin
+        view_rect = (x0, y0, x0 + frame.shape[1], y0 + frame.shape[0])
+        if self.update_mode == UPDATE_MODE_RECTS and self._contains(
+            self.synced_rect, view_rect
+        ):
+            return self.patch_people_area(frame, canvas, boxes, padding)
+        if not boxes:
+            np.copyto(canvas, frame)
+        else:
+            # 遮罩只由人物框決定，frame 中原本就是黑色的像素照常更新
+            mask = self.mask[y0 : y0 + frame.shape[0], x0 : x0 + frame.shape[1]]
+            mask.fill(True)
+            for x1, y1, x2, y2 in boxes:
+                mask[y1:y2, x1:x2] = False
+            where = mask[..., None] if frame.ndim == 3 else mask
+            np.copyto(canvas, frame, where=where)
+        self.synced_rect = view_rect
+        if self.update_mode == UPDATE_MODE_RECTS:
+            # rects 模式第一次看到這個區域：canvas 完整更新後以它修補人物框
+            return self.patch_people_area(frame, canvas, boxes, padding)
+
+        return canvas
+
+    def patch_people_area(self, frame, canvas, boxes, padding=30):
+        """
+        dirty rectangles：人物框以外就是目前的畫面，不複製；只處理
+        1. 人物框外圍 padding 寬的一圈：以目前的畫面更新 canvas，人物移入時使用
+        2. 人物框：以 canvas 覆寫輸入幀
+
+        人物框內的 canvas 只來自先前沒有被遮擋時的畫面，不使用目前的畫面
+
+        返回：
+        - frame: 修補後的輸入幀
+        """
+        height, width = frame.shape[:2]
+        for x1, y1, x2, y2 in boxes:
+            band = (
+                max(x1 - padding, 0), max(y1 - padding, 0),
+                min(x2 + padding, width), min(y2 + padding, height),
+            )
+            for bx1, by1, bx2, by2 in self.subtract_rects(band, boxes):
+                canvas[by1:by2, bx1:bx2] = frame[by1:by2, bx1:bx2]
+        for x1, y1, x2, y2 in boxes:
+            frame[y1:y2, x1:x2] = canvas[y1:y2, x1:x2]
+        return frame
 
-        return self.canvas, data
+    def process_background(
+        self, frame, data: FrameData, canvas, padding=30, origin=(0, 0)
+    ):
+        """
+        只在黑板區域內更新背景模型（人物框以外的像素），輸出穩定的黑板畫面；
+        黑板區域以外直接複製當前幀
+        """
+        x0, y0 = origin
+        view = (slice(y0, y0 + frame.shape[0]), slice(x0, x0 + frame.shape[1]))
+        view_rect = (x0, y0, x0 + frame.shape[1], y0 + frame.shape[0])
+        if self.background is None or not self._contains(self.seeded_rect, view_rect):
+            # 背景以第一次看到的畫面為起點
+            if self.background is None:
+                dtype = np.float16 if self.background_mode == BACKGROUND_EMA else np.uint8
+                self.background = np.empty(self.canvas.shape, dtype=dtype)
+            self.background[view] = frame
+            self.seeded_rect = view_rect
 
+        roi = self.board_roi(data.blackboard_boxes, frame.shape, origin)
 
-    def process_people_area(self, frame, data: FrameDataModel, canvas, padding=30):
-        # 移除 frame 中的人物區域
-        for box in data.people_boxes:
-            px1, py1, px2, py2 = map(int, box)
-            # 計算去除人物區域的範圍，加入 padding 以涵蓋邊緣
-            bx1 = max(px1 - padding, 0)
-            by1 = max(py1 - padding, 0)
-            bx2 = min(px2 + padding, frame.shape[1])
-            by2 = min(py2 + padding, frame.shape[0])
+        # 黑板區域以外
+        for x1, y1, x2, y2 in self.visible_rects([roi], frame.shape):
+            canvas[y1:y2, x1:x2] = frame[y1:y2, x1:x2]
 
-            # 將人物區域設為 0 (黑色)，移除該區域
-            frame[by1:by2, bx1:bx2] = 0
+        # 黑板區域內，人物框轉成區域內的座標
+        rx1, ry1, rx2, ry2 = roi
+        frame_roi = frame[ry1:ry2, rx1:rx2]
+        background_roi = self.background[view][ry1:ry2, rx1:rx2]
+        mask = self.mask[view][ry1:ry2, rx1:rx2]
+        mask.fill(True)
+        for x1, y1, x2, y2 in self.padded_boxes(
+            data.people_boxes, frame.shape, padding, origin
+        ):
+            x1, x2 = max(x1 - rx1, 0), max(x2 - rx1, 0)
+            y1, y2 = max(y1 - ry1, 0), max(y2 - ry1, 0)
+            mask[y1:y2, x1:x2] = False
+        where = mask[..., None] if frame.ndim == 3 else mask
 
-        # 獲取 frame 中非零區域的索引
-        non_zero_indices = np.where(frame != 0)
+        if self.background_mode == BACKGROUND_EMA:
+            average = background_roi.astype(np.float32)
+            cv2.accumulateWeighted(
+                frame_roi, average, self.decay, mask=mask.view(np.uint8)
+            )
+            background_roi[...] = average
+            np.rint(average, out=average)
+            np.copyto(canvas[ry1:ry2, rx1:rx2], average, casting="unsafe")
+        else:
+            # 近似移動中位數：每幀朝當前像素值移動 1
+            background_roi += (frame_roi > background_roi) & where
+            background_roi -= (frame_roi < background_roi) & where
+            canvas[ry1:ry2, rx1:rx2] = background_roi
 
-        # 使用非零索引來更新 canvas，保持原有的零值部分
-        canvas[non_zero_indices] = frame[non_zero_indices]
-        
         return canvas
+
+    def board_roi(self, blackboard_boxes, shape, origin=(0, 0)) -> Tuple[int, int, int, int]:
+        """
+        所有黑板框的外接矩形（frame 內的座標），沒有黑板時為整個 frame
+        """
+        height, width = shape[:2]
+        boxes = self.padded_boxes(blackboard_boxes, shape, 0, origin)
+        if not boxes:
+            return 0, 0, width, height
+        return (
+            min(b[0] for b in boxes),
+            min(b[1] for b in boxes),
+            max(b[2] for b in boxes),
+            max(b[3] for b in boxes),
+        )
+
+    @staticmethod
+    def _contains(outer, inner) -> bool:
+        return (
+            outer is not None
+            and outer[0] <= inner[0]
+            and outer[1] <= inner[1]
+            and outer[2] >= inner[2]
+            and outer[3] >= inner[3]
+        )
+
+    def padded_boxes(
+        self, people_boxes, shape, padding, origin=(0, 0)
+    ) -> List[Tuple[int, int, int, int]]:
+        """
+        完整幀座標的框減去 origin、加上 padding 並限制在 frame 的範圍內，略過空框
+        """
+        height, width = shape[:2]
+        x0, y0 = origin
+        boxes = []
+        for box in people_boxes:
+            px1, py1, px2, py2 = map(int, box[:4])
+            px1, py1, px2, py2 = px1 - x0, py1 - y0, px2 - x0, py2 - y0
+            bx1, by1 = max(px1 - padding, 0), max(py1 - padding, 0)
+            bx2, by2 = min(px2 + padding, width), min(py2 + padding, height)
+            if bx1 < bx2 and by1 < by2:
+                boxes.append((bx1, by1, bx2, by2))
+        return boxes
+
+    def subtract_rects(
+        self, rect: Tuple[int, int, int, int], others: List[Tuple[int, int, int, int]]
+    ) -> List[Tuple[int, int, int, int]]:
+        """
+        rect 扣掉 others 之後剩下的矩形（與 rect 相同的座標系）
+        """
+        rx1, ry1, rx2, ry2 = rect
+        local = []
+        for x1, y1, x2, y2 in others:
+            x1, y1 = max(x1, rx1) - rx1, max(y1, ry1) - ry1
+            x2, y2 = min(x2, rx2) - rx1, min(y2, ry2) - ry1
+            if x1 < x2 and y1 < y2:
+                local.append((x1, y1, x2, y2))
+        return [
+            (x1 + rx1, y1 + ry1, x2 + rx1, y2 + ry1)
+            for x1, y1, x2, y2 in self.visible_rects(local, (ry2 - ry1, rx2 - rx1))
+        ]
+
+    def visible_rects(
+        self, boxes: List[Tuple[int, int, int, int]], shape
+    ) -> List[Tuple[int, int, int, int]]:
+        """
+        把幀扣掉框後的區域拆成矩形：
+        依框的上下緣切成水平帶，每條帶中再扣掉覆蓋它的框的 x 範圍
+        """
+        height, width = shape[:2]
+        edges = sorted({0, height, *(y for b in boxes for y in (b[1], b[3]))})
+        rects = []
+        for y1, y2 in zip(edges, edges[1:]):
+            spans = sorted((b[0], b[2]) for b in boxes if b[1] <= y1 and b[3] >= y2)
+            x = 0
+            for sx1, sx2 in spans:
+                if sx1 > x:
+                    rects.append((x, y1, sx1, y2))
+                x = max(x, sx2)
+            if x < width:
+                rects.append((x, y1, width, y2))
+        return rects
@@ -1,9 +1,9 @@
 # recording_sys.py
 
-from typing import Any
+import asyncio
+from typing import Any, Callable, Dict, Optional
 from capture.capture_module import AudioSource, CaptureModule, VideoSource
 from event_decorators import event_handler
-import sounddevice as sd
 from logger import logger
 from controller import ControllerModule
 import time
@@ -18,6 +18,7 @@ class RecordingSys:
         video_sources: List[VideoSource],
         audio_sources: List[AudioSource],
         preview_mode: bool = False,
+        preview_config: Optional[Dict[str, Any]] = None,
     ) -> None:
         self.controller_module: ControllerModule = controller_module
         self.recording: bool = False
@@ -31,6 +32,7 @@ class RecordingSys:
             audio_sources=self.audio_sources,
             preview_mode=preview_mode,
             controller_module=self.controller_module,
+            preview_config=preview_config,
         )
         self._print_startup_message()
         self._register_event_handlers()
@@ -53,6 +55,12 @@ class RecordingSys:
         )
         logger.info("🎈 Event handlers registered.")
 
+    async def _run_blocking(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        在線程池中執行可能阻塞的呼叫（例如工作程序中的處理管道），不卡住事件迴圈
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
     def start_recording(self) -> None:
         if not self.recording:
             self.recording = True
@@ -130,8 +138,10 @@ class RecordingSys:
         source: int = data.get("source")
         for vc in self.capture_module.video_captures:
             if vc.source == source:
-                vc.processing_pipeline.set_stage_enabled(stage_name, True)
-                self.get_current_info()
+                await self._run_blocking(
+                    vc.processing_pipeline.set_stage_enabled, stage_name, True
+                )
+                await self._run_blocking(self.get_current_info)
                 break
 
     @event_handler("DISABLE_STAGE")
@@ -140,8 +150,10 @@ class RecordingSys:
         source: int = data.get("source")
         for vc in self.capture_module.video_captures:
             if vc.source == source:
-                vc.processing_pipeline.set_stage_enabled(stage_name, False)
-                self.get_current_info()
+                await self._run_blocking(
+                    vc.processing_pipeline.set_stage_enabled, stage_name, False
+                )
+                await self._run_blocking(self.get_current_info)
                 break
 
     @event_handler("SET_PARAMETER")
@@ -152,18 +164,37 @@ class RecordingSys:
         source: int = data.get("source")
         for vc in self.capture_module.video_captures:
             if vc.source == source:
-                vc.processing_pipeline.set_stage_parameter(
-                    stage_name, param_name, value
+                await self._run_blocking(
+                    vc.processing_pipeline.set_stage_parameter,
+                    stage_name,
+                    {param_name: value},
                 )
                 await self.handle_get_current_info(data)
                 break
 
+    @event_handler("SET_FRAME_BUDGET")
+    async def handle_set_frame_budget(self, data: dict) -> None:
+        # frame_budget_ms 為 None 時不限制；也可以用 target_fps 指定
+        source: int = data.get("source")
+        frame_budget_ms = data.get("frame_budget_ms")
+        if frame_budget_ms is None and data.get("target_fps"):
+            frame_budget_ms = 1000 / data["target_fps"]
+        await self._run_blocking(
+            self.capture_module.set_frame_budget, source, frame_budget_ms
+        )
+        await self._run_blocking(self.get_current_info)
+
+    @event_handler("GET_METRICS")
+    async def handle_get_metrics(self, data: dict) -> None:
+        metrics = await self._run_blocking(self.capture_module.get_metrics)
+        self.controller_module.send_event("DATA", {"metrics": metrics})
+
     @event_handler("GET_CURRENT_INFO")
     async def handle_get_current_info(self, data: dict) -> None:
-        self.get_current_info()
+        await self._run_blocking(self.get_current_info)
 
     @event_handler("TOGGLE_PREVIEW")
     async def handle_toggle_preview(self, data: dict) -> None:
         self.capture_module.toggle_preview()
-        self.get_current_info()
+        await self._run_blocking(self.get_current_info)
         logger.info(f"preview mode {self.capture_module.preview_mode}")
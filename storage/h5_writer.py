@@ -0,0 +1,162 @@
+# storage/h5_writer.py
+
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import h5py
+import numpy as np
+
+ColumnSpec = Union[Any, Tuple[Any, Tuple[int, ...]]]
+
+
+def _parse_spec(spec: ColumnSpec) -> Tuple[np.dtype, Tuple[int, ...]]:
+    dtype, shape = spec if isinstance(spec, tuple) else (spec, ())
+    return np.dtype(dtype), tuple(shape)
+
+
+class BufferedH5Writer:
+    def __init__(
+        self,
+        h5_file: h5py.File,
+        columns: Dict[str, ColumnSpec],
+        flush_rows: int = 256,
+        flush_interval: float = 2.0,
+        chunk_rows: int = 1024,
+        compression: Optional[str] = None,
+        ragged: Optional[Dict[str, Dict[str, ColumnSpec]]] = None,
+    ):
+        """
+        批次寫入 h5 的逐幀資料，先累積在 numpy 陣列中，滿了或到時間再一次寫入
+
+        參數：
+        - h5_file: 已開啟的 h5 檔案（或 group）
+        - columns: 每幀一列的欄位 {名稱: dtype} 或 {名稱: (dtype, 每列的形狀)}
+        - flush_rows: 累積多少列寫入一次
+        - flush_interval: 最長多久寫入一次（秒），同時呼叫 h5 flush 以防當機遺失
+        - chunk_rows: dataset 每個 chunk 的列數
+        - compression: None / "gzip" / "lzf"
+        - ragged: 每幀長度不固定的欄位群組 {群組: {欄位: spec}}；
+          每個群組寫成 h5 group，欄位攤平成一個 dataset，
+          並以 <群組>/offsets、<群組>/counts 記錄每幀對應的範圍
+        """
+        self.h5_file = h5_file
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.buffers: Dict[str, np.ndarray] = {}
+        self.datasets: Dict[str, h5py.Dataset] = {}
+        self.pending: int = 0
+        self.last_flush: float = time.monotonic()
+
+        self.ragged_fields: Dict[str, Dict[str, h5py.Dataset]] = {}
+        self.ragged_pending: Dict[str, Dict[str, List[np.ndarray]]] = {}
+        self.ragged_lengths: Dict[str, int] = {}
+
+        columns = dict(columns)
+        for group_name, fields in (ragged or {}).items():
+            columns[f"{group_name}/offsets"] = "i8"
+            columns[f"{group_name}/counts"] = "i4"
+            self.ragged_fields[group_name] = {}
+            self.ragged_pending[group_name] = {}
+            for field_name, spec in fields.items():
+                dataset = self._require_dataset(f"{group_name}/{field_name}", spec)
+                self.ragged_fields[group_name][field_name] = dataset
+                self.ragged_pending[group_name][field_name] = []
+                self.ragged_lengths[group_name] = dataset.shape[0]
+
+        for name, spec in columns.items():
+            dtype, shape = _parse_spec(spec)
+            self.buffers[name] = np.empty((self.flush_rows,) + shape, dtype=dtype)
+            self.datasets[name] = self._require_dataset(name, spec)
+
+    def _require_dataset(self, name: str, spec: ColumnSpec) -> h5py.Dataset:
+        if name in self.h5_file:
+            return self.h5_file[name]
+        dtype, shape = _parse_spec(spec)
+        return self.h5_file.create_dataset(
+            name,
+            shape=(0,) + shape,
+            maxshape=(None,) + shape,
+            dtype=dtype,
+            chunks=(self.chunk_rows,) + shape,
+            compression=self.compression,
+            # 字串等變長型別不支援 shuffle
+            shuffle=self.compression is not None and dtype.kind != "O",
+        )
+
+    def append(self, **values: Any) -> None:
+        """
+        新增一列，需提供所有欄位；ragged 群組以 {欄位: 陣列} 傳入，陣列第一維為該幀的項目數
+        """
+        row = self.pending
+        for group_name, fields in self.ragged_pending.items():
+            group_values = values.pop(group_name)
+            count = 0
+            for field_name, pending in fields.items():
+                array = np.asarray(group_values[field_name])
+                pending.append(array)
+                count = len(array)
+            values[f"{group_name}/offsets"] = self.ragged_lengths[group_name]
+            values[f"{group_name}/counts"] = count
+            self.ragged_lengths[group_name] += count
+
+        for name, buffer in self.buffers.items():
+            buffer[row] = values[name]
+        self.pending += 1
+        if self.pending >= self.flush_rows:
+            self.flush()
+
+    def flush_if_due(self) -> None:
+        """
+        距離上次寫入超過 flush_interval 時寫入
+        """
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        把累積的列一次寫入 h5 並 flush 到磁碟
+        """
+        for group_name, fields in self.ragged_pending.items():
+            for field_name, pending in fields.items():
+                if not pending:
+                    continue
+                dataset = self.ragged_fields[group_name][field_name]
+                self._extend(dataset, np.concatenate(pending))
+                pending.clear()
+
+        if self.pending:
+            for name, buffer in self.buffers.items():
+                self._extend(self.datasets[name], buffer[: self.pending])
+            self.pending = 0
+        self.h5_file.flush()
+        self.last_flush = time.monotonic()
+
+    def _extend(self, dataset: h5py.Dataset, block: np.ndarray) -> None:
+        if len(block) == 0:
+            return
+        start = dataset.shape[0]
+        dataset.resize((start + len(block),) + dataset.shape[1:])
+        dataset[start:] = block
+
+    def close(self) -> None:
+        self.flush()
+
+
+def read_ragged(
+    h5_file: h5py.File, group_name: str, field_name: str, index: int
+) -> np.ndarray:
+    """
+    讀取 ragged 群組中某一幀的項目
+
+    參數：
+    - h5_file: 已開啟的 h5 檔案
+    - group_name: 群組名稱，例如 "blackboard_boxes"
+    - field_name: 欄位名稱，例如 "xyxy"
+    - index: 幀的列索引
+    """
+    group = h5_file[group_name]
+    start = int(group["offsets"][index])
+    count = int(group["counts"][index])
+    return group[field_name][start : start + count]
@@ -1,37 +1,155 @@
-from collections import defaultdict
+from collections import defaultdict, deque
 import queue
 import cv2
 import h5py
 import wave
 import numpy as np
 import os
-from typing import List, Tuple, Dict, Any, TYPE_CHECKING
-from models import FrameDataModel
+from typing import Deque, List, Tuple, Dict, Any, Optional, TYPE_CHECKING
+from models import FrameData, FRAME_COLUMNS, FRAME_RAGGED_COLUMNS, STAGE_FLAG_FIELDS
 from datetime import datetime
 import threading
 import time
 import json
 from logger import logger
+from .video_encoder import EncoderWorker, create_video_encoder
+from .h5_writer import BufferedH5Writer
+from pipeline.metrics import create_pipeline_metrics, release_pipeline_metrics
 
 if TYPE_CHECKING:
     from capture.capture_module import CaptureModule
+    from capture.latest_frame import FrameRecord
+
+# 影像儲存模式
+VIDEO_MODE_TIMELINE = "timeline"  # 從佇列取出每一幀，依捕捉時間戳排到時間軸上
+VIDEO_MODE_SAMPLING = "sampling"  # 舊模式：固定 FPS 取樣最新幀
+
+# 時間軸模式
+TIMELINE_CFR = "cfr"  # 固定幀率：缺的幀以上一幀補齊，過早的幀丟棄
+TIMELINE_VFR = "vfr"  # 可變幀率：每幀寫入一次，真實時間由 h5 timestamps 決定
+
+# 時間軸佇列滿時的處理方式
+QUEUE_POLICY_DROP_OLDEST = "drop_oldest"  # 丟棄該來源最舊的一幀並計入 overflow
+QUEUE_POLICY_BLOCK = "block"  # 讓處理線程等待（捕捉端的環形緩衝區依自己的策略丟幀）
+
+# h5 屬性名稱 ← 每個來源的幀統計
+FRAME_STATS_ATTRS = {
+    "frames": "received_frames",  # 進入 SaveThread 的幀
+    "written": "written_frames",  # 實際寫入（不含補幀）
+    "duplicated": "duplicated_frames",  # CFR 以上一幀補齊的幀
+    "dropped": "dropped_frames",  # CFR 中比時間軸早到而丟棄的幀
+    "overflow": "overflow_frames",  # 寫入跟不上，佇列滿時丟棄的幀
+    "discontinuities": "timeline_discontinuities",  # 空檔太長而不補幀的次數
+}
+
+
+class VideoRecordQueue:
+    def __init__(
+        self, maxsize: int = 60, policy: str = QUEUE_POLICY_DROP_OLDEST
+    ) -> None:
+        """
+        時間軸模式的幀佇列：每個來源各自有上限，取出時依時間戳交錯各來源
+
+        佇列中是完整解析度的幀，編碼跟不上時不能無限制累積
+
+        參數：
+        - maxsize: 每個來源最多排隊的幀數
+        - policy: 滿了時的處理方式 (QUEUE_POLICY_DROP_OLDEST / QUEUE_POLICY_BLOCK)
+        """
+        if policy not in (QUEUE_POLICY_DROP_OLDEST, QUEUE_POLICY_BLOCK):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.queues: Dict[Any, Deque[Tuple[Any, "FrameRecord"]]] = {}
+        self.overflow: Dict[Any, int] = defaultdict(int)
+        self.condition = threading.Condition()
+
+    def put(self, item: Tuple[Any, "FrameRecord"]) -> None:
+        """
+        放入 (source, FrameRecord)，介面與 queue.Queue.put 相同
+        """
+        source = item[0]
+        with self.condition:
+            source_queue = self.queues.setdefault(source, deque())
+            if self.policy == QUEUE_POLICY_BLOCK:
+                self.condition.wait_for(lambda: len(source_queue) < self.maxsize)
+            elif len(source_queue) >= self.maxsize:
+                source_queue.popleft()
+                self.overflow[source] += 1
+            source_queue.append(item)
+            self.condition.notify_all()
+
+    def get(
+        self, block: bool = True, timeout: Optional[float] = None
+    ) -> Tuple[Any, "FrameRecord"]:
+        """
+        取出時間戳最早的一幀，沒有幀時拋出 queue.Empty
+        """
+        with self.condition:
+            if block:
+                self.condition.wait_for(
+                    lambda: any(self.queues.values()), timeout=timeout
+                )
+            pending = [q for q in self.queues.values() if q]
+            if not pending:
+                raise queue.Empty
+            item = min(pending, key=lambda q: q[0][1].timestamp).popleft()
+            self.condition.notify_all()
+            return item
+
+    def qsize(self) -> int:
+        with self.condition:
+            return sum(len(q) for q in self.queues.values())
+
+    def get_overflow(self) -> Dict[Any, int]:
+        with self.condition:
+            return dict(self.overflow)
 
 
 class SaveThread(threading.Thread):
-    def __init__(self, storage_module: "StorageModule", fps: int = 30):
+    def __init__(
+        self,
+        storage_module: "StorageModule",
+        fps: int = 30,
+        video_mode: str = VIDEO_MODE_TIMELINE,
+        timeline: str = TIMELINE_CFR,
+        h5_options: Optional[Dict[str, Any]] = None,
+        max_gap_seconds: float = 2.0,
+    ):
         super().__init__()
         self.storage_module = storage_module
         self.is_running = True
         self.fps = fps
-        self.video_writers: Dict[str, cv2.VideoWriter] = {}
+        self.video_mode = video_mode
+        self.timeline = timeline
+        # CFR 最多補幀的長度，空檔更長時不補幀，改為在時間軸上接續（見 h5 timestamps）
+        self.max_gap_frames = max(1, int(round(max_gap_seconds * fps)))
+        self.video_writers: Dict[str, EncoderWorker] = {}
+        self.video_sizes: Dict[str, Tuple[int, int]] = {}
         self.h5_files: Dict[str, h5py.File] = {}
+        self.h5_writers: Dict[str, BufferedH5Writer] = {}
+        self.h5_options: Dict[str, Any] = h5_options or {}
+        self.vocabularies: Dict[str, List[List[str]]] = {}  # 每個 ID 出現過的偵測類別
         self.audio_files: Dict[str, wave.Wave_write] = {}  # 用於存儲音頻文件
+        self.audio_h5_files: Dict[str, h5py.File] = {}
+        self.audio_h5_writers: Dict[str, BufferedH5Writer] = {}
+        self.audio_samples: Dict[str, int] = {}  # 每個音頻來源已寫入的樣本數
         self.frame_counters: Dict[str, int] = {}  # 用於記錄每個 ID 的幀索引
+        self.last_seqs: Dict[str, int] = {}  # 每個 ID 已寫入的最後一幀序號
+
+        # 時間軸模式的狀態
+        self.start_timestamps: Dict[str, float] = {}  # 每個 ID 第一幀的時間戳
+        self.last_frames: Dict[str, np.ndarray] = {}  # 用於補幀
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {key: 0 for key in FRAME_STATS_ATTRS}
+        )
 
         self.lock = threading.Lock()
+        # 寫入耗時統計（統計關閉時為 None），階段名稱為 video:<來源ID> / audio
+        self.metrics = create_pipeline_metrics("storage")
 
     def run(self):
-        base_path = os.path.join(
+        self.base_path = os.path.join(
             self.storage_module.base_path, self.storage_module.recording_name, "videos"
         )
         audio_base_path = os.path.join(
@@ -44,156 +162,55 @@ class SaveThread(threading.Thread):
         while self.is_running:
             start_time = time.time()  # 記錄開始時間
 
-            # 獲取視頻幀
-            frames, datas, _ = self.storage_module.capture_module.get_frame_buffer()
-
-            # 處理視頻幀
-            for id_, frame in frames.items():
-                data = datas.get(id_)
-
-                if frame is None:
-                    continue
-
-                # 初始化幀索引
-                if id_ not in self.frame_counters:
-                    self.frame_counters[id_] = 0
-
-                frame_index = self.frame_counters[id_]
-                self.frame_counters[id_] += 1  # 更新幀索引
+            if self.video_mode == VIDEO_MODE_TIMELINE:
+                # 有新幀時立刻被喚醒，沒有時最多等到下一次寫入音頻
+                self._drain_video_queue(timeout=frame_duration)
+            else:
+                self._sample_video_buffers()
 
-                if data is None:
-                    data_model = FrameDataModel(timestamp=time.time())
-                else:
-                    data_model = data  # 假設 data 已經是 FrameDataModel 的實例
-
-                serialized_data = json.loads(data_model.serialized())
-
-                # 確保線程安全地訪問 writers 和 files
-                with self.lock:
-                    # 初始化 video_writers 和 h5_files 如果尚未完成
-                    if id_ not in self.video_writers:
-                        video_dir = os.path.join(base_path, str(id_))
-                        os.makedirs(video_dir, exist_ok=True)
-                        video_path = os.path.join(video_dir, "video.mp4")
-                        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-                        height, width = frame.shape[:2]
-                        self.video_writers[id_] = cv2.VideoWriter(
-                            video_path, fourcc, self.fps, (width, height)
-                        )
-
-                    if id_ not in self.h5_files:
-                        h5_path = os.path.join(base_path, str(id_), "data.h5")
-                        self.h5_files[id_] = h5py.File(h5_path, "a")
-                        # 創建 datasets 如果不存在
-                        if "frame_indices" not in self.h5_files[id_]:
-                            self.h5_files[id_].create_dataset(
-                                "frame_indices", shape=(0,), maxshape=(None,), dtype="i"
-                            )
-                        if "timestamps" not in self.h5_files[id_]:
-                            self.h5_files[id_].create_dataset(
-                                "timestamps", shape=(0,), maxshape=(None,), dtype="f"
-                            )
-                        if "data" not in self.h5_files[id_]:
-                            self.h5_files[id_].create_dataset(
-                                "data",
-                                shape=(0,),
-                                maxshape=(None,),
-                                dtype=h5py.string_dtype(encoding="utf-8"),
-                            )
-
-                    # 檢查影像格式並處理
-                    if len(frame.shape) == 2:
-                        # 影像是單通道（灰階），需要轉換為 BGR 格式
-                        frame_bgr = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-                    else:
-                        # 影像已經是 BGR 格式，不需要轉換
-                        frame_bgr = frame
-
-                    # 確保尺寸與 VideoWriter 初始化時的尺寸一致（可選）
-                    frame_bgr_resized = cv2.resize(frame_bgr, (width, height))
-
-                    # 寫入 VideoWriter
-                    self.video_writers[id_].write(frame_bgr_resized)
-
-                    # 附加資料到 h5 文件
-                    h5_file = self.h5_files[id_]
-
-                    # 更新 frame_indices
-                    h5_file["frame_indices"].resize(
-                        (h5_file["frame_indices"].shape[0] + 1,)
-                    )
-                    h5_file["frame_indices"][-1] = frame_index
+            # 處理音頻幀
+            if self.metrics is None:
+                self._write_audio_buffers()
+            else:
+                wall_start, cpu_start = time.perf_counter(), time.thread_time()
+                self._write_audio_buffers()
+                self.metrics.record(
+                    "audio",
+                    time.perf_counter() - wall_start,
+                    time.thread_time() - cpu_start,
+                )
+
+            # 定期把累積的逐幀資料寫入磁碟
+            with self.lock:
+                for h5_writer in self.h5_writers.values():
+                    h5_writer.flush_if_due()
 
-                    # 更新 timestamps
-                    timestamp = serialized_data.get("timestamp", time.time())
-                    h5_file["timestamps"].resize((h5_file["timestamps"].shape[0] + 1,))
-                    h5_file["timestamps"][-1] = timestamp
+            if self.video_mode == VIDEO_MODE_SAMPLING:
+                # 計算該次迴圈所花的時間
+                end_time = time.time()
+                elapsed_time = end_time - start_time
 
-                    # 更新 data
-                    h5_file["data"].resize((h5_file["data"].shape[0] + 1,))
-                    h5_file["data"][-1] = json.dumps(serialized_data)
+                # 如果處理速度過快，則休眠剩餘時間來保持 FPS 穩定
+                sleep_time = frame_duration - elapsed_time
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
 
-            # 處理音頻幀
-            with self.lock:
-                for (
-                    source_id,
-                    audio_queue,
-                ) in self.storage_module.audio_buffers.items():
-                    if source_id not in self.audio_files:
-                        # 初始化音頻文件
-                        audio_dir = os.path.join(
-                            self.storage_module.base_path,
-                            self.storage_module.recording_name,
-                            "audios",
-                            str(source_id),
-                        )
-                        os.makedirs(audio_dir, exist_ok=True)
-                        audio_path = os.path.join(audio_dir, "audio.wav")
-                        self.audio_files[source_id] = wave.open(audio_path, "wb")
-                        # 設定音頻參數
-                        # 假設採樣率和通道數與 AudioCapture 一致
-                        capture = next(
-                            (
-                                ac
-                                for ac in self.storage_module.capture_module.audio_captures
-                                if ac.source == source_id
-                            ),
-                            None,
-                        )
-                        if capture:
-                            self.audio_files[source_id].setnchannels(capture.channels)
-                            self.audio_files[source_id].setsampwidth(
-                                2
-                            )  # 假設 16-bit 音頻
-                            self.audio_files[source_id].setframerate(capture.samplerate)
-                        else:
-                            logger.error(
-                                f"No matching AudioCapture found for source {source_id}"
-                            )
-
-                    while not audio_queue.empty():
-                        audio_frame, audio_timestamp = audio_queue.get()
-                        # 將音頻數據轉換為適合寫入 WAV 的格式
-                        audio_data = (audio_frame * 32767).astype(
-                            np.int16
-                        )  # 假設 float32 到 int16
-                        self.audio_files[source_id].writeframes(audio_data.tobytes())
-
-            # 計算該次迴圈所花的時間
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-
-            # 如果處理速度過快，則休眠剩餘時間來保持 FPS 穩定
-            sleep_time = frame_duration - elapsed_time
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+        # 停止後把佇列中剩下的幀寫完
+        if self.video_mode == VIDEO_MODE_TIMELINE:
+            self._drain_video_queue(timeout=0, limit=None)
+        self._write_audio_buffers()
+        self._report_stats()
 
         # 清理：釋放所有 video writers 和關閉 h5 文件，並關閉音頻文件
         with self.lock:
             for writer in self.video_writers.values():
-                writer.release()
+                writer.close()
             self.video_writers.clear()
 
+            for h5_writer in self.h5_writers.values():
+                h5_writer.close()
+            self.h5_writers.clear()
+
             for h5_file in self.h5_files.values():
                 h5_file.close()
             self.h5_files.clear()
@@ -202,9 +219,320 @@ class SaveThread(threading.Thread):
                 audio_writer.close()
             self.audio_files.clear()
 
+            for h5_writer in self.audio_h5_writers.values():
+                h5_writer.close()
+            self.audio_h5_writers.clear()
+
+            for h5_file in self.audio_h5_files.values():
+                h5_file.close()
+            self.audio_h5_files.clear()
+        release_pipeline_metrics(self.metrics)
+
     def stop(self):
         self.is_running = False
 
+    def _drain_video_queue(self, timeout: float, limit: Optional[int] = 64) -> None:
+        """
+        從佇列取出幀並依時間軸寫入
+
+        參數：
+        - timeout: 佇列為空時最多等待的秒數
+        - limit: 這一輪最多寫入的幀數，避免音頻寫入被餓死；None 表示全部寫完
+        """
+        video_queue = self.storage_module.video_queue
+        block = timeout > 0
+        written = 0
+        while limit is None or written < limit:
+            try:
+                id_, record = video_queue.get(block=block, timeout=timeout)
+            except queue.Empty:
+                return
+            self._write_timeline_frame(id_, record)
+            written += 1
+            block = False
+
+    def _sample_video_buffers(self) -> None:
+        # 獲取視頻幀
+        records = self.storage_module.capture_module.get_frame_buffer()
+
+        # 處理視頻幀
+        for id_, record in records.items():
+            # 同一幀只寫入一次
+            if record is None or record.seq <= self.last_seqs.get(id_, 0):
+                continue
+            self.last_seqs[id_] = record.seq
+
+            # 初始化幀索引
+            if id_ not in self.frame_counters:
+                self.frame_counters[id_] = 0
+
+            frame_index = self.frame_counters[id_]
+            self.frame_counters[id_] += 1  # 更新幀索引
+            self.stats[id_]["frames"] += 1
+            self._write_video_frame(id_, record.frame, record.data, frame_index)
+
+    def _write_timeline_frame(self, id_: Any, record: "FrameRecord") -> None:
+        """
+        依捕捉時間戳把幀放到時間軸上
+
+        CFR：目標索引 = round((timestamp - 第一幀時間戳) * fps)；
+        比下一個索引晚則以上一幀補齊，比下一個索引早則丟棄
+        VFR：每幀依序寫入一次
+        """
+        stats = self.stats[id_]
+        stats["frames"] += 1
+        next_index = self.frame_counters.get(id_, 0)
+
+        if self.timeline == TIMELINE_CFR:
+            start = self.start_timestamps.setdefault(id_, record.timestamp)
+            target_index = int(round((record.timestamp - start) * self.fps))
+            if target_index < next_index:
+                stats["dropped"] += 1
+                return
+            gap = target_index - next_index
+            if gap > self.max_gap_frames:
+                # 例如鏡頭停頓很久：不寫入大量重複幀，時間軸從這一幀接續
+                logger.warning(
+                    f"📼 Source {id_}: {gap / self.fps:.1f}s gap, "
+                    "continuing the timeline without filling"
+                )
+                self.start_timestamps[id_] += gap / self.fps
+                stats["discontinuities"] += 1
+                target_index = next_index
+            elif gap > 0:
+                # 補齊中間缺少的幀（編碼器的佇列滿時會等待，不持有 self.lock）
+                with self.lock:
+                    writer = self.video_writers[id_]
+                    last_frame = self.last_frames[id_]
+                for _ in range(gap):
+                    writer.write(last_frame)
+                stats["duplicated"] += gap
+            frame_index = target_index
+        else:
+            frame_index = next_index
+
+        self._write_video_frame(id_, record.frame, record.data, frame_index)
+        self.frame_counters[id_] = frame_index + 1
+
+    def _write_video_frame(
+        self, id_: Any, frame: np.ndarray, data: Any, frame_index: int
+    ) -> None:
+        if self.metrics is None:
+            self._encode_video_frame(id_, frame, data, frame_index)
+            return
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        self._encode_video_frame(id_, frame, data, frame_index)
+        self.metrics.record(
+            f"video:{id_}",
+            time.perf_counter() - wall_start,
+            time.thread_time() - cpu_start,
+        )
+
+    def _encode_video_frame(
+        self, id_: Any, frame: np.ndarray, data: Any, frame_index: int
+    ) -> None:
+        if data is None:
+            data_model = FrameData(timestamp=time.time())
+        elif isinstance(data, FrameData):
+            data_model = data  # 處理管道產生的 FrameData
+        else:
+            data_model = data.to_record()  # FrameDataModel
+
+        columns = data_model.to_columns()
+
+        # 確保線程安全地訪問 writers 和 files
+        with self.lock:
+            # 初始化 video_writers 和 h5_files 如果尚未完成
+            if id_ not in self.video_writers:
+                video_dir = os.path.join(self.base_path, str(id_))
+                os.makedirs(video_dir, exist_ok=True)
+                video_path = os.path.join(video_dir, "video.mp4")
+                height, width = frame.shape[:2]
+                self.video_sizes[id_] = (width, height)
+                # 每個來源各自的編碼器，在獨立線程中編碼
+                encoder = create_video_encoder(
+                    self.storage_module.capture_module.get_encoder_config(id_)
+                )
+                encoder.open(video_path, width, height, self.fps)
+                self.video_writers[id_] = EncoderWorker(encoder)
+
+            if id_ not in self.h5_files:
+                h5_path = os.path.join(self.base_path, str(id_), "data.h5")
+                self.h5_files[id_] = h5py.File(h5_path, "a")
+                self.h5_files[id_].attrs["fps"] = self.fps
+                self.h5_files[id_].attrs["video_mode"] = self.video_mode
+                self.h5_files[id_].attrs["timeline"] = self.timeline
+                for key, value in (
+                    self.video_writers[id_].encoder.get_parameters().items()
+                ):
+                    self.h5_files[id_].attrs[f"encoder_{key}"] = value
+                self.h5_files[id_].attrs["stage_flags"] = json.dumps(
+                    list(STAGE_FLAG_FIELDS)
+                )
+                # stage_mask / shed_mask 的 bit 對應的階段名稱
+                self.h5_files[id_].attrs["pipeline_stages"] = json.dumps(
+                    self.storage_module.capture_module.get_stage_names(id_)
+                )
+                # 逐幀資料以型別化欄位先累積再批次寫入
+                self.h5_writers[id_] = BufferedH5Writer(
+                    self.h5_files[id_],
+                    FRAME_COLUMNS,
+                    ragged=FRAME_RAGGED_COLUMNS,
+                    **self.h5_options,
+                )
+
+            writer = self.video_writers[id_]
+            width, height = self.video_sizes[id_]
+
+        # 檢查影像格式並處理
+        if len(frame.shape) == 2:
+            # 影像是單通道（灰階），需要轉換為 BGR 格式
+            frame_bgr = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        else:
+            # 影像已經是 BGR 格式，不需要轉換
+            frame_bgr = frame
+
+        # 確保尺寸與編碼器初始化時的尺寸一致（可選）
+        if frame_bgr.shape[1] != width or frame_bgr.shape[0] != height:
+            frame_bgr = cv2.resize(frame_bgr, (width, height))
+
+        # 交給編碼線程（佇列滿時會等待，與補幀相同不持有 self.lock，
+        # 音頻寫入與統計查詢不會卡在編碼器後面）
+        writer.write(frame_bgr)
+
+        with self.lock:
+            self.last_frames[id_] = frame_bgr
+            self.stats[id_]["written"] += 1
+
+            # 附加資料到 h5 文件
+            self.h5_writers[id_].append(
+                frame_indices=frame_index,
+                vocabulary_ids=self._vocabulary_id(id_, data_model),
+                **columns,
+            )
+
+    def _vocabulary_id(self, id_: Any, data_model: FrameData) -> int:
+        """
+        將偵測類別列表對應到 attrs["detection_vocabularies"] 中的索引
+        """
+        if not data_model.detection_class:
+            return -1
+        vocabularies = self.vocabularies.setdefault(id_, [])
+        classes = list(data_model.detection_class)
+        if classes not in vocabularies:
+            vocabularies.append(classes)
+            self.h5_files[id_].attrs["detection_vocabularies"] = json.dumps(
+                vocabularies
+            )
+        return vocabularies.index(classes)
+
+    def _write_audio_buffers(self) -> None:
+        with self.lock:
+            for (
+                source_id,
+                audio_queue,
+            ) in self.storage_module.audio_buffers.items():
+                if source_id not in self.audio_files:
+                    # 初始化音頻文件
+                    audio_dir = os.path.join(
+                        self.storage_module.base_path,
+                        self.storage_module.recording_name,
+                        "audios",
+                        str(source_id),
+                    )
+                    os.makedirs(audio_dir, exist_ok=True)
+                    audio_path = os.path.join(audio_dir, "audio.wav")
+                    self.audio_files[source_id] = wave.open(audio_path, "wb")
+                    # 每個音頻區塊的起始樣本與捕捉時間戳，供播放時對齊影像
+                    self.audio_h5_files[source_id] = h5py.File(
+                        os.path.join(audio_dir, "data.h5"), "a"
+                    )
+                    self.audio_h5_writers[source_id] = BufferedH5Writer(
+                        self.audio_h5_files[source_id],
+                        {"sample_offsets": "i8", "timestamps": "f8"},
+                        **self.h5_options,
+                    )
+                    self.audio_samples[source_id] = 0
+                    # 設定音頻參數
+                    # 假設採樣率和通道數與 AudioCapture 一致
+                    capture = next(
+                        (
+                            ac
+                            for ac in self.storage_module.capture_module.audio_captures
+                            if ac.source == source_id
+                        ),
+                        None,
+                    )
+                    if capture:
+                        self.audio_files[source_id].setnchannels(capture.channels)
+                        self.audio_files[source_id].setsampwidth(2)  # 假設 16-bit 音頻
+                        self.audio_files[source_id].setframerate(capture.samplerate)
+                        self.audio_h5_files[source_id].attrs[
+                            "samplerate"
+                        ] = capture.samplerate
+                        self.audio_h5_files[source_id].attrs[
+                            "channels"
+                        ] = capture.channels
+                    else:
+                        logger.error(
+                            f"No matching AudioCapture found for source {source_id}"
+                        )
+
+                while not audio_queue.empty():
+                    audio_frame, audio_timestamp = audio_queue.get()
+                    # 將音頻數據轉換為適合寫入 WAV 的格式
+                    audio_data = (audio_frame * 32767).astype(
+                        np.int16
+                    )  # 假設 float32 到 int16
+                    self.audio_files[source_id].writeframes(audio_data.tobytes())
+                    # audio_timestamp 為回調收到此區塊的時間（區塊結尾）
+                    self.audio_h5_writers[source_id].append(
+                        sample_offsets=self.audio_samples[source_id],
+                        timestamps=audio_timestamp,
+                    )
+                    self.audio_samples[source_id] += len(audio_frame)
+
+                self.audio_h5_writers[source_id].flush_if_due()
+
+    def _report_stats(self) -> None:
+        """
+        錄製結束時回報每個來源的補幀/丟幀數，並記錄到 h5 屬性
+        """
+        self._collect_overflow()
+        with self.lock:
+            for id_, stats in self.stats.items():
+                logger.info(
+                    f"📼 Source {id_}: {stats['frames']} frames received, "
+                    f"{stats['written']} written, {stats['duplicated']} duplicated, "
+                    f"{stats['dropped']} dropped, {stats['overflow']} overflowed, "
+                    f"{stats['discontinuities']} discontinuities"
+                )
+                h5_file = self.h5_files.get(id_)
+                if h5_file is not None:
+                    for key, attr in FRAME_STATS_ATTRS.items():
+                        h5_file.attrs[attr] = stats[key]
+
+    def _collect_overflow(self) -> None:
+        # 佇列滿時丟棄的幀由 VideoRecordQueue 計數
+        overflow = self.storage_module.video_queue.get_overflow()
+        with self.lock:
+            for id_, count in overflow.items():
+                self.stats[id_]["overflow"] = count
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        self._collect_overflow()
+        with self.lock:
+            return {str(id_): dict(stats) for id_, stats in self.stats.items()}
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        寫入耗時分佈與補幀/丟幀統計
+        """
+        return {
+            "writes": self.metrics.snapshot() if self.metrics is not None else {},
+            "frames": self.get_stats(),
+        }
+
 
 class StorageModule:
     def __init__(
@@ -213,12 +541,37 @@ class StorageModule:
         capture_module: "CaptureModule",
         fps: int = 30,
         base_path: str = "recordings",
+        video_mode: str = VIDEO_MODE_TIMELINE,
+        timeline: str = TIMELINE_CFR,
+        h5_options: Optional[Dict[str, Any]] = None,
+        video_queue_size: int = 60,
+        video_queue_policy: str = QUEUE_POLICY_DROP_OLDEST,
+        max_gap_seconds: float = 2.0,
     ):
+        """
+        參數：
+        - h5_options: BufferedH5Writer 的參數 (flush_rows, flush_interval, chunk_rows, compression)
+        - video_queue_size: 時間軸模式下每個來源最多等待寫入的幀數
+        - video_queue_policy: 佇列滿時的處理方式 (QUEUE_POLICY_DROP_OLDEST / QUEUE_POLICY_BLOCK)
+        - max_gap_seconds: CFR 最多補幀的秒數
+        """
         self.recording_name = recording_name
         self.capture_module = capture_module
-        self.save_thread = SaveThread(self, fps=fps)
+        self.video_mode = video_mode
+        self.save_thread = SaveThread(
+            self,
+            fps=fps,
+            video_mode=video_mode,
+            timeline=timeline,
+            h5_options=h5_options,
+            max_gap_seconds=max_gap_seconds,
+        )
         self.base_path = base_path
         self.audio_buffers = defaultdict(queue.Queue)
+        # 時間軸模式下，所有來源處理完的幀依序放入此佇列：(source, FrameRecord)
+        self.video_queue = VideoRecordQueue(
+            maxsize=video_queue_size, policy=video_queue_policy
+        )
 
     def start(self):
         # 創建基礎錄製目錄
@@ -230,6 +583,17 @@ class StorageModule:
         self.save_thread.start()
         logger.info(f"StorageModule started recording: {self.recording_name}")
 
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        儲存端統計，含等待寫入的幀數（持續增加表示 SaveThread 是瓶頸）
+        """
+        metrics = self.save_thread.get_metrics()
+        metrics["video_queue"] = self.video_queue.qsize()
+        metrics["audio_queues"] = {
+            str(source): buffer.qsize() for source, buffer in self.audio_buffers.items()
+        }
+        return metrics
+
     def stop(self):
         # 停止保存線程
         self.save_thread.stop()
@@ -0,0 +1,217 @@
+# storage/video_encoder.py
+
+import queue
+import shutil
+import subprocess
+import threading
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+from logger import logger
+
+
+class VideoEncoder:
+    """
+    影像編碼器的BaseClass，每個實例負責一個輸出檔案
+    """
+
+    def open(self, path: str, width: int, height: int, fps: float) -> None:
+        """
+        開啟輸出檔案
+
+        參數：
+        - path: 輸出路徑
+        - width, height: 影像尺寸
+        - fps: 幀率
+        """
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def write(self, frame: np.ndarray) -> None:
+        """
+        寫入一張 BGR 影像，尺寸需與 open 時相同
+        """
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def close(self) -> None:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def get_parameters(self) -> Dict[str, Any]:
+        """
+        獲取編碼參數，會被記錄到 h5 屬性中
+        """
+        return {}
+
+
+class OpenCVVideoEncoder(VideoEncoder):
+    def __init__(self, fourcc: str = "mp4v"):
+        """
+        使用 cv2.VideoWriter 的編碼器（舊的 mp4v 行為）
+
+        參數：
+        - fourcc: 四字元編碼代號
+        """
+        self.fourcc = fourcc
+        self.writer: Optional[cv2.VideoWriter] = None
+
+    def open(self, path: str, width: int, height: int, fps: float) -> None:
+        self.writer = cv2.VideoWriter(
+            path, cv2.VideoWriter_fourcc(*self.fourcc), fps, (width, height)
+        )
+
+    def write(self, frame: np.ndarray) -> None:
+        self.writer.write(frame)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+    def get_parameters(self) -> Dict[str, Any]:
+        return {"backend": "opencv", "codec": self.fourcc}
+
+
+class FFmpegVideoEncoder(VideoEncoder):
+    def __init__(
+        self,
+        codec: str = "libx264",
+        crf: int = 23,
+        preset: str = "veryfast",
+        gop: int = 60,
+        tune: Optional[str] = None,
+        ffmpeg_path: str = "ffmpeg",
+    ):
+        """
+        透過管線把原始影像送進 ffmpeg，以 libx264 / libx265 編碼
+
+        參數：
+        - codec: libx264 或 libx265
+        - crf: 畫質（越小越好，檔案越大）
+        - preset: 編碼速度預設 (ultrafast ... veryslow)
+        - gop: 關鍵幀間隔（幀）
+        - tune: 例如 stillimage / zerolatency，None 表示不指定
+        - ffmpeg_path: ffmpeg 執行檔
+        """
+        self.codec = codec
+        self.crf = crf
+        self.preset = preset
+        self.gop = gop
+        self.tune = tune
+        self.ffmpeg_path = ffmpeg_path
+        self.process: Optional[subprocess.Popen] = None
+
+    def build_command(self, path: str, width: int, height: int, fps: float) -> List[str]:
+        command = [
+            self.ffmpeg_path,
+            "-loglevel", "error",
+            "-y",
+            "-f", "rawvideo",
+            "-pix_fmt", "bgr24",
+            "-s", f"{width}x{height}",
+            "-r", str(fps),
+            "-i", "-",
+            "-c:v", self.codec,
+            "-preset", self.preset,
+            "-crf", str(self.crf),
+            "-g", str(self.gop),
+            "-pix_fmt", "yuv420p",
+        ]
+        if self.tune:
+            command += ["-tune", self.tune]
+        if self.codec == "libx265":
+            # 讓 QuickTime/瀏覽器也能辨識 HEVC
+            command += ["-tag:v", "hvc1"]
+        command.append(path)
+        return command
+
+    def open(self, path: str, width: int, height: int, fps: float) -> None:
+        self.process = subprocess.Popen(
+            self.build_command(path, width, height, fps),
+            stdin=subprocess.PIPE,
+        )
+
+    def write(self, frame: np.ndarray) -> None:
+        self.process.stdin.write(np.ascontiguousarray(frame).data)
+
+    def close(self) -> None:
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+    def get_parameters(self) -> Dict[str, Any]:
+        return {
+            "backend": "ffmpeg",
+            "codec": self.codec,
+            "crf": self.crf,
+            "preset": self.preset,
+            "gop": self.gop,
+            "tune": self.tune or "",
+        }
+
+
+def create_video_encoder(config: Optional[Dict[str, Any]] = None) -> VideoEncoder:
+    """
+    依照設定建立編碼器
+
+    參數：
+    - config: {"backend": "ffmpeg" | "opencv", 其餘為編碼器參數}；None 時使用 ffmpeg libx264 預設值
+
+    返回：
+    - encoder: 編碼器實例；找不到 ffmpeg 時退回 OpenCV
+    """
+    config = dict(config or {})
+    backend = config.pop("backend", "ffmpeg")
+    if backend == "ffmpeg":
+        ffmpeg_path = config.get("ffmpeg_path", "ffmpeg")
+        if shutil.which(ffmpeg_path) is not None:
+            return FFmpegVideoEncoder(**config)
+        logger.warning(f"{ffmpeg_path} not found, falling back to OpenCV mp4v encoder")
+        return OpenCVVideoEncoder()
+    if backend == "opencv":
+        return OpenCVVideoEncoder(**config)
+    raise ValueError(f"Unknown video encoder backend: {backend}")
+
+
+class EncoderWorker(threading.Thread):
+    def __init__(self, encoder: VideoEncoder, queue_size: int = 64):
+        """
+        每個影像串流一個的編碼線程，透過有界佇列接收影像
+
+        佇列滿時 write() 會等待，讓壓力回到 SaveThread 而不是丟幀
+
+        參數：
+        - encoder: 已開啟的編碼器
+        - queue_size: 佇列上限（幀）
+        """
+        super().__init__(daemon=True)
+        self.encoder = encoder
+        self.frames: "queue.Queue[Optional[np.ndarray]]" = queue.Queue(maxsize=queue_size)
+        self.encoded_frames: int = 0
+        self.error: Optional[Exception] = None
+        self.start()
+
+    def run(self) -> None:
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.encoder.write(frame)
+                self.encoded_frames += 1
+            except Exception as e:
+                self.error = e
+                logger.error(f"Video encoder failed: {e}")
+        self.encoder.close()
+
+    def write(self, frame: np.ndarray) -> None:
+        self.frames.put(frame)
+
+    def close(self) -> None:
+        """
+        寫完佇列中剩下的影像後關閉編碼器
+        """
+        self.frames.put(None)
+        self.join()
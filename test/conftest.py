@@ -0,0 +1,7 @@
+# test/conftest.py
+
+import os
+import sys
+
+# 以專案根目錄匯入 capture / pipeline / storage 等模塊
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,87 @@
+# test/test_frame_ring_buffer.py
+
+import threading
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")  # capture 套件匯入時會載入 VideoCapture
+
+from capture.frame_ring_buffer import (  # noqa: E402
+    DROP_POLICY_BLOCK,
+    DROP_POLICY_DROP_OLDEST,
+    DROP_POLICY_LATEST,
+    FrameRingBuffer,
+)
+
+
+def write(buffer: FrameRingBuffer, timestamp: float) -> None:
+    index, _ = buffer.begin_write()
+    assert index >= 0
+    buffer.commit_write(index, np.full((2, 2), timestamp), timestamp)
+
+
+def test_latest_takes_newest_and_drops_the_rest():
+    buffer = FrameRingBuffer(capacity=4, drop_policy=DROP_POLICY_LATEST)
+    for t in range(3):
+        write(buffer, float(t))
+
+    index, frame, timestamp = buffer.acquire(timeout=0)
+    assert timestamp == 2.0
+    assert frame[0, 0] == 2.0
+    buffer.release(index)
+
+    stats = buffer.get_stats()
+    assert stats["captured"] == 3
+    assert stats["processed"] == 1
+    assert stats["dropped"] == 2
+    assert stats["pending"] == 0
+    assert buffer.acquire(timeout=0) is None
+
+
+def test_drop_oldest_recycles_oldest_ready_slot_in_order():
+    buffer = FrameRingBuffer(capacity=3, drop_policy=DROP_POLICY_DROP_OLDEST)
+    for t in range(4):
+        write(buffer, float(t))
+
+    timestamps = []
+    for _ in range(3):
+        index, _, timestamp = buffer.acquire(timeout=0)
+        timestamps.append(timestamp)
+        buffer.release(index)
+    assert timestamps == [1.0, 2.0, 3.0]
+    assert buffer.get_stats()["dropped"] == 1
+
+
+def test_block_waits_for_a_free_slot_without_dropping():
+    buffer = FrameRingBuffer(capacity=3, drop_policy=DROP_POLICY_BLOCK)
+    for t in range(3):
+        write(buffer, float(t))
+
+    writer = threading.Thread(target=write, args=(buffer, 3.0))
+    writer.start()
+    time.sleep(0.2)
+    assert writer.is_alive()  # 沒有空槽位時捕捉端等待
+
+    index, _, timestamp = buffer.acquire(timeout=0)
+    assert timestamp == 0.0
+    buffer.release(index)
+    writer.join(timeout=1)
+    assert not writer.is_alive()
+
+    stats = buffer.get_stats()
+    assert stats["dropped"] == 0
+    assert stats["blocked_ms"] > 0
+
+
+def test_close_releases_both_sides():
+    buffer = FrameRingBuffer(capacity=3, drop_policy=DROP_POLICY_BLOCK)
+    buffer.close()
+    assert buffer.begin_write() == (-1, None)
+    assert buffer.acquire(timeout=1) is None
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        FrameRingBuffer(drop_policy="newest")
@@ -0,0 +1,53 @@
+# test/test_h5_writer.py
+
+import pytest
+
+np = pytest.importorskip("numpy")
+h5py = pytest.importorskip("h5py")
+pytest.importorskip("cv2")  # storage 套件匯入時會載入 StorageModule
+
+from storage.h5_writer import BufferedH5Writer, read_ragged  # noqa: E402
+
+RAGGED = {"boxes": {"xyxy": ("f4", (4,)), "class_id": "i2"}}
+
+
+def boxes(count: int, start: float) -> dict:
+    xyxy = np.arange(count * 4, dtype=np.float32).reshape(count, 4) + start
+    return {"xyxy": xyxy, "class_id": np.arange(count, dtype=np.int16)}
+
+
+def test_ragged_round_trip(tmp_path):
+    rows = [boxes(2, 0.0), boxes(0, 0.0), boxes(3, 100.0), boxes(1, 200.0)]
+    with h5py.File(tmp_path / "data.h5", "w") as h5:
+        # flush_rows 小於列數，跨越多次寫入
+        writer = BufferedH5Writer(
+            h5, {"timestamps": "f8"}, flush_rows=3, ragged=RAGGED
+        )
+        for i, row in enumerate(rows):
+            writer.append(timestamps=float(i), boxes=row)
+        writer.close()
+
+    with h5py.File(tmp_path / "data.h5", "r") as h5:
+        assert h5["timestamps"][:].tolist() == [0.0, 1.0, 2.0, 3.0]
+        assert h5["boxes/counts"][:].tolist() == [2, 0, 3, 1]
+        assert h5["boxes/offsets"][:].tolist() == [0, 2, 2, 5]
+        for i, row in enumerate(rows):
+            np.testing.assert_array_equal(
+                read_ragged(h5, "boxes", "xyxy", i), row["xyxy"]
+            )
+            np.testing.assert_array_equal(
+                read_ragged(h5, "boxes", "class_id", i), row["class_id"]
+            )
+
+
+def test_pending_rows_are_not_written_until_flush(tmp_path):
+    with h5py.File(tmp_path / "data.h5", "w") as h5:
+        writer = BufferedH5Writer(
+            h5, {"timestamps": "f8"}, flush_rows=10, flush_interval=3600, ragged=RAGGED
+        )
+        writer.append(timestamps=1.0, boxes=boxes(1, 0.0))
+        writer.flush_if_due()
+        assert h5["timestamps"].shape == (0,)
+        writer.flush()
+        assert h5["timestamps"].shape == (1,)
+        assert h5["boxes/xyxy"].shape == (1, 4)
@@ -0,0 +1,57 @@
+# test/test_inference_server.py
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("loguru")
+
+from pipeline import inference_server  # noqa: E402
+from pipeline.model_registry import get_model, release_models  # noqa: E402
+
+MODEL_PATH = "fake-yolo-world.pt"
+
+
+class FakeWorldModel:
+    """
+    只有 set_classes 與文字嵌入欄位的 YOLO-World 替身，記錄重新編碼的次數
+    """
+
+    def __init__(self):
+        self.model = SimpleNamespace(
+            txt_feats=None, model=[SimpleNamespace(nc=0)], names=[]
+        )
+        self.predictor = None
+        self.encodes = 0
+
+    def set_classes(self, classes):
+        self.encodes += 1
+        self.model.txt_feats = ("embeddings", tuple(classes))
+        self.model.names = list(classes)
+
+
+@pytest.fixture
+def server():
+    model = get_model(MODEL_PATH, loader=lambda path: FakeWorldModel())
+    inference_server.configure_inference_server(model_path=MODEL_PATH)
+    yield inference_server.get_inference_server(), model
+    inference_server.shutdown_inference_server()
+    release_models()
+
+
+def test_stats_not_created_without_server():
+    inference_server.shutdown_inference_server()
+    assert inference_server.get_inference_stats() is None
+
+
+def test_class_switches_reuse_cached_embeddings(server):
+    server, model = server
+    for classes in (("person",), ("blackboard",), ("person",), ("blackboard",)):
+        server._apply_classes(classes)
+
+    stats = inference_server.get_inference_stats()
+    assert stats["class_reencodes"] == model.encodes == 2
+    assert stats["class_cache_hits"] == 2
+    assert stats["class_cache_size"] == 2
+    assert model.model.names == ["blackboard"]
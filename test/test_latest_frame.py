@@ -0,0 +1,47 @@
+# test/test_latest_frame.py
+
+import threading
+
+import pytest
+
+pytest.importorskip("cv2")  # capture 套件匯入時會載入 VideoCapture
+
+from capture.latest_frame import LatestFrameSlot  # noqa: E402
+
+
+def test_get_is_none_before_first_publish():
+    slot = LatestFrameSlot()
+    assert slot.get() is None
+    assert slot.seq == 0
+
+
+def test_publish_increments_sequence():
+    slot = LatestFrameSlot()
+    first = slot.publish("frame-1", None, 1.0)
+    second = slot.publish("frame-2", None, 2.0)
+    assert (first.seq, second.seq) == (1, 2)
+    assert slot.get() is second
+
+
+def test_wait_newer_returns_immediately_when_newer_exists():
+    slot = LatestFrameSlot()
+    record = slot.publish("frame", None, 1.0)
+    assert slot.wait_newer(0, timeout=0) is record
+
+
+def test_wait_newer_times_out():
+    slot = LatestFrameSlot()
+    slot.publish("frame", None, 1.0)
+    assert slot.wait_newer(1, timeout=0.05) is None
+
+
+def test_wait_newer_wakes_on_publish():
+    slot = LatestFrameSlot()
+    slot.publish("frame-1", None, 1.0)
+    timer = threading.Timer(0.05, slot.publish, args=("frame-2", None, 2.0))
+    timer.start()
+    record = slot.wait_newer(1, timeout=2)
+    timer.join()
+    assert record is not None
+    assert record.seq == 2
+    assert record.frame == "frame-2"
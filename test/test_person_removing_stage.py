@@ -0,0 +1,48 @@
+# test/test_person_removing_stage.py
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from models import FrameData  # noqa: E402
+from pipeline.stages.person_removing_stage import (  # noqa: E402
+    UPDATE_MODE_MASK,
+    UPDATE_MODE_RECTS,
+    PersonRemovingStage,
+)
+
+HEIGHT, WIDTH = 120, 160
+PERSON = 200  # 人物像素的值，背景不會出現
+
+
+def walking_frames(step, frames=40, empty=3):
+    """
+    前 empty 幀沒有人物，之後人物每幀向右移動 step 像素
+
+    返回：
+    - (frame, people_boxes) 的列表與背景
+    """
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 100, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+    sequence = []
+    for i in range(frames):
+        frame = background.copy()
+        boxes = []
+        if i >= empty:
+            x = 10 + (i - empty) * step
+            frame[40:90, x : x + 20] = PERSON
+            boxes.append((x, 40, x + 20, 90))
+        sequence.append((frame, boxes))
+    return sequence, background
+
+
+@pytest.mark.parametrize("update_mode", [UPDATE_MODE_MASK, UPDATE_MODE_RECTS])
+@pytest.mark.parametrize("step", [2, 40])
+def test_person_pixels_removed(update_mode, step):
+    stage = PersonRemovingStage(padding=4, update_mode=update_mode)
+    sequence, background = walking_frames(step)
+    for frame, boxes in sequence:
+        output, _ = stage.process(frame, FrameData(0.0, people_boxes=boxes))
+        assert not (output == PERSON).all(axis=2).any()
+        np.testing.assert_array_equal(output, background)
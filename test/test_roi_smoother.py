@@ -0,0 +1,44 @@
+# test/test_roi_smoother.py
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from pipeline.roi_smoother import RoiSmoother  # noqa: E402
+
+SHAPE = (480, 640, 3)
+
+
+def test_first_box_sets_roi():
+    smoother = RoiSmoother()
+    assert smoother.update((100.4, 50.0, 300.0, 200.0), SHAPE) == (100, 50, 300, 200)
+
+
+def test_jitter_inside_deadband_keeps_roi():
+    smoother = RoiSmoother(alpha=0.3, deadband=8)
+    roi = smoother.update((100, 50, 300, 200), SHAPE)
+    for dx in (4, -3, 5, -4, 2):
+        assert smoother.update((100 + dx, 50 - dx, 300 + dx, 200), SHAPE) == roi
+
+
+def test_large_move_updates_roi():
+    smoother = RoiSmoother(alpha=0.3, deadband=8)
+    roi = smoother.update((100, 50, 300, 200), SHAPE)
+    moved = smoother.update((200, 50, 400, 200), SHAPE)
+    assert moved != roi
+    assert moved[0] > roi[0]
+
+
+def test_missing_box_holds_then_resets():
+    smoother = RoiSmoother(hold_frames=2)
+    roi = smoother.update((100, 50, 300, 200), SHAPE)
+    assert smoother.update(None, SHAPE) == roi
+    assert smoother.update(None, SHAPE) == roi
+    assert smoother.update(None, SHAPE) is None
+    # 重設後以新的框重新開始
+    assert smoother.update((10, 10, 50, 50), SHAPE) == (10, 10, 50, 50)
+
+
+def test_padding_is_clipped_to_frame():
+    smoother = RoiSmoother(padding=10)
+    assert smoother.update((5, 5, 635, 475), SHAPE) == (0, 0, 640, 480)